@@ -8,16 +8,36 @@ hair growth progress over time using computer vision and machine learning.
 __version__ = "1.0.0"
 __author__ = "Your Name"
 
-from .main import HairlineTrackerApp
-from .hairline_detector import HairlineDetector
-from .progress_tracker import ProgressTracker
+import importlib
+
+# Public names are imported on first access (PEP 562) so that importing the
+# package does not pull in OpenCV, MediaPipe and matplotlib up front
+_LAZY_ATTRIBUTES = {
+    'HairlineTrackerApp': '.main',
+    'HairlineDetector': '.hairline_detector',
+    'ProgressTracker': '.progress_tracker',
+    'SessionComparator': '.hairline_comparison',
+    'FleetReporter': '.fleet_reports',
+}
 
 __all__ = [
     'HairlineTrackerApp',
     'HairlineDetector', 
-    'ProgressTracker'
+    'ProgressTracker',
+    'SessionComparator',
+    'FleetReporter'
 ]
 
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
+
 def get_version():
     """Return the current version of the package"""
     return __version__
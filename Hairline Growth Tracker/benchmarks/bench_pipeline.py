@@ -0,0 +1,224 @@
+"""
+Headless benchmark of the full hairline analysis pipeline
+
+Runs every stage on the bundled images (data/input/raw_images and
+data/input/datasets/celeba/images) plus synthetic upscaled variants and
+reports p50/p95 latency, throughput and peak RSS per stage. Results can
+be stored as a JSON baseline and later runs compared against it.
+
+Usage (from the 'Hairline Growth Tracker' directory):
+    python benchmarks/bench_pipeline.py                     # run and print
+    python benchmarks/bench_pipeline.py --save-baseline     # store baseline
+    python benchmarks/bench_pipeline.py --compare           # fail on regressions
+"""
+
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import matplotlib
+matplotlib.use('Agg')  # headless: generate_report plots must not open windows
+import matplotlib.pyplot as plt
+
+import cv2
+
+from bench_utils import (PROJECT_DIR, summarize, peak_rss_mb, save_baseline,
+                         load_baseline, compare_to_baseline, missing_from_baseline)
+
+from data.data_manager import DataManager
+from hairline_detector import HairlineDetector
+from models.config import ModelConfig
+from utils.hairline_profile import compute_hairline_profile
+from progress_tracker import ProgressTracker
+
+IMAGE_DIRS = ['data/input/raw_images', 'data/input/datasets/celeba/images']
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+BASELINE_NAME = 'pipeline'
+MIN_BASELINE_REPEAT = 3  # fewer passes are too noisy to gate regressions on
+SESSION_START = datetime(2025, 1, 1)  # benchmark sessions are one minute apart
+
+STAGES = [
+    'validate_image', 'decode', 'detect_face', 'detect_hairline_points',
+    'hairline_profile', 'calculate_metrics', 'visualize_analysis', 'save_analysis', 'generate_report'
+]
+
+def collect_images(limit=None):
+    """Bundled benchmark images, as absolute paths"""
+    paths = []
+    for directory in IMAGE_DIRS:
+        for path in sorted(glob.glob(os.path.join(PROJECT_DIR, directory, '*'))):
+            if path.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(path)
+    return paths[:limit] if limit else paths
+
+def create_upscaled_variants(paths, scales, output_dir):
+    """Write synthetic upscaled copies of the images (larger decode/analysis cost)"""
+    variants = []
+    for scale in scales:
+        for path in paths:
+            image = cv2.imread(path)
+            if image is None:
+                continue
+            upscaled = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+            name = f"x{scale}_{os.path.splitext(os.path.basename(path))[0]}.png"
+            variant_path = os.path.join(output_dir, name)
+            cv2.imwrite(variant_path, upscaled)
+            variants.append(variant_path)
+    return variants
+
+class PipelineBenchmark:
+    def __init__(self, work_dir):
+        """
+        Set up pipeline components writing into a scratch directory
+        """
+        self.work_dir = work_dir
+        self.data_manager = DataManager()
+        self.detector = HairlineDetector()
+        self.tracker = ProgressTracker(data_file=os.path.join(work_dir, 'hairline_data.json'))
+        self.timings = defaultdict(list)
+        self.sequence = 0
+
+    def timed(self, stage, func, *args, **kwargs):
+        """Run one stage and record its latency"""
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.timings[stage].append(time.perf_counter() - start)
+        return result
+
+    def run_image(self, image_path):
+        """
+        Run every pipeline stage for one image
+
+        Returns:
+            bool: True if the image made it through the whole pipeline
+        """
+        is_valid, _ = self.timed('validate_image', self.data_manager.validate_image, image_path)
+        image = self.timed('decode', cv2.imread, image_path)
+        if image is None:
+            return False
+
+        detector = self.detector
+        detection = self.timed('detect_face', detector.face_detector.detect_face, image)
+        if not detection:
+            return False
+
+        landmarks = detection['landmarks']
+        forehead_region = detector.face_detector.get_forehead_region(landmarks)
+        hairline_points = self.timed('detect_hairline_points', detector.detect_hairline_points,
+                                     image, landmarks, forehead_region)
+        profile, profile_span = self.timed('hairline_profile', compute_hairline_profile,
+                                           hairline_points, forehead_region, image.shape[0],
+                                           ModelConfig.HAIRLINE_PROFILE_POINTS,
+                                           ModelConfig.HAIRLINE_PROFILE_SMOOTHING)
+        metrics = self.timed('calculate_metrics', detector.calculate_metrics,
+                             landmarks, hairline_points, image.shape)
+
+        result = dict(metrics)
+        result.update({
+            'face_landmarks': landmarks,
+            'hairline_points': hairline_points,
+            'hairline_profile': profile,
+            'hairline_profile_span': profile_span,
+            'forehead_region': forehead_region,
+            'hairline_type': detector.classify_hairline(metrics)
+        })
+        self.timed('visualize_analysis', detector.visualize_analysis, image, result)
+
+        self.sequence += 1
+        timestamp = (SESSION_START + timedelta(minutes=self.sequence)).strftime("%Y%m%d_%H%M%S")
+        self.timed('save_analysis', self.tracker.save_analysis, 'bench_user', timestamp, result)
+        self.timed('generate_report', self.tracker.generate_report, 'bench_user')
+        plt.close('all')
+        return True
+
+def run_benchmark(image_paths, repeat):
+    """Run the pipeline over all images and return the results dict"""
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='hairline_bench_') as work_dir:
+        # Progress plots and data directories are written relative to the cwd
+        os.chdir(work_dir)
+        try:
+            benchmark = PipelineBenchmark(work_dir)
+            benchmark.run_image(image_paths[0])  # warm-up (model init, caches)
+            benchmark.timings.clear()
+
+            analyzed = 0
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for path in image_paths:
+                    analyzed += benchmark.run_image(path)
+            elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(original_dir)
+
+    return {
+        'images': len(image_paths),
+        'repeat': repeat,
+        'analyzed': analyzed,
+        'total_seconds': elapsed,
+        'images_per_s': len(image_paths) * repeat / elapsed,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': {stage: summarize(benchmark.timings[stage]) for stage in STAGES}
+    }
+
+def print_results(results):
+    print(f"⏱️ Pipeline benchmark: {results['images']} images x {results['repeat']} "
+          f"({results['analyzed']} analyzed) in {results['total_seconds']:.2f}s "
+          f"-> {results['images_per_s']:.2f} images/s, peak RSS {results['peak_rss_mb']} MB")
+    print(f"   {'stage':<24}{'p50 ms':>10}{'p95 ms':>10}{'ops/s':>10}")
+    for stage, stats in results['stages'].items():
+        if not stats['count']:
+            print(f"   {stage:<24}{'-':>10}{'-':>10}{'-':>10}")
+            continue
+        print(f"   {stage:<24}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+              f"{stats['throughput_per_s']:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless hairline pipeline benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='passes over the image set')
+    parser.add_argument('--limit', type=int, help='only use the first N bundled images')
+    parser.add_argument('--scales', type=float, nargs='*', default=[2.0],
+                        help='synthetic upscale factors added to the image set')
+    parser.add_argument('--save-baseline', action='store_true', help='store results as baseline')
+    parser.add_argument('--compare', action='store_true', help='compare with the stored baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed p50 slowdown vs baseline (0.2 = 20%%)')
+    args = parser.parse_args()
+    if args.save_baseline and args.repeat < MIN_BASELINE_REPEAT:
+        parser.error(f"--save-baseline needs --repeat {MIN_BASELINE_REPEAT} or more")
+
+    with tempfile.TemporaryDirectory(prefix='hairline_variants_') as variant_dir:
+        image_paths = collect_images(args.limit)
+        image_paths += create_upscaled_variants(image_paths, args.scales, variant_dir)
+        results = run_benchmark(image_paths, args.repeat)
+
+    print_results(results)
+
+    if args.compare:
+        baseline = load_baseline(BASELINE_NAME)
+        if baseline is None:
+            print("⚠️ No baseline stored yet; run with --save-baseline first")
+        else:
+            if baseline.get('repeat', 1) < MIN_BASELINE_REPEAT:
+                print(f"⚠️ Baseline was recorded with --repeat {baseline.get('repeat', 1)}; "
+                      f"re-record it with --repeat {MIN_BASELINE_REPEAT} or more")
+            regressions = compare_to_baseline(results['stages'], baseline['stages'], args.tolerance)
+            for stage, previous, current in regressions:
+                print(f"❌ Regression in {stage}: p50 {previous:.2f} ms -> {current:.2f} ms")
+            missing = missing_from_baseline(results['stages'], baseline['stages'])
+            for stage in missing:
+                print(f"❌ Stage {stage} is not in the baseline; re-record it with --save-baseline")
+            if regressions or missing:
+                sys.exit(1)
+            print("✅ No regressions against baseline")
+
+    if args.save_baseline:
+        print(f"💾 Baseline saved: {save_baseline(BASELINE_NAME, results)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Segmentation backend benchmark and smoke check
+
+Builds a tiny randomly initialised U-Net (models.unet_builder) into a
+scratch directory, runs it through UNetSegmenter on every available
+inference backend (opencv, onnxruntime) and compares latency and point
+counts with the default edge backend on the bundled images. The U-Net
+outputs are checked for shape and range, and the backends are checked to
+agree with each other, so the segmentation path is exercised without a
+trained model. Latencies are representative of the backends; the point
+counts of an untrained model are not.
+
+Usage (from the 'Hairline Growth Tracker' directory):
+    python benchmarks/bench_segmenter.py [--limit 20] [--repeat 3] [--output segmenter.json]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from bench_utils import PROJECT_DIR, summarize, peak_rss_mb
+
+from hairline_detector import HairlineDetector
+from models.unet_builder import build_tiny_unet
+from utils.hair_segmenter import UNetSegmenter
+
+IMAGE_DIR = 'data/input/datasets/celeba/images'
+INFERENCE_BACKENDS = ('opencv', 'onnxruntime')
+# Largest probability difference tolerated between inference backends
+BACKEND_TOLERANCE = 1e-3
+
+def collect_regions(detector, limit=None):
+    """Decoded bundled images with their forehead regions (faces found only)"""
+    samples = []
+    for path in sorted(glob.glob(os.path.join(PROJECT_DIR, IMAGE_DIR, '*'))):
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        detection = detector.face_detector.detect_face(image)
+        if not detection or not detection['success']:
+            continue
+        landmarks = detection['landmarks']
+        samples.append((image, landmarks, detector.face_detector.get_forehead_region(landmarks)))
+        if limit and len(samples) >= limit:
+            break
+    return samples
+
+def create_segmenters(model_path):
+    """UNetSegmenter per inference backend installed here"""
+    segmenters = {}
+    for backend in INFERENCE_BACKENDS:
+        try:
+            segmenters[backend] = UNetSegmenter(model_path=model_path, backend=backend)
+        except ImportError as e:
+            print(f"⚠️ Skipping the '{backend}' backend: {e}")
+    return segmenters
+
+def time_backend(detect, samples, repeat):
+    """Per-call latencies and mean point count of one hairline backend"""
+    latencies, counts = [], []
+    for _ in range(repeat):
+        for sample in samples:
+            start = time.perf_counter()
+            points = detect(sample)
+            latencies.append(time.perf_counter() - start)
+            counts.append(len(points))
+    stats = summarize(latencies)
+    stats['mean_points'] = float(np.mean(counts)) if counts else 0.0
+    return stats
+
+def smoke_check(segmenters, samples):
+    """
+    Check U-Net outputs on the sample crops
+
+    Returns:
+        list: Failure messages (empty if every check passed)
+    """
+    failures = []
+    reference = next(iter(segmenters.values()))
+    crops = []
+    for image, _, region in samples:
+        crop, _ = reference.crop_forehead(image, np.asarray(region))
+        if crop is not None:
+            crops.append(crop)
+    if not crops:
+        return ["no forehead crops to check"]
+
+    masks = {}
+    width, height = reference.input_size
+    for backend, segmenter in segmenters.items():
+        masks[backend] = segmenter.predict_masks(crops)
+        if masks[backend].shape != (len(crops), height, width):
+            failures.append(f"{backend}: mask shape {masks[backend].shape}")
+        elif not np.all((masks[backend] >= 0) & (masks[backend] <= 1)):
+            failures.append(f"{backend}: probabilities outside [0, 1]")
+
+    backends = list(masks)
+    for other in backends[1:]:
+        difference = float(np.abs(masks[backends[0]] - masks[other]).max())
+        if difference > BACKEND_TOLERANCE:
+            failures.append(f"{backends[0]} vs {other}: max probability difference {difference:.2e}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--limit', type=int, default=20, help='bundled images with a face to use')
+    parser.add_argument('--repeat', type=int, default=3, help='passes over the images per backend')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    detector = HairlineDetector(segmenter=None)
+    samples = collect_regions(detector, args.limit)
+    if not samples:
+        print("❌ No bundled image with a detectable face")
+        return 1
+
+    with tempfile.TemporaryDirectory(prefix='hairline_segmenter_bench_') as work_dir:
+        try:
+            model_path = build_tiny_unet(os.path.join(work_dir, 'tiny_unet.onnx'))
+        except ImportError as e:
+            print(f"❌ {e}")
+            return 1
+        segmenters = create_segmenters(model_path)
+        if not segmenters:
+            print("❌ No segmentation inference backend available")
+            return 1
+        for segmenter in segmenters.values():
+            segmenter.warm_up()
+
+        results = {
+            'images': len(samples),
+            'backends': {
+                'edges': time_backend(
+                    lambda s: detector.detect_hairline_points(*s), samples, args.repeat)
+            },
+            'smoke_failures': smoke_check(segmenters, samples)
+        }
+        for backend, segmenter in segmenters.items():
+            results['backends'][f'unet/{backend}'] = time_backend(
+                lambda s, seg=segmenter: seg.detect_hairline_points(s[0], s[2]), samples, args.repeat)
+    results['peak_rss_mb'] = peak_rss_mb()
+
+    print(f"⏱️ Segmentation benchmark ({results['images']} images x {args.repeat})")
+    for backend, stats in results['backends'].items():
+        print(f"   {backend:<18} p50 {stats['p50_ms']:7.2f} ms   p95 {stats['p95_ms']:7.2f} ms   "
+              f"{stats['mean_points']:7.1f} points")
+    if results['peak_rss_mb'] is not None:
+        print(f"   peak RSS {results['peak_rss_mb']:.0f} MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results saved: {args.output}")
+
+    if results['smoke_failures']:
+        for failure in results['smoke_failures']:
+            print(f"❌ {failure}")
+        return 1
+    print("✅ U-Net smoke check passed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
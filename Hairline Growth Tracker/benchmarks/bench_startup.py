@@ -0,0 +1,100 @@
+"""
+Startup benchmark for the Hairline Tracker
+
+Measures, in fresh interpreter processes:
+- import time of the main modules (what every CLI run / batch job pays)
+- time-to-first-analysis: interpreter start -> first hairline analysis done
+
+Usage (from the 'Hairline Growth Tracker' directory):
+    python benchmarks/bench_startup.py [--runs 5] [--output startup.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_IMAGE = 'data/input/raw_images/kamal.jpg'
+
+IMPORT_TARGETS = ['main', 'hairline_detector', 'progress_tracker', 'data.data_manager']
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{'seconds': time.perf_counter() - start, 'modules': len(sys.modules)}}))
+"""
+
+FIRST_ANALYSIS_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import cv2
+from main import HairlineTrackerApp
+imported = time.perf_counter()
+app = HairlineTrackerApp()
+image = cv2.imread({image!r})
+result = app.detector.analyze_hairline(image)
+done = time.perf_counter()
+print(json.dumps({{'import_seconds': imported - start, 'seconds': done - start,
+                  'success': result is not None}}))
+"""
+
+def run_script(script):
+    """Run a script in a fresh interpreter and return its last JSON line"""
+    completed = subprocess.run(
+        [sys.executable, '-c', script], cwd=PROJECT_DIR,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def bench_imports(runs):
+    """Median import time per module over several fresh processes"""
+    results = {}
+    for module in IMPORT_TARGETS:
+        samples = [run_script(IMPORT_SCRIPT.format(module=module)) for _ in range(runs)]
+        results[module] = {
+            'median_seconds': statistics.median(s['seconds'] for s in samples),
+            'modules_loaded': samples[-1]['modules']
+        }
+    return results
+
+def bench_first_analysis(runs, image_path):
+    """Median time from interpreter start to the first completed analysis"""
+    samples = [run_script(FIRST_ANALYSIS_SCRIPT.format(image=image_path)) for _ in range(runs)]
+    return {
+        'median_seconds': statistics.median(s['seconds'] for s in samples),
+        'median_import_seconds': statistics.median(s['import_seconds'] for s in samples),
+        'success': all(s['success'] for s in samples)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per measurement')
+    parser.add_argument('--image', default=SAMPLE_IMAGE, help='image for time-to-first-analysis')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    results = {
+        'python': sys.version.split()[0],
+        'imports': bench_imports(args.runs),
+        'first_analysis': bench_first_analysis(args.runs, args.image)
+    }
+
+    print("⏱️ Startup benchmark")
+    for module, stats in results['imports'].items():
+        print(f"   import {module:<20} {stats['median_seconds'] * 1000:8.1f} ms "
+              f"({stats['modules_loaded']} modules)")
+    first = results['first_analysis']
+    print(f"   time-to-first-analysis   {first['median_seconds'] * 1000:8.1f} ms "
+          f"(success: {first['success']})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results saved: {args.output}")
+
+if __name__ == "__main__":
+    main()
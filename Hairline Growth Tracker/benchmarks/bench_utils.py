@@ -0,0 +1,95 @@
+"""
+Shared helpers for the benchmark scripts: latency summaries, peak RSS and
+JSON baselines for catching regressions
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(PROJECT_DIR, 'benchmarks', 'baselines')
+
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+def summarize(samples, items_per_sample=1):
+    """
+    Summarize latency samples (seconds)
+
+    Returns:
+        dict: count, p50/p95/mean in milliseconds and throughput per second
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    if len(samples) == 0:
+        return {'count': 0}
+
+    total = samples.sum()
+    return {
+        'count': int(len(samples)),
+        'p50_ms': float(np.percentile(samples, 50) * 1000),
+        'p95_ms': float(np.percentile(samples, 95) * 1000),
+        'mean_ms': float(samples.mean() * 1000),
+        'throughput_per_s': float(len(samples) * items_per_sample / total) if total > 0 else None
+    }
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, f'{name}.json')
+
+def save_baseline(name, results):
+    """Store results as the new baseline for a benchmark"""
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = baseline_path(name)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    return path
+
+def load_baseline(name):
+    path = baseline_path(name)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def compare_to_baseline(stages, baseline_stages, tolerance=0.2, metric='p50_ms'):
+    """
+    Compare per-stage latencies with a baseline
+
+    Returns:
+        list: (stage, baseline, current) tuples that regressed by more than tolerance
+    """
+    regressions = []
+    for stage, stats in stages.items():
+        previous = baseline_stages.get(stage, {}).get(metric)
+        current = stats.get(metric)
+        if previous is None or current is None:
+            continue
+        if current > previous * (1 + tolerance):
+            regressions.append((stage, previous, current))
+    return regressions
+
+def missing_from_baseline(stages, baseline_stages, metric='p50_ms'):
+    """
+    Stages measured now that the baseline has no value for (added after it
+    was recorded), which compare_to_baseline cannot check
+
+    Returns:
+        list: Stage names
+    """
+    return [stage for stage, stats in stages.items()
+            if stats.get(metric) is not None and baseline_stages.get(stage, {}).get(metric) is None]
@@ -8,12 +8,29 @@ Handles all data input/output operations including:
 - Data export functionality
 """
 
-from .data_manager import DataManager
+import importlib
 
-__all__ = ['DataManager']
+# DataManager and ImageIndex pull in OpenCV, so they are imported on first access (PEP 562)
+_LAZY_ATTRIBUTES = {
+    'DataManager': '.data_manager',
+    'ImageIndex': '.image_index',
+    'RetentionEngine': '.retention',
+}
+
+__all__ = ['DataManager', 'ImageIndex', 'RetentionEngine']
 
 __version__ = "1.0.0"
 
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
+
 def about():
     """Print data package information"""
     print("Data Management Package for Hairline Tracker")
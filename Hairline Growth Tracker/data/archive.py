@@ -0,0 +1,201 @@
+"""
+Archival tier for old analyses and input images
+
+Old sessions of a user are packed into one zip bundle per archive run:
+analysis JSON is deflate-compressed, images are stored as-is (JPEG/PNG do
+not compress further). The zip central directory gives random access to
+single members, and an index (user -> session timestamp -> bundle and
+member names) locates any session without opening other bundles. Archive
+and retention runs in several processes share the index through an
+inter-process lock and re-read it before changing it.
+"""
+
+import json
+import os
+import zipfile
+from collections import defaultdict
+from utils.file_lock import FileLock, atomic_write_json
+
+class ArchiveStore:
+    def __init__(self, root="data/archive"):
+        """
+        Args:
+            root: Bundle directory (one subdirectory per user); the index
+                is root/index.json
+        """
+        self.root = root
+        self.index_file = os.path.join(root, "index.json")
+        self.lock = FileLock(self.index_file + '.lock')
+        self.index = self.load()
+
+    def load(self):
+        """Index: user_id -> timestamp -> {'bundle', 'analysis', 'images'}"""
+        if not os.path.exists(self.index_file):
+            return {}
+        with open(self.index_file, 'r') as f:
+            return json.load(f)
+
+    def sessions(self, user_id):
+        return self.index.get(user_id, {})
+
+    def add_bundle(self, user_id, sessions, blob_path):
+        """
+        Pack sessions of a user into a new bundle and index them
+
+        Args:
+            sessions: Mapping timestamp -> {'analysis': JSON path or None,
+                'images': blob reference records}
+            blob_path: callable(digest, ext) -> blob file path
+
+        Returns:
+            str: Bundle path, or None if there was nothing to pack
+        """
+        timestamps = sorted(sessions)
+        if not timestamps:
+            return None
+
+        with self.lock:
+            self.index = self.load()
+            return self._add_bundle(user_id, sessions, timestamps, blob_path)
+
+    def _add_bundle(self, user_id, sessions, timestamps, blob_path):
+        directory = os.path.join(self.root, user_id)
+        os.makedirs(directory, exist_ok=True)
+        name = f"{user_id}_{timestamps[0]}_{timestamps[-1]}"
+        bundle = os.path.join(directory, f"{name}.zip")
+        suffix = 1
+        while os.path.exists(bundle):
+            suffix += 1
+            bundle = os.path.join(directory, f"{name}_{suffix}.zip")
+
+        entries = {}
+        written = set()
+        tmp_path = bundle + '.tmp'
+        with zipfile.ZipFile(tmp_path, 'w') as zf:
+            for timestamp in timestamps:
+                session = sessions[timestamp]
+                entry = {'bundle': bundle, 'analysis': None, 'images': []}
+                analysis_path = session.get('analysis')
+                if analysis_path and os.path.exists(analysis_path):
+                    entry['analysis'] = f"analyses/{timestamp}.json"
+                    zf.write(analysis_path, entry['analysis'], compress_type=zipfile.ZIP_DEFLATED)
+                for reference in session.get('images', []):
+                    member = f"images/{reference['digest']}{reference['ext']}"
+                    path = blob_path(reference['digest'], reference['ext'])
+                    if member not in written and os.path.exists(path):
+                        zf.write(path, member, compress_type=zipfile.ZIP_STORED)
+                        written.add(member)
+                    if member in written:
+                        entry['images'].append(member)
+                if entry['analysis'] or entry['images']:
+                    entries[timestamp] = entry
+        os.replace(tmp_path, bundle)
+
+        self.index.setdefault(user_id, {}).update(entries)
+        atomic_write_json(self.index_file, self.index, fsync=False)
+        return bundle
+
+    def prune(self, analyses_before=None, images_before=None, user_ids=None):
+        """
+        Drop archived analyses and images of sessions older than the given
+        timestamps (None keeps that kind), then delete bundles left empty
+        and rewrite the others without the dropped members
+
+        Returns:
+            dict: 'sessions' (index entries removed), 'bundles' (deleted),
+                'rewritten' (bundles rewritten) and 'bytes' reclaimed
+        """
+        with self.lock:
+            self.index = self.load()
+            return self._prune(analyses_before, images_before, user_ids)
+
+    def _prune(self, analyses_before, images_before, user_ids):
+        result = {'sessions': 0, 'bundles': 0, 'rewritten': 0, 'bytes': 0}
+        changed = set()
+        for user_id in list(self.index if user_ids is None else user_ids):
+            sessions = self.index.get(user_id)
+            if not sessions:
+                continue
+            for timestamp in list(sessions):
+                entry = sessions[timestamp]
+                drop_analysis = entry['analysis'] and analyses_before is not None and timestamp < analyses_before
+                drop_images = entry['images'] and images_before is not None and timestamp < images_before
+                if not (drop_analysis or drop_images):
+                    continue
+                changed.add(entry['bundle'])
+                if drop_analysis:
+                    entry['analysis'] = None
+                if drop_images:
+                    entry['images'] = []
+                if not entry['analysis'] and not entry['images']:
+                    del sessions[timestamp]
+                    result['sessions'] += 1
+            if not sessions:
+                del self.index[user_id]
+        if not changed:
+            return result
+
+        # Members still referenced by the remaining entries, per bundle
+        keep = defaultdict(set)
+        for sessions in self.index.values():
+            for entry in sessions.values():
+                if entry['bundle'] in changed:
+                    if entry['analysis']:
+                        keep[entry['bundle']].add(entry['analysis'])
+                    keep[entry['bundle']].update(entry['images'])
+
+        for bundle in changed:
+            if not os.path.exists(bundle):
+                continue
+            size = os.stat(bundle).st_size
+            if not keep[bundle]:
+                os.remove(bundle)
+                result['bundles'] += 1
+                result['bytes'] += size
+                continue
+            tmp_path = bundle + '.tmp'
+            with zipfile.ZipFile(bundle) as source, zipfile.ZipFile(tmp_path, 'w') as target:
+                for info in source.infolist():
+                    if info.filename in keep[bundle]:
+                        target.writestr(info, source.read(info))
+            os.replace(tmp_path, bundle)
+            result['rewritten'] += 1
+            result['bytes'] += size - os.stat(bundle).st_size
+
+        atomic_write_json(self.index_file, self.index, fsync=False)
+        return result
+
+    def read_analysis(self, user_id, timestamp):
+        """Archived analysis of one session, or None"""
+        entry = self.sessions(user_id).get(timestamp)
+        if not entry or not entry['analysis']:
+            return None
+        with zipfile.ZipFile(entry['bundle']) as zf:
+            return json.loads(zf.read(entry['analysis']))
+
+    def read_analyses(self, user_id):
+        """
+        All archived analyses of a user, opening each bundle once
+
+        Returns:
+            dict: timestamp -> analysis
+        """
+        by_bundle = defaultdict(list)
+        for timestamp, entry in self.sessions(user_id).items():
+            if entry['analysis']:
+                by_bundle[entry['bundle']].append((timestamp, entry['analysis']))
+
+        analyses = {}
+        for bundle, members in by_bundle.items():
+            with zipfile.ZipFile(bundle) as zf:
+                for timestamp, member in members:
+                    analyses[timestamp] = json.loads(zf.read(member))
+        return analyses
+
+    def read_image(self, user_id, timestamp):
+        """Encoded bytes of a session's (first) archived input image, or None"""
+        entry = self.sessions(user_id).get(timestamp)
+        if not entry or not entry['images']:
+            return None
+        with zipfile.ZipFile(entry['bundle']) as zf:
+            return zf.read(entry['images'][0])
@@ -0,0 +1,160 @@
+"""
+Content-addressed storage of input images
+
+Each distinct image is stored once under its SHA-256 digest, with the
+original file bytes (no re-encoding). Users and sessions refer to blobs
+through reference records in an append-only manifest; a blob is garbage
+once its last reference is released. The manifest is shared between
+processes: appends, rewrites and garbage collection take an inter-process
+lock and rewrites start from the file, not from this process's copy.
+"""
+
+import hashlib
+import json
+import os
+from collections import Counter
+from utils.file_lock import FileLock, atomic_write_bytes
+
+class BlobStore:
+    def __init__(self, root="data/input/blobs", manifest_file="data/input/user_data/image_refs.jsonl"):
+        """
+        Args:
+            root: Blob directory (blobs are fanned out by digest prefix)
+            manifest_file: JSON-lines reference records ('digest', 'ext',
+                'size', 'user_id', 'timestamp', 'source')
+        """
+        self.root = root
+        self.manifest_file = manifest_file
+        # Also held by callers across put() + add_reference(), so a
+        # collection cannot delete a blob between the two
+        self.lock = FileLock(manifest_file + '.lock')
+        self.references = []
+        self.counts = Counter()
+        # Digests whose last reference was released since the last collection
+        self.orphans = {}
+        self.load()
+
+    def load(self):
+        """(Re)read the references, including other processes' changes"""
+        references, counts = [], Counter()
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        reference = json.loads(line)
+                        references.append(reference)
+                        counts[reference['digest']] += 1
+        with self.lock:
+            self.references, self.counts = references, counts
+
+    def blob_path(self, digest, ext):
+        return os.path.join(self.root, digest[:2], f"{digest}{ext}")
+
+    @staticmethod
+    def digest(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def put(self, data, ext=".jpg", digest=None):
+        """
+        Store bytes under their digest (no write if already stored)
+
+        Returns:
+            tuple: (digest, blob path, True if the blob was written)
+        """
+        digest = digest or self.digest(data)
+        path = self.blob_path(digest, ext)
+        if os.path.exists(path):
+            return digest, path, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write_bytes(path, data, fsync=False)
+        return digest, path, True
+
+    def add_reference(self, digest, ext, user_id, timestamp, source=None):
+        """Record that a user's session uses a blob"""
+        with self.lock:
+            # Raises if another process collected the blob since put()
+            reference = {
+                'digest': digest,
+                'ext': ext,
+                'size': os.path.getsize(self.blob_path(digest, ext)),
+                'user_id': user_id,
+                'timestamp': timestamp,
+                'source': source
+            }
+            os.makedirs(os.path.dirname(self.manifest_file) or '.', exist_ok=True)
+            with open(self.manifest_file, 'a') as f:
+                f.write(json.dumps(reference) + '\n')
+            self.references.append(reference)
+            self.counts[digest] += 1
+            self.orphans.pop(digest, None)
+        return reference
+
+    def user_references(self, user_id):
+        return [reference for reference in self.references if reference['user_id'] == user_id]
+
+    def release(self, user_ids=None, before=None):
+        """
+        Drop references of the given users (all users if None), only of
+        sessions older than the 'before' timestamp if given, and rewrite
+        the manifest once
+
+        Returns:
+            list: Released reference records
+        """
+        users = None if user_ids is None else set(user_ids)
+        with self.lock:
+            self.load()
+            released, kept = [], []
+            for reference in self.references:
+                if ((users is None or reference['user_id'] in users)
+                        and (before is None or reference['timestamp'] < before)):
+                    released.append(reference)
+                else:
+                    kept.append(reference)
+            if not released:
+                return []
+
+            self.references = kept
+            for reference in released:
+                self.counts[reference['digest']] -= 1
+                if self.counts[reference['digest']] <= 0:
+                    del self.counts[reference['digest']]
+                    self.orphans[reference['digest']] = reference['ext']
+            lines = ''.join(json.dumps(reference) + '\n' for reference in kept)
+            atomic_write_bytes(self.manifest_file, lines.encode(), fsync=False)
+        return released
+
+    def collect_garbage(self, full=False):
+        """
+        Delete blobs without references
+
+        Args:
+            full: Also sweep the blob directory for orphans left behind by
+                an interrupted run (otherwise only blobs released by this
+                process are checked)
+
+        Returns:
+            tuple: (blobs deleted, bytes reclaimed)
+        """
+        with self.lock:
+            # Current counts: another process may have referenced an orphan again
+            self.load()
+            candidates = dict(self.orphans)
+            self.orphans.clear()
+            if full and os.path.isdir(self.root):
+                for prefix in os.listdir(self.root):
+                    for filename in os.listdir(os.path.join(self.root, prefix)):
+                        digest, ext = os.path.splitext(filename)
+                        if not filename.startswith('.') and digest not in self.counts:
+                            candidates[digest] = ext
+
+            deleted, reclaimed = 0, 0
+            for digest, ext in candidates.items():
+                if digest in self.counts:
+                    continue
+                path = self.blob_path(digest, ext)
+                if os.path.exists(path):
+                    reclaimed += os.path.getsize(path)
+                    os.remove(path)
+                    deleted += 1
+        return deleted, reclaimed
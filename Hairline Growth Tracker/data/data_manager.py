@@ -2,38 +2,72 @@ import os
 import json
 import cv2
 import shutil
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, timedelta
 import numpy as np
+from utils.metrics import VALIDATION_REJECTIONS, STORE_WRITE_SECONDS
+from utils.hairline_profile import storable_result
+from utils.timestamps import session_timestamp
+from data.blob_store import BlobStore
+from data.manifest import OutputManifest, OUTPUT_NAME
+from data.archive import ArchiveStore
+from models.config import ModelConfig
+
+def convert_numpy_types(obj):
+    """Convert numpy types to Python types for JSON serialization"""
+    if isinstance(obj, (np.integer, np.floating)):
+        return float(obj)
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, np.datetime64):
+        return str(obj)
+    return obj
 
 class DataManager:
+    DIRECTORIES = [
+        'data/input/raw_images',
+        'data/input/blobs',
+        'data/input/processed_images', 
+        'data/input/user_data',
+        'data/input/datasets',
+        'data/output/analysis_results',
+        'data/output/progress_reports',
+        'data/output/visualizations',
+        'data/output/aligned_crops',
+        'data/output/exports'
+    ]
+    
     def __init__(self):
-        self.setup_directories()
+        # Directories are created on first write, keeping construction free of I/O
+        self.directories_ready = False
+        # Optional WriteBehindQueue: output writes are queued instead of blocking
+        self.write_behind = None
+        self._blob_store = None
+        self._manifest = None
+        self._archive = None
         self.dataset_links = {
             'celeba': 'http://mmlab.ie.cuhk.edu.hk/projects/CelebA.html',
             'wider_face': 'http://shuoyang1213.me/WIDERFACE/',
         }
-        print("✅ Data Manager initialized successfully!")
     
     def setup_directories(self):
         """Create all necessary data directories"""
-        directories = [
-            'data/input/raw_images',
-            'data/input/processed_images', 
-            'data/input/user_data',
-            'data/input/datasets',
-            'data/output/analysis_results',
-            'data/output/progress_reports',
-            'data/output/visualizations',
-            'data/output/exports'
-        ]
-        
-        for directory in directories:
-            os.makedirs(directory, exist_ok=True)
+        self.directories_ready = False
+        self.ensure_directories()
         print("✅ All data directories created successfully!")
     
+    def ensure_directories(self):
+        """Create the data directories once, silently, before the first write"""
+        if self.directories_ready:
+            return
+        for directory in self.DIRECTORIES:
+            os.makedirs(directory, exist_ok=True)
+        self.directories_ready = True
+    
     def create_sample_images(self):
         """Create sample synthetic images for testing"""
         print("🖼️ Creating sample images for testing...")
+        self.ensure_directories()
         
         # Create 5 sample images with different hairline positions
         for i in range(5):
@@ -67,10 +101,12 @@ class DataManager:
         try:
             img = cv2.imread(image_path)
             if img is None:
+                VALIDATION_REJECTIONS.inc(reason='unreadable')
                 return False, "Cannot read image file"
             
             height, width = img.shape[:2]
             if height < 300 or width < 300:
+                VALIDATION_REJECTIONS.inc(reason='too_small')
                 return False, "Image too small (min 300x300 required)"
             
             # Check if image is too dark or too bright
@@ -78,121 +114,232 @@ class DataManager:
             avg_brightness = np.mean(gray)
             
             if avg_brightness < 50:
+                VALIDATION_REJECTIONS.inc(reason='too_dark')
                 return False, "Image too dark"
             elif avg_brightness > 200:
+                VALIDATION_REJECTIONS.inc(reason='too_bright')
                 return False, "Image too bright"
                 
             return True, "Image validated successfully"
             
         except Exception as e:
+            VALIDATION_REJECTIONS.inc(reason='error')
             return False, f"Error validating image: {str(e)}"
     
-    def save_input_image(self, image, user_id="default_user", image_name=None):
-        """Save input image with proper naming"""
-        if image_name is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            image_name = f"{user_id}_{timestamp}.jpg"
+    @property
+    def blob_store(self):
+        if self._blob_store is None:
+            self._blob_store = BlobStore()
+        return self._blob_store
+    
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self._manifest = OutputManifest()
+        return self._manifest
+    
+    @property
+    def archive(self):
+        if self._archive is None:
+            self._archive = ArchiveStore()
+        return self._archive
+    
+    def save_input_image(self, image, user_id="default_user", image_name=None, source_path=None, timestamp=None):
+        """
+        Store an input image once in the content-addressed blob store and
+        reference it from the user's session
+        
+        Args:
+            source_path: Original image file; its bytes are stored as-is
+                (only images without a file, e.g. webcam frames, are encoded)
+            image_name: Reference label when there is no source file
+            timestamp: Session timestamp of the reference (default: now)
+        
+        Returns:
+            str: Blob path, or None if the image could not be encoded
+        """
+        timestamp = timestamp or session_timestamp()
+        if source_path is not None:
+            with open(source_path, 'rb') as f:
+                data = f.read()
+            ext = os.path.splitext(source_path)[1].lower() or ".jpg"
+        else:
+            success, encoded = cv2.imencode(".jpg", image)
+            if not success:
+                print(f"❌ Failed to encode input image for user {user_id}")
+                return None
+            data, ext = encoded.tobytes(), ".jpg"
         
-        input_path = f"data/input/raw_images/{image_name}"
-        success = cv2.imwrite(input_path, image)
+        digest = BlobStore.digest(data)
+        self.ensure_directories()
+        args = (data, ext, digest, user_id, timestamp, source_path or image_name)
+        if self.write_behind is not None:
+            self.write_behind.submit(self._store_input_image, *args, False)
+        else:
+            self._store_input_image(*args)
+        return self.blob_store.blob_path(digest, ext)
+    
+    def _store_input_image(self, data, ext, digest, user_id, timestamp, source, verbose=True):
+        with self.blob_store.lock:
+            _, path, written = self.blob_store.put(data, ext, digest)
+            self.blob_store.add_reference(digest, ext, user_id, timestamp, source)
+        if verbose:
+            print(f"💾 Input image {'saved' if written else 'already stored'}: {path}")
+        return path
+    
+    def _save_image(self, path, image, description):
+        """Write an image now, or queue it when write-behind is enabled"""
+        self.ensure_directories()
+        if self.write_behind is not None:
+            self.write_behind.submit(self._write_image, path, image, description, False)
+            return path
+        return self._write_image(path, image, description)
+    
+    def _write_image(self, path, image, description, verbose=True):
+        success = cv2.imwrite(path, image)
         
         if success:
-            print(f"💾 Input image saved: {input_path}")
-            return input_path
+            if verbose:
+                print(f"💾 {description} saved: {path}")
+            return path
         else:
-            print(f"❌ Failed to save image: {input_path}")
+            print(f"❌ Failed to save {description.lower()}: {path}")
             return None
     
     def save_processed_image(self, image, user_id, description="processed"):
         """Save processed image"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_path = f"data/input/processed_images/{user_id}_{timestamp}_{description}.jpg"
-        
-        success = cv2.imwrite(output_path, image)
-        if success:
-            print(f"💾 Processed image saved: {output_path}")
-            return output_path
-        else:
-            print(f"❌ Failed to save processed image: {output_path}")
-            return None
+        self.manifest.record('processed_images', user_id, timestamp, output_path)
+        return self._save_image(output_path, image, "Processed image")
     
     def save_analysis_result(self, result, user_id, timestamp=None):
         """Save analysis results as JSON"""
         if timestamp is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = session_timestamp()
         
         result_path = f"data/output/analysis_results/{user_id}_{timestamp}.json"
+        result = storable_result(result)
+        self.ensure_directories()
         
-        # Convert numpy types to Python types for JSON serialization
-        def convert_numpy_types(obj):
-            if isinstance(obj, (np.integer, np.floating)):
-                return float(obj)
-            elif isinstance(obj, np.ndarray):
-                return obj.tolist()
-            elif isinstance(obj, np.datetime64):
-                return str(obj)
-            return obj
-        
-        with open(result_path, 'w') as f:
-            json.dump(result, f, indent=2, default=convert_numpy_types)
+        if self.write_behind is not None:
+            self.write_behind.submit(self._write_analysis_result, result_path, result)
+            return result_path
         
+        self._write_analysis_result(result_path, result)
         print(f"💾 Analysis results saved: {result_path}")
         return result_path
     
-    def save_progress_report(self, report, user_id, report_type="progress"):
+    def _write_analysis_result(self, result_path, result):
+        with STORE_WRITE_SECONDS.time(store='analysis_results'):
+            with open(result_path, 'w') as f:
+                json.dump(result, f, indent=2, default=convert_numpy_types)
+        return result_path
+    
+    def load_analysis_result(self, user_id, timestamp):
+        """Load a saved (or archived) analysis result, or None if there is none"""
+        result_path = f"data/output/analysis_results/{user_id}_{timestamp}.json"
+        if not os.path.exists(result_path):
+            return self.archive.read_analysis(user_id, timestamp)
+        with open(result_path, 'r') as f:
+            return json.load(f)
+    
+    def save_progress_report(self, report, user_id, report_type="progress", verbose=True):
         """Save progress report"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         report_path = f"data/output/progress_reports/{user_id}_{timestamp}_{report_type}.txt"
+        self.ensure_directories()
         
         with open(report_path, 'w') as f:
             f.write(report)
+        self.manifest.record('reports', user_id, timestamp, report_path)
         
-        print(f"💾 Progress report saved: {report_path}")
+        if verbose:
+            print(f"💾 Progress report saved: {report_path}")
         return report_path
     
-    def save_visualization(self, image, user_id, viz_type="analysis"):
-        """Save visualization image"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    def save_visualization(self, image, user_id, viz_type="analysis", thumbnail_size=None, timestamp=None):
+        """
+        Save visualization image (downscaled to thumbnail_size on its longest
+        side if given), named after the session timestamp when one is given
+        """
+        timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+        if thumbnail_size:
+            height, width = image.shape[:2]
+            scale = thumbnail_size / max(height, width)
+            if scale < 1.0:
+                image = cv2.resize(image, (round(width * scale), round(height * scale)),
+                                   interpolation=cv2.INTER_AREA)
+            viz_type = f"{viz_type}_thumb"
         viz_path = f"data/output/visualizations/{user_id}_{timestamp}_{viz_type}.jpg"
-        
-        success = cv2.imwrite(viz_path, image)
-        if success:
-            print(f"💾 Visualization saved: {viz_path}")
-            return viz_path
-        else:
-            print(f"❌ Failed to save visualization: {viz_path}")
+        self.manifest.record('visualizations', user_id, timestamp, viz_path)
+        return self._save_image(viz_path, image, "Visualization")
+    
+    def save_aligned_crop(self, crop, user_id, timestamp):
+        """Cache the canonical forehead crop of an analysis (lossless)"""
+        crop_path = f"data/output/aligned_crops/{user_id}_{timestamp}.png"
+        return self._save_image(crop_path, crop, "Aligned crop")
+    
+    def load_aligned_crop(self, user_id, timestamp):
+        """Load a cached canonical forehead crop, or None if it was not saved"""
+        crop_path = f"data/output/aligned_crops/{user_id}_{timestamp}.png"
+        if not os.path.exists(crop_path):
             return None
+        return cv2.imread(crop_path)
     
     def get_user_history(self, user_id):
-        """Get analysis history for a user"""
+        """
+        Get analysis history for a user, hot and archived
+        
+        Archived entries have 'path' None and the bundle in 'archive'.
+        """
         analysis_files = []
         results_path = "data/output/analysis_results"
         
-        if not os.path.exists(results_path):
-            return []
-            
-        for filename in os.listdir(results_path):
-            if filename.startswith(user_id) and filename.endswith('.json'):
+        if os.path.exists(results_path):
+            for filename in os.listdir(results_path):
+                if filename.startswith(user_id) and filename.endswith('.json'):
+                    analysis_files.append({
+                        'filename': filename,
+                        'path': os.path.join(results_path, filename),
+                        'timestamp': filename.replace(f"{user_id}_", "").replace(".json", "")
+                    })
+        
+        hot = {analysis_file['timestamp'] for analysis_file in analysis_files}
+        for timestamp, entry in self.archive.sessions(user_id).items():
+            if entry['analysis'] and timestamp not in hot:
                 analysis_files.append({
-                    'filename': filename,
-                    'path': os.path.join(results_path, filename),
-                    'timestamp': filename.replace(f"{user_id}_", "").replace(".json", "")
+                    'filename': f"{user_id}_{timestamp}.json",
+                    'path': None,
+                    'timestamp': timestamp,
+                    'archive': entry['bundle']
                 })
         
         return sorted(analysis_files, key=lambda x: x['timestamp'])
     
-    def export_user_data(self, user_id, export_format='json'):
-        """Export all user data for backup or transfer"""
+    def export_user_data(self, user_id, export_format='json', analyses=None, verbose=True):
+        """
+        Export all user data for backup or transfer
+        
+        Args:
+            analyses: Analysis records to export, e.g. from an already loaded
+                progress store snapshot (default: read the user's history)
+        """
         export_data = {
             'user_id': user_id,
             'export_date': datetime.now().isoformat(),
-            'analyses': [],
+            'analyses': list(analyses) if analyses is not None else [],
             'reports': []
         }
         
-        # Collect analysis results
-        analysis_files = self.get_user_history(user_id)
+        # Collect analysis results (archived ones with one read per bundle)
+        analysis_files = self.get_user_history(user_id) if analyses is None else []
+        archived = self.archive.read_analyses(user_id) if any(
+            analysis_file['path'] is None for analysis_file in analysis_files) else {}
         for analysis_file in analysis_files:
+            if analysis_file['path'] is None:
+                export_data['analyses'].append(archived[analysis_file['timestamp']])
+                continue
             try:
                 with open(analysis_file['path'], 'r') as f:
                     analysis_data = json.load(f)
@@ -203,13 +350,68 @@ class DataManager:
         # Export to file
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         export_path = f"data/output/exports/{user_id}_{timestamp}.{export_format}"
+        self.ensure_directories()
         
         with open(export_path, 'w') as f:
             json.dump(export_data, f, indent=2)
+        self.manifest.record('exports', user_id, timestamp, export_path)
         
-        print(f"📤 User data exported: {export_path}")
+        if verbose:
+            print(f"📤 User data exported: {export_path}")
         return export_path
     
+    def archive_old_data(self, days_old=None, user_ids=None):
+        """
+        Move analyses and input images older than days_old into per-user
+        compressed bundles; hot copies are deleted once bundled (input
+        image blobs only when no hot session still refers to them)
+        
+        Args:
+            days_old: Age limit (defaults to ModelConfig.ARCHIVE_AFTER_DAYS;
+                0 archives nothing)
+            user_ids: Only archive these users (default: everyone)
+        
+        Returns:
+            dict: user_id -> number of sessions archived
+        """
+        days_old = ModelConfig.ARCHIVE_AFTER_DAYS if days_old is None else days_old
+        if not days_old:
+            return {}
+        cutoff = (datetime.now() - timedelta(days=days_old)).strftime("%Y%m%d_%H%M%S")
+        users = None if user_ids is None else set(user_ids)
+        
+        # user_id -> timestamp -> {'analysis': path, 'images': [references]}
+        sessions = defaultdict(lambda: defaultdict(dict))
+        results_path = "data/output/analysis_results"
+        if os.path.exists(results_path):
+            for filename in os.listdir(results_path):
+                match = OUTPUT_NAME.match(filename)
+                if match and filename.endswith('.json') and match['timestamp'] < cutoff:
+                    sessions[match['user_id']][match['timestamp']]['analysis'] = os.path.join(results_path, filename)
+        self.blob_store.load()
+        for reference in self.blob_store.references:
+            if reference['timestamp'] < cutoff:
+                sessions[reference['user_id']][reference['timestamp']].setdefault('images', []).append(reference)
+        
+        archived = {}
+        for user_id, user_sessions in sessions.items():
+            if users is not None and user_id not in users:
+                continue
+            bundle = self.archive.add_bundle(user_id, user_sessions, self.blob_store.blob_path)
+            if bundle is None:
+                continue
+            self.blob_store.release([user_id], before=cutoff)
+            for session in user_sessions.values():
+                if session.get('analysis'):
+                    os.remove(session['analysis'])
+            archived[user_id] = len(user_sessions)
+            print(f"🗄️ Archived {len(user_sessions)} sessions of {user_id}: {bundle}")
+        
+        blobs, reclaimed = self.blob_store.collect_garbage()
+        if blobs:
+            print(f"🗄️ Moved {blobs} input images ({reclaimed / 1e6:.1f} MB) out of hot storage")
+        return archived
+    
     def batch_process_images(self, input_folder="data/input/raw_images", user_id="batch_user"):
         """Process all images in a folder"""
         valid_images = []
@@ -238,32 +440,21 @@ class DataManager:
         
         return valid_images, invalid_images
     
-    def cleanup_user_data(self, user_id, days_old=30):
-        """Clean up old user data"""
-        import time
-        current_time = time.time()
-        cutoff_time = current_time - (days_old * 24 * 60 * 60)
-        
-        cleaned_files = 0
-        
-        # Clean various directories
-        directories_to_clean = [
-            'data/input/raw_images',
-            'data/input/processed_images',
-            'data/output/analysis_results',
-            'data/output/progress_reports',
-            'data/output/visualizations'
-        ]
+    def cleanup_user_data(self, user_id, days_old=30, tracker=None):
+        """
+        Delete all of a user's data older than days_old (files, progress
+        store sessions, archived sessions and unreferenced input images)
         
-        for directory in directories_to_clean:
-            if os.path.exists(directory):
-                for filename in os.listdir(directory):
-                    if filename.startswith(user_id):
-                        filepath = os.path.join(directory, filename)
-                        if os.path.isfile(filepath) and os.path.getctime(filepath) < cutoff_time:
-                            os.remove(filepath)
-                            cleaned_files += 1
+        Uses the retention engine with one limit for every kind; see
+        data.retention.RetentionEngine for fleet-wide runs.
+        """
+        from data.retention import RetentionEngine, RETENTION_KINDS
         
+        # days_old=0 means everything, not the policy's 'keep forever'
+        days = days_old if days_old else -1e-9
+        engine = RetentionEngine(self, tracker, policy=dict.fromkeys(RETENTION_KINDS, days))
+        report = engine.run(user_ids=[user_id])
+        cleaned_files = sum(report[kind]['files'] for kind in RETENTION_KINDS) + report['archive']['bundles']
         print(f"🧹 Cleaned up {cleaned_files} old files for user {user_id}")
         return cleaned_files
 
@@ -274,6 +465,7 @@ def test_data_manager():
     print("🧪 Testing Data Manager...")
     
     # Test directory creation
+    dm.setup_directories()
     assert os.path.exists('data/input/raw_images'), "Raw images directory not created"
     assert os.path.exists('data/output/analysis_results'), "Analysis results directory not created"
     
@@ -0,0 +1,152 @@
+"""
+Perceptual-hash index of ingested photos
+
+Every analyzed photo is recorded with its 64-bit difference hash (dHash),
+which changes little under re-encoding, resizing and small exposure
+changes. Near-duplicates are found through a BK-tree over Hamming
+distance, so a lookup only visits a small part of the index instead of
+comparing against every photo. Appends from several processes are
+serialized by an inter-process lock, and each index picks up the others'
+entries before a lookup.
+"""
+
+import json
+import os
+import cv2
+import numpy as np
+from models.config import ModelConfig
+from utils.file_lock import FileLock
+from utils.timestamps import parse_timestamp, session_timestamp
+
+
+def dhash(image, hash_size=8):
+    """
+    64-bit difference hash of a BGR or grayscale image
+
+    Returns:
+        int: Bits are 1 where a pixel is brighter than its right neighbour
+            in a (hash_size, hash_size + 1) thumbnail
+    """
+    # Stride first: colour conversion and INTER_AREA then only see a small image
+    step = max(min(image.shape[0] // (4 * hash_size), image.shape[1] // (4 * (hash_size + 1))), 1)
+    small = np.ascontiguousarray(image[::step, ::step])
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    thumbnail = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    def __init__(self):
+        """Burkhard-Keller tree over Hamming distance: hash -> payloads"""
+        self.root = None
+        self.size = 0
+
+    def add(self, value, payload):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [payload], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(payload)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [payload], {}]
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        """
+        Returns:
+            list: (distance, payload) pairs within max_distance, closest first
+        """
+        matches = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= max_distance:
+                matches.extend((distance, payload) for payload in node[1])
+            # Triangle inequality: only subtrees in [d - r, d + r] can match
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(matches, key=lambda match: match[0])
+
+class ImageIndex:
+    def __init__(self, index_file="data/input/user_data/image_index.jsonl",
+                 max_distance=None, window_hours=None):
+        """
+        Args:
+            index_file: Append-only JSON-lines record of ingested photos
+            max_distance: Max Hamming distance for a near-duplicate
+            window_hours: Only photos of the same user within this window
+                count as duplicates (0 = any time)
+        """
+        self.index_file = index_file
+        self.max_distance = ModelConfig.DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+        self.window_hours = ModelConfig.DEDUP_WINDOW_HOURS if window_hours is None else window_hours
+        self.lock = FileLock(index_file + '.lock')
+        self.tree = BKTree()
+        self._offset = 0
+        self.load()
+
+    def load(self):
+        """Add the index file's entries past the last read offset to the BK-tree"""
+        if not os.path.exists(self.index_file):
+            return
+        with open(self.index_file, 'rb') as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        # Entries are complete once their newline is written
+        complete = chunk[:chunk.rfind(b'\n') + 1]
+        for line in complete.splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                self.tree.add(int(entry['hash'], 16), entry)
+        self._offset += len(complete)
+
+    def find_duplicate(self, image_hash, user_id, timestamp=None):
+        """
+        Closest earlier photo of the user within distance and time window
+
+        Returns:
+            dict: Index entry ('hash', 'user_id', 'timestamp', 'source', ...)
+                or None
+        """
+        timestamp = timestamp or session_timestamp()
+        self.load()
+        current = parse_timestamp(timestamp)
+        for _, entry in self.tree.search(image_hash, self.max_distance):
+            if entry['user_id'] != user_id or entry.get('duplicate_of'):
+                continue
+            if self.window_hours:
+                age = abs((current - parse_timestamp(entry['timestamp'])).total_seconds())
+                if age > self.window_hours * 3600:
+                    continue
+            return entry
+        return None
+
+    def add(self, image_hash, user_id, timestamp, source=None, duplicate_of=None):
+        """Record an ingested photo (or a skipped duplicate linked to an earlier one)"""
+        entry = {
+            'hash': f"{image_hash:016x}",
+            'user_id': user_id,
+            'timestamp': timestamp,
+            'source': source
+        }
+        if duplicate_of:
+            entry['duplicate_of'] = duplicate_of
+        os.makedirs(os.path.dirname(self.index_file) or '.', exist_ok=True)
+        with self.lock:
+            self.load()
+            with open(self.index_file, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+            self.load()
+        return entry
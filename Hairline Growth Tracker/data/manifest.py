@@ -0,0 +1,84 @@
+"""
+Manifest of generated output files
+
+DataManager records every visualization, report, export and processed
+image it writes (kind, user, timestamp, path) in an append-only JSON-lines
+file, so retention finds expired files from the manifest instead of
+scanning the output directories. Writers in several processes share the
+file through an inter-process lock; take() rewrites it from its current
+contents.
+"""
+
+import json
+import os
+import re
+from utils.file_lock import FileLock, atomic_write_bytes
+
+# {user_id}_{YYYYmmdd_HHMMSS}[_{suffix}].{ext}
+OUTPUT_NAME = re.compile(r'^(?P<user_id>.+?)_(?P<timestamp>\d{8}_\d{6})(?:_.*)?\.\w+$')
+
+class OutputManifest:
+    def __init__(self, manifest_file="data/output/manifest.jsonl"):
+        self.manifest_file = manifest_file
+        self.lock = FileLock(manifest_file + '.lock')
+        self.records = []
+        self.load()
+
+    def load(self):
+        """(Re)read the records, including other processes' appends"""
+        if not os.path.exists(self.manifest_file):
+            self.records = []
+            return
+        with open(self.manifest_file, 'r') as f:
+            self.records = [json.loads(line) for line in f if line.strip()]
+
+    def record(self, kind, user_id, timestamp, path):
+        """Append one output file record"""
+        entry = {'kind': kind, 'user_id': user_id, 'timestamp': timestamp, 'path': path}
+        with self.lock:
+            os.makedirs(os.path.dirname(self.manifest_file) or '.', exist_ok=True)
+            with open(self.manifest_file, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+            self.records.append(entry)
+        return entry
+
+    def take(self, predicate):
+        """
+        Remove the records matching predicate(record) and rewrite the
+        manifest once
+
+        Returns:
+            list: Removed records
+        """
+        with self.lock:
+            self.load()
+            taken, kept = [], []
+            for entry in self.records:
+                (taken if predicate(entry) else kept).append(entry)
+            if taken:
+                self.records = kept
+                lines = ''.join(json.dumps(entry) + '\n' for entry in kept)
+                atomic_write_bytes(self.manifest_file, lines.encode(), fsync=False)
+        return taken
+
+    def import_directory(self, kind, directory):
+        """
+        One-off migration: record files written before the manifest existed
+        (named {user_id}_{timestamp}...)
+
+        Returns:
+            int: Records added
+        """
+        if not os.path.isdir(directory):
+            return 0
+        added = 0
+        with self.lock:
+            self.load()
+            known = {entry['path'] for entry in self.records}
+            for filename in sorted(os.listdir(directory)):
+                path = f"{directory}/{filename}"
+                match = OUTPUT_NAME.match(filename)
+                if match and path not in known:
+                    self.record(kind, match['user_id'], match['timestamp'], path)
+                    added += 1
+        return added
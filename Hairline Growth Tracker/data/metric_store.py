@@ -0,0 +1,311 @@
+"""
+Memory-mapped columnar store of progress metrics
+
+Reports and fleet queries only need the scalar metrics (and the fixed-size
+hairline profiles) of each session, not the full analysis records. Every
+saved session is appended as one row to fixed-width column files that are
+memory-mapped with np.memmap, so reading a user's series is an array slice
+instead of parsing JSON, whatever the size of the stored landmarks.
+
+Rows are appended in arrival order; per-user offset arrays (rows grouped by
+user and sorted by time, CSR style) are derived on read.
+"""
+
+import json
+import os
+import numpy as np
+from models.config import ModelConfig
+from utils.file_lock import FileLock, atomic_write_json
+from utils.hairline_profile import profile_from_json
+from utils.timestamps import TIMESTAMP_FORMAT, timestamp_to_days
+
+SCALAR_METRICS = ('hairline_height', 'forehead_ratio', 'density_score', 'symmetry_score', 'recession_score')
+PROFILE_FIELDS = ('hairline_profile', 'aligned_profile')
+# Column layout version: stores written with another one are rebuilt
+LAYOUT = 2
+
+def timestamp_to_int(timestamp):
+    """
+    Session timestamp -> sortable int64: YYYYmmddHHMMSS * 10000 plus the
+    milliseconds + 1 ('YYYYmmdd_HHMMSS_mmm') or 0 ('YYYYmmdd_HHMMSS')
+    """
+    millis = int(timestamp[16:]) + 1 if len(timestamp) > 15 else 0
+    return int(timestamp[:15].replace('_', '')) * 10000 + millis
+
+def int_to_timestamp(value):
+    seconds, millis = divmod(int(value), 10000)
+    timestamp = f"{seconds // 1000000:08d}_{seconds % 1000000:06d}"
+    return f"{timestamp}_{millis - 1:03d}" if millis else timestamp
+
+class MetricStore:
+    def __init__(self, root="data/output/metric_store", profile_points=None):
+        """
+        Args:
+            root: Directory of the column files and meta.json (row count,
+                capacity and user ids)
+            profile_points: Width of the profile columns (defaults to
+                ModelConfig.HAIRLINE_PROFILE_POINTS)
+        """
+        self.root = root
+        self.meta_file = os.path.join(root, "meta.json")
+        self.lock = None
+        self.profile_points = profile_points or ModelConfig.HAIRLINE_PROFILE_POINTS
+        self.meta = {'count': 0, 'capacity': 0, 'generation': 0, 'users': [], 'profile_points': self.profile_points,
+                     'layout': LAYOUT}
+        self.user_codes = {}
+        self.columns = {}
+        self._meta_signature = None
+        self._index = None
+        self.refresh()
+
+    def column_specs(self):
+        """Column name -> (dtype, row shape)"""
+        specs = {'user': (np.int32, ()), 'timestamp': (np.int64, ()), 'days': (np.float64, ())}
+        specs.update({metric: (np.float64, ()) for metric in SCALAR_METRICS})
+        specs.update({field: (np.float32, (self.meta['profile_points'],)) for field in PROFILE_FIELDS})
+        return specs
+
+    def exists(self):
+        """True if the store holds rows in the current layout (otherwise it needs a rebuild)"""
+        self.refresh()
+        return os.path.exists(self.meta_file) and self.meta.get('layout') == LAYOUT
+
+    def __len__(self):
+        return self.meta['count']
+
+    def _get_lock(self):
+        if self.lock is None:
+            os.makedirs(self.root, exist_ok=True)
+            self.lock = FileLock(os.path.join(self.root, "meta.lock"))
+        return self.lock
+
+    def refresh(self):
+        """Pick up rows appended by other processes"""
+        try:
+            stat = os.stat(self.meta_file)
+        except FileNotFoundError:
+            return
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if signature == self._meta_signature:
+            return
+        with open(self.meta_file, 'r') as f:
+            meta = json.load(f)
+        # Remap when the files were grown or replaced (rebuild)
+        if any(meta.get(key) != self.meta.get(key) for key in ('capacity', 'generation', 'profile_points')):
+            self.columns = {}
+        self.meta = meta
+        self.user_codes = {user_id: code for code, user_id in enumerate(meta['users'])}
+        self._meta_signature = signature
+        self._index = None
+        self._map_columns()
+
+    def _map_columns(self):
+        if self.columns or not self.meta['capacity']:
+            return
+        for name, (dtype, shape) in self.column_specs().items():
+            self.columns[name] = np.memmap(os.path.join(self.root, f"{name}.bin"), dtype=dtype,
+                                           mode='r+', shape=(self.meta['capacity'],) + shape)
+
+    def _ensure_capacity(self, rows):
+        """Grow every column file (doubling) to hold at least rows rows"""
+        capacity = self.meta['capacity']
+        if rows <= capacity:
+            return
+        new_capacity = max(capacity, 1024)
+        while new_capacity < rows:
+            new_capacity *= 2
+        self.columns = {}
+        for name, (dtype, shape) in self.column_specs().items():
+            row_bytes = np.dtype(dtype).itemsize * int(np.prod(shape, dtype=np.int64))
+            with open(os.path.join(self.root, f"{name}.bin"), 'ab') as f:
+                f.truncate(new_capacity * row_bytes)
+        self.meta['capacity'] = new_capacity
+        self._map_columns()
+
+    def _encode(self, records):
+        """
+        Column arrays for (user_id, timestamp, result) records; sessions
+        whose timestamp is in neither session form cannot be keyed and are
+        left out with a warning
+        """
+        parsed = []
+        for user_id, timestamp, result in records:
+            try:
+                days = timestamp_to_days(timestamp)
+            except (TypeError, ValueError):
+                print(f"⚠️ Session {user_id}/{timestamp} left out of the metric store: "
+                      f"timestamp is not {TIMESTAMP_FORMAT}[_mmm]")
+                continue
+            parsed.append((user_id, timestamp, days, result))
+
+        specs = self.column_specs()
+        encoded = {name: np.full((len(parsed),) + shape, np.nan if np.issubdtype(dtype, np.floating) else 0,
+                                 dtype=dtype)
+                   for name, (dtype, shape) in specs.items()}
+        for row, (user_id, timestamp, days, result) in enumerate(parsed):
+            code = self.user_codes.get(user_id)
+            if code is None:
+                code = self.user_codes[user_id] = len(self.meta['users'])
+                self.meta['users'].append(user_id)
+            encoded['user'][row] = code
+            encoded['timestamp'][row] = timestamp_to_int(timestamp)
+            encoded['days'][row] = days
+            for metric in SCALAR_METRICS:
+                value = result.get(metric)
+                if value is not None:
+                    encoded[metric][row] = value
+            for field in PROFILE_FIELDS:
+                profile = result.get(field)
+                if profile is not None and len(profile) == self.meta['profile_points']:
+                    encoded[field][row] = profile_from_json(profile)
+        return encoded
+
+    def _write_meta(self):
+        atomic_write_json(self.meta_file, self.meta, fsync=False)
+        stat = os.stat(self.meta_file)
+        self._meta_signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        self._index = None
+
+    def append(self, records):
+        """Append (user_id, timestamp, result) records as rows"""
+        if not records:
+            return
+        with self._get_lock():
+            self.refresh()
+            start = self.meta['count']
+            encoded = self._encode(records)
+            count = len(encoded['user'])
+            if not count:
+                return
+            self._ensure_capacity(start + count)
+            for name, values in encoded.items():
+                self.columns[name][start:start + count] = values
+                self.columns[name].flush()
+            # Rows become visible with the count, after their data is written
+            self.meta['count'] = start + count
+            self._write_meta()
+
+    def rebuild(self, data):
+        """
+        Replace all rows with the sessions of a progress store
+        (data: user_id -> timestamp -> record)
+        """
+        records = [(user_id, timestamp, record)
+                   for user_id, sessions in data.items() for timestamp, record in sessions.items()]
+        with self._get_lock():
+            # Bump the generation other processes last saw, not a stale one
+            self.refresh()
+            self.columns = {}
+            for name in self.column_specs():
+                path = os.path.join(self.root, f"{name}.bin")
+                if os.path.exists(path):
+                    os.remove(path)
+            generation = self.meta.get('generation', 0) + 1
+            self.meta = {'count': 0, 'capacity': 0, 'generation': generation, 'users': [],
+                         'profile_points': self.profile_points, 'layout': LAYOUT}
+            self.user_codes = {}
+            encoded = self._encode(records)
+            count = len(encoded['user'])
+            self._ensure_capacity(count)
+            for name, values in encoded.items():
+                if count:
+                    self.columns[name][:count] = values
+                    self.columns[name].flush()
+            self.meta['count'] = count
+            self._write_meta()
+
+    def index(self):
+        """
+        Rows grouped by user and sorted by time (the last row wins when a
+        session was saved twice)
+
+        Returns:
+            tuple: ((R,) row order, (U + 1,) per-user offsets into it)
+        """
+        if self._index is None:
+            count = self.meta['count']
+            users = np.asarray(self.columns['user'][:count]) if count else np.empty(0, np.int32)
+            timestamps = np.asarray(self.columns['timestamp'][:count]) if count else np.empty(0, np.int64)
+            order = np.lexsort((np.arange(count), timestamps, users))
+            sorted_users, sorted_times = users[order], timestamps[order]
+            last = np.ones(count, dtype=bool)
+            last[:-1] = (sorted_users[1:] != sorted_users[:-1]) | (sorted_times[1:] != sorted_times[:-1])
+            order = order[last]
+            offsets = np.searchsorted(users[order], np.arange(len(self.meta['users']) + 1))
+            self._index = (order, offsets)
+        return self._index
+
+    def user_ids(self):
+        """Users with at least one row, in user code order"""
+        self.refresh()
+        _, offsets = self.index()
+        return [user_id for code, user_id in enumerate(self.meta['users']) if offsets[code + 1] > offsets[code]]
+
+    def user_rows(self, user_id):
+        """Row numbers of a user's sessions in time order"""
+        self.refresh()
+        code = self.user_codes.get(user_id)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        order, offsets = self.index()
+        return order[offsets[code]:offsets[code + 1]]
+
+    def user_series(self, user_id, fields=SCALAR_METRICS):
+        """
+        A user's sessions in time order
+
+        Returns:
+            dict: 'timestamps' (session timestamps), 'days' and one
+                array per requested field
+        """
+        rows = self.user_rows(user_id)
+        series = {'timestamps': [int_to_timestamp(value) for value in self.columns['timestamp'][rows]] if len(rows) else [],
+                  'days': self.columns['days'][rows] if len(rows) else np.empty(0)}
+        for field in fields:
+            series[field] = self.columns[field][rows] if len(rows) else np.empty(0)
+        return series
+
+    def user_records(self, user_id, fields=SCALAR_METRICS + PROFILE_FIELDS):
+        """
+        Lightweight per-session records (timestamp -> {field: value}) for
+        code written against progress-store records; missing values are None
+        """
+        series = self.user_series(user_id, fields)
+        records = {}
+        for row, timestamp in enumerate(series['timestamps']):
+            record = {}
+            for field in fields:
+                value = series[field][row]
+                if np.ndim(value):
+                    record[field] = value.astype(np.float64) if np.isfinite(value).any() else None
+                else:
+                    record[field] = float(value) if np.isfinite(value) else None
+            records[timestamp] = record
+        return records
+
+    def padded(self, metric, user_ids=None):
+        """
+        One metric for many users as NaN-padded arrays (fleet queries)
+
+        Returns:
+            tuple: (user ids, (U, N) days, (U, N) values), rows left-aligned
+                in time order
+        """
+        self.refresh()
+        order, offsets = self.index()
+        user_ids = self.user_ids() if user_ids is None else list(user_ids)
+        codes = np.array([self.user_codes.get(user_id, -1) for user_id in user_ids], dtype=np.int64)
+        known = codes >= 0
+        starts = np.where(known, offsets[np.maximum(codes, 0)], 0)
+        lengths = np.where(known, offsets[np.maximum(codes, 0) + 1] - starts, 0)
+
+        width = int(lengths.max()) if len(lengths) else 0
+        times = np.full((len(user_ids), width), np.nan)
+        values = np.full((len(user_ids), width), np.nan)
+        if lengths.sum():
+            row_index = np.repeat(np.arange(len(user_ids)), lengths)
+            column_index = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            rows = order[np.repeat(starts, lengths) + column_index]
+            times[row_index, column_index] = self.columns['days'][rows]
+            values[row_index, column_index] = self.columns[metric][rows]
+        return user_ids, times, values
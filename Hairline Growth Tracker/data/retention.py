@@ -0,0 +1,209 @@
+"""
+Fleet-wide data retention
+
+Expired data is found from the stores' own indexes instead of directory
+scans: input image references (BlobStore), generated outputs
+(OutputManifest), analysis sessions (progress store) and archived
+sessions (ArchiveStore, following the analyses and input image limits). Per-session files
+(analysis results, aligned crops, cached comparisons) follow from the
+session keys. One run covers every user in a single pass over the indexes,
+deletes in batches (optionally on a background thread), compacts the
+progress store and reports what it reclaimed.
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from models.config import ModelConfig
+
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+RETENTION_KINDS = ('input_images', 'analyses', 'visualizations', 'reports', 'exports', 'processed_images')
+
+# Directories written before the output manifest existed, by kind
+LEGACY_DIRECTORIES = {
+    'input_images': 'data/input/raw_images',
+    'processed_images': 'data/input/processed_images',
+    'analyses': 'data/output/analysis_results',
+    'visualizations': 'data/output/visualizations',
+    'reports': 'data/output/progress_reports',
+    'exports': 'data/output/exports'
+}
+
+class RetentionEngine:
+    def __init__(self, data_manager, tracker=None, policy=None, batch_size=None,
+                 batch_pause=None, comparisons_dir="data/output/comparisons"):
+        """
+        Args:
+            data_manager: DataManager (blob store and output manifest)
+            tracker: ProgressTracker of the progress store (created on first
+                use if not given)
+            policy: Mapping kind -> max age in days; kinds missing or set
+                to 0 are kept forever (defaults to ModelConfig.RETENTION_DAYS)
+            batch_size: Files deleted per batch
+            batch_pause: Seconds to sleep between batches (throttles
+                background runs)
+            comparisons_dir: SessionComparator cache directory
+        """
+        self.data_manager = data_manager
+        self._tracker = tracker
+        self.policy = dict(ModelConfig.RETENTION_DAYS if policy is None else policy)
+        self.batch_size = batch_size or ModelConfig.RETENTION_BATCH_SIZE
+        self.batch_pause = ModelConfig.RETENTION_BATCH_PAUSE if batch_pause is None else batch_pause
+        self.comparisons_dir = comparisons_dir
+        self.thread = None
+        self.last_report = None
+
+    @property
+    def tracker(self):
+        if self._tracker is None:
+            from progress_tracker import ProgressTracker
+            self._tracker = ProgressTracker()
+        return self._tracker
+
+    def cutoffs(self, now=None):
+        """Kind -> oldest timestamp kept, for kinds with a retention limit"""
+        now = now or datetime.now()
+        return {
+            kind: (now - timedelta(days=days)).strftime(TIMESTAMP_FORMAT)
+            for kind, days in self.policy.items() if days
+        }
+
+    def migrate(self):
+        """
+        One-off: record files from before the output manifest in it, so
+        retention covers them too
+
+        Returns:
+            int: Files recorded
+        """
+        manifest = self.data_manager.manifest
+        return sum(manifest.import_directory(kind, directory) for kind, directory in LEGACY_DIRECTORIES.items())
+
+    def run(self, user_ids=None, background=False, now=None):
+        """
+        Apply the policy to all users (or the given ones)
+
+        Args:
+            background: Run on a daemon thread and return it; the report
+                is left in last_report
+
+        Returns:
+            dict: Report (see _run), or the thread when background
+        """
+        if not background:
+            return self._run(user_ids, now)
+        self.thread = threading.Thread(target=self._run, args=(user_ids, now), daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def _run(self, user_ids, now):
+        """
+        Returns:
+            dict: kind -> {'files': deleted, 'bytes': reclaimed}, plus
+                'sessions' (progress store sessions removed),
+                'references' (input image references released) and
+                'archive' (ArchiveStore.prune result)
+        """
+        cutoffs = self.cutoffs(now)
+        users = None if user_ids is None else set(user_ids)
+        report = {kind: {'files': 0, 'bytes': 0} for kind in RETENTION_KINDS}
+        report['sessions'] = 0
+        report['references'] = 0
+        report['archive'] = {'sessions': 0, 'bundles': 0, 'rewritten': 0, 'bytes': 0}
+        paths = defaultdict(list)
+
+        # Generated outputs: one pass over the manifest, rewritten once
+        expired = self.data_manager.manifest.take(
+            lambda entry: entry['kind'] in cutoffs and entry['timestamp'] < cutoffs[entry['kind']]
+            and (users is None or entry['user_id'] in users))
+        for entry in expired:
+            paths[entry['kind']].append(entry['path'])
+
+        # Analysis sessions; the progress store is compacted either way
+        if 'analyses' in cutoffs:
+            removed = self.tracker.prune(cutoffs['analyses'], users)
+            report['sessions'] = len(removed)
+            paths['analyses'].extend(self.session_files(removed))
+        else:
+            self.tracker.save_data()
+
+        # Archived sessions: bundles are deleted or rewritten without them
+        if 'analyses' in cutoffs or 'input_images' in cutoffs:
+            report['archive'] = self.data_manager.archive.prune(
+                cutoffs.get('analyses'), cutoffs.get('input_images'), users)
+        
+        for kind, kind_paths in paths.items():
+            files, reclaimed = self.delete(kind_paths)
+            report[kind]['files'] += files
+            report[kind]['bytes'] += reclaimed
+
+        # Input images: release references, then delete unreferenced blobs
+        if 'input_images' in cutoffs:
+            released = self.data_manager.blob_store.release(users, before=cutoffs['input_images'])
+            report['references'] = len(released)
+            blobs, reclaimed = self.data_manager.blob_store.collect_garbage()
+            report['input_images']['files'] += blobs
+            report['input_images']['bytes'] += reclaimed
+
+        self.last_report = report
+        return report
+
+    def session_files(self, removed):
+        """Analysis result, aligned crop and comparison files of removed sessions"""
+        by_user = defaultdict(list)
+        for user_id, timestamp in removed:
+            by_user[user_id].append(timestamp)
+
+        paths = []
+        for user_id, timestamps in by_user.items():
+            timestamps.sort()
+            paths.extend(f"data/output/analysis_results/{user_id}_{ts}.json" for ts in timestamps)
+            paths.extend(f"data/output/aligned_crops/{user_id}_{ts}.png" for ts in timestamps)
+
+            # Removed sessions are the oldest ones: pairs among them, and the
+            # pair linking the newest removed to the oldest kept session
+            remaining = sorted(self.tracker.data.get(user_id, {}))
+            chain = timestamps + remaining[:1]
+            paths.extend(os.path.join(self.comparisons_dir, f"{user_id}_{a}_{b}.npz")
+                         for a, b in zip(chain, chain[1:]))
+        return paths
+
+    def delete(self, paths):
+        """
+        Delete files in batches
+
+        Returns:
+            tuple: (files deleted, bytes reclaimed)
+        """
+        files, reclaimed = 0, 0
+        for start in range(0, len(paths), self.batch_size):
+            for path in paths[start:start + self.batch_size]:
+                try:
+                    size = os.stat(path).st_size
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                files += 1
+                reclaimed += size
+            if self.batch_pause and start + self.batch_size < len(paths):
+                time.sleep(self.batch_pause)
+        return files, reclaimed
+
+    @staticmethod
+    def summarize(report):
+        """Text summary of a retention report"""
+        lines = [f"- {kind}: {report[kind]['files']} files, {report[kind]['bytes'] / 1e6:.1f} MB"
+                 for kind in RETENTION_KINDS if report[kind]['files']]
+        if report['sessions']:
+            lines.append(f"- progress store: {report['sessions']} sessions removed")
+        if report['references']:
+            lines.append(f"- input image references released: {report['references']}")
+        archive = report['archive']
+        if archive['sessions'] or archive['bundles'] or archive['rewritten']:
+            lines.append(f"- archive: {archive['sessions']} sessions removed, {archive['bundles']} bundles deleted, "
+                         f"{archive['rewritten']} rewritten, {archive['bytes'] / 1e6:.1f} MB")
+        total = sum(report[kind]['bytes'] for kind in RETENTION_KINDS) + archive['bytes']
+        lines.append(f"- total reclaimed: {total / 1e6:.1f} MB")
+        return "\n".join(lines)
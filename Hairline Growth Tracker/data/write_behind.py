@@ -0,0 +1,195 @@
+"""
+Write-behind persistence with group commit
+
+Output writes (progress records, analysis JSON, visualizations) are queued
+and flushed on a background thread, taking disk latency off the per-image
+critical path in batch runs. Queued items of the same group are committed
+together (e.g. many progress records in one locked WAL append); items of
+a group with the same key are never committed together. Failed writes are
+raised from the next flush() or close().
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+class WriteBehindError(RuntimeError):
+    def __init__(self, errors):
+        """Queued writes that failed; errors holds (target, exception) pairs"""
+        self.errors = errors
+        details = "; ".join(f"{target}: {error}" for target, error in errors)
+        super().__init__(f"{len(errors)} queued write(s) failed: {details}")
+
+class WriteBehindQueue:
+    def __init__(self, flush_interval=1.0, max_batch=32, fsync=False):
+        """
+        Durability policy:
+            flush_interval: Max seconds a queued write waits before flushing
+            max_batch: Flush as soon as this many writes are queued
+            fsync: fsync written files (and grouped commits) before a batch
+                counts as flushed
+        """
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self.group_handlers = {}
+        self.group_keys = {}
+        self.errors = []
+        self.flushed_writes = 0
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._submitted = 0
+        self._completed = 0
+        self._flush_requested = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def register_group(self, group, handler, key=None):
+        """
+        Register a group-commit handler: handler(items, fsync) writes all
+        items queued for the group in one operation
+
+        Args:
+            key: Optional callable(item) -> identity of the record an item
+                writes; a later item with the key of one already in the
+                commit would silently replace it, so it is rejected and
+                reported as a failed write instead
+        """
+        self.group_handlers[group] = handler
+        if key is not None:
+            self.group_keys[group] = key
+
+    def submit(self, func, *args):
+        """Queue func(*args); if it returns a file path, fsync applies to it"""
+        self._enqueue((None, func, args))
+
+    def submit_grouped(self, group, item):
+        """Queue an item for a registered group-commit handler"""
+        if group not in self.group_handlers:
+            raise KeyError(f"No group handler registered for: {group}")
+        self._enqueue((group, None, item))
+
+    def _enqueue(self, job):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Write-behind queue is closed")
+            self._queue.append(job)
+            self._submitted += 1
+            if len(self._queue) >= self.max_batch:
+                self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Barrier: block until every write submitted before this call is on disk
+
+        Returns:
+            bool: False if the timeout expired first
+
+        Raises:
+            WriteBehindError: Writes failed since the last flush
+        """
+        with self._condition:
+            target = self._submitted
+            self._flush_requested = True
+            self._condition.notify_all()
+            done = self._condition.wait_for(lambda: self._completed >= target, timeout)
+        self.raise_errors()
+        return done
+
+    def close(self):
+        """
+        Flush outstanding writes and stop the background thread
+
+        Raises:
+            WriteBehindError: Writes failed since the last flush
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.raise_errors()
+
+    def raise_errors(self):
+        """Raise (and clear) the failures collected by the background thread"""
+        with self._condition:
+            errors, self.errors = self.errors, []
+        if errors:
+            raise WriteBehindError(errors)
+
+    def pending(self):
+        with self._condition:
+            return self._submitted - self._completed
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.flush_interval
+                while not (self._closed or self._flush_requested or len(self._queue) >= self.max_batch):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                jobs = list(self._queue)
+                self._queue.clear()
+                self._flush_requested = False
+                closing = self._closed
+
+            if jobs:
+                self._write_batch(jobs)
+                with self._condition:
+                    self._completed += len(jobs)
+                    self._condition.notify_all()
+            elif closing:
+                return
+
+    def _write_batch(self, jobs):
+        """Write one batch: grouped items in one call per group, then single jobs"""
+        groups = {}
+        for group, func, args in jobs:
+            if group is not None:
+                groups.setdefault(group, []).append(args)
+
+        for group, items in groups.items():
+            if group in self.group_keys:
+                items = self._reject_duplicates(group, items)
+            try:
+                self.group_handlers[group](items, self.fsync)
+            except Exception as e:
+                with self._condition:
+                    self.errors.append((group, e))
+                print(f"⚠️ Write-behind commit failed for {group}: {e}")
+
+        for group, func, args in jobs:
+            if group is not None:
+                continue
+            try:
+                path = func(*args)
+                if self.fsync and isinstance(path, str) and os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        os.fsync(f.fileno())
+            except Exception as e:
+                with self._condition:
+                    self.errors.append((getattr(func, '__name__', str(func)), e))
+                print(f"⚠️ Write-behind write failed: {e}")
+
+        self.flushed_writes += len(jobs)
+
+    def _reject_duplicates(self, group, items):
+        """Items of a commit without the ones repeating an earlier item's key"""
+        key = self.group_keys[group]
+        seen = set()
+        unique = []
+        for item in items:
+            identity = key(item)
+            if identity in seen:
+                error = ValueError(f"duplicate key {identity!r} in one commit, later item rejected")
+                with self._condition:
+                    self.errors.append((group, error))
+                print(f"⚠️ Write-behind commit for {group}: {error}")
+                continue
+            seen.add(identity)
+            unique.append(item)
+        return unique
@@ -0,0 +1,98 @@
+"""
+Progress reports, plots and exports for every user in one run
+
+The progress store is loaded once as a snapshot; report texts come from the
+columnar metric store and exports from the snapshot, so no analysis file is
+read per user. Matplotlib rendering (the bulk of the cost) runs in a
+process pool on the Agg backend, overlapping with report and export
+writing in the parent.
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from models.config import ModelConfig
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+def _render_user(job):
+    """Worker: render one user's progress (and change) plots"""
+    import matplotlib.pyplot as plt
+    from progress_tracker import render_progress, render_changes
+
+    user_id, metrics, pairs, progress_path, changes_path, dpi = job
+    # tight_layout() already sets the margins; a tight bbox would draw twice
+    plt.close(render_progress(metrics, progress_path, dpi, bbox_inches=None))
+    if pairs:
+        plt.close(render_changes(pairs, changes_path, dpi, bbox_inches=None))
+    return user_id
+
+class FleetReporter:
+    def __init__(self, tracker, data_manager, max_workers=None, dpi=None, export=True):
+        """
+        Args:
+            tracker: ProgressTracker (snapshot source; its comparator adds
+                session changes to the reports)
+            data_manager: DataManager writing reports and exports
+            max_workers: Rendering processes (defaults to
+                ModelConfig.FLEET_WORKERS, 0 = one per CPU)
+            dpi: Plot resolution (defaults to ModelConfig.FLEET_PLOT_DPI)
+            export: Also write each user's data export
+        """
+        self.tracker = tracker
+        self.data_manager = data_manager
+        self.max_workers = ModelConfig.FLEET_WORKERS if max_workers is None else max_workers
+        self.dpi = dpi or ModelConfig.FLEET_PLOT_DPI
+        self.export = export
+
+    def run(self, user_ids=None):
+        """
+        Generate reports for all users (or the given ones)
+
+        Returns:
+            dict: 'users', 'reports', 'plots', 'exports' counts and 'seconds'
+        """
+        start = time.perf_counter()
+        snapshot = self.tracker.refresh()
+        users = sorted(snapshot) if user_ids is None else list(user_ids)
+        summary = {'users': len(users), 'reports': 0, 'plots': 0, 'exports': 0}
+
+        # spawn: workers must not inherit MediaPipe/OpenCV threads or GUI state
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.max_workers or os.cpu_count(),
+                                 mp_context=context, initializer=_init_worker) as pool:
+            renders = []
+            for user_id in users:
+                report, metrics, pairs = self.tracker.build_report(user_id)
+                self.data_manager.save_progress_report(report, user_id, verbose=False)
+                summary['reports'] += 1
+
+                if metrics:
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    progress_path = f"data/output/progress_reports/{user_id}_{timestamp}_progress.png"
+                    changes_path = f"data/output/progress_reports/{user_id}_{timestamp}_changes.png"
+                    self.data_manager.manifest.record('reports', user_id, timestamp, progress_path)
+                    if pairs:
+                        self.data_manager.manifest.record('reports', user_id, timestamp, changes_path)
+                    renders.append(pool.submit(_render_user, (user_id, metrics, pairs, progress_path,
+                                                              changes_path, self.dpi)))
+
+                if self.export:
+                    sessions = snapshot.get(user_id, {})
+                    self.data_manager.export_user_data(
+                        user_id, analyses=[sessions[ts] for ts in sorted(sessions)], verbose=False)
+                    summary['exports'] += 1
+
+            for future in renders:
+                try:
+                    future.result()
+                    summary['plots'] += 1
+                except Exception as e:
+                    print(f"⚠️ Plot rendering failed: {e}")
+
+        summary['seconds'] = time.perf_counter() - start
+        return summary
@@ -0,0 +1,187 @@
+"""
+Session-to-session hairline comparison
+
+Consecutive sessions of a user are compared on their fixed-size hairline
+profiles (per-column displacement) and, where cached, on their canonical
+forehead crops (pixel-level change map). All pending pairs are diffed in
+one vectorized operation, and every pair is cached on disk (keyed on the
+two records, so re-saved sessions are diffed again), so a new session only
+costs one diff against the previous one.
+"""
+
+import os
+import json
+import hashlib
+import cv2
+import numpy as np
+from models.config import ModelConfig
+from utils.hairline_profile import profile_from_json, resample_profile
+
+class SessionComparator:
+    # Profile fields in order of preference (aligned is framing-independent)
+    PROFILE_FIELDS = ('aligned_profile', 'hairline_profile')
+
+    def __init__(self, cache_dir="data/output/comparisons", crop_loader=None,
+                 recession_threshold=0.02, change_threshold=25):
+        """
+        Args:
+            cache_dir: Directory of cached pair results (one .npz per pair)
+            crop_loader: Optional callable(user_id, timestamp) returning the
+                canonical crop of a session (e.g. DataManager.load_aligned_crop)
+            recession_threshold: Upward displacement (profile units) for a
+                column to count as receding
+            change_threshold: Grey-level difference for a pixel to count as changed
+        """
+        self.cache_dir = cache_dir
+        self.crop_loader = crop_loader
+        self.recession_threshold = recession_threshold
+        self.change_threshold = change_threshold
+
+    def _cache_path(self, user_id, previous, current):
+        return os.path.join(self.cache_dir, f"{user_id}_{previous}_{current}.npz")
+
+    @staticmethod
+    def _records_key(earlier, later):
+        """Digest of the two stored records a pair result was computed from"""
+        payload = json.dumps([earlier, later], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def _load_pair(self, user_id, previous, current, source, key):
+        path = self._cache_path(user_id, previous, current)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as cached:
+            # A session re-saved under the same timestamp invalidates the pair
+            if str(cached['source']) != source or 'key' not in cached or str(cached['key']) != key:
+                return None
+            change_map = cached['change_map'] if cached['change_map'].size else None
+            return self._pair_result(previous, current, source, cached['displacement'], change_map)
+
+    def _save_pair(self, user_id, pair, key):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        change_map = pair['change_map'] if pair['change_map'] is not None else np.empty(0, np.int16)
+        np.savez_compressed(self._cache_path(user_id, pair['from'], pair['to']),
+                            source=pair['source'], key=key, displacement=pair['displacement'],
+                            change_map=change_map)
+
+    def _pair_result(self, previous, current, source, displacement, change_map):
+        """Pair result with summary statistics"""
+        finite = np.isfinite(displacement)
+        result = {
+            'from': previous,
+            'to': current,
+            'source': source,
+            'displacement': displacement,
+            'change_map': change_map,
+            'mean_displacement': float(displacement[finite].mean()) if finite.any() else None,
+            # Profiles grow downwards: a negative displacement is recession
+            'recession_fraction': float((displacement[finite] < -self.recession_threshold).mean()) if finite.any() else None,
+            'changed_fraction': None
+        }
+        if change_map is not None:
+            result['changed_fraction'] = float((np.abs(change_map) > self.change_threshold).mean())
+        return result
+
+    def profile_source(self, sessions):
+        """Most precise profile field present in every session"""
+        for field in self.PROFILE_FIELDS:
+            if all(session.get(field) is not None for session in sessions):
+                return field
+        return None
+
+    def compare_user(self, user_id, user_data):
+        """
+        Compare every consecutive pair of sessions of a user
+
+        Args:
+            user_id: User identifier (cache and crop key)
+            user_data: Mapping timestamp -> stored analysis record
+
+        Returns:
+            list: Per-pair dicts in chronological order ('from', 'to',
+                'displacement' (K,), 'change_map' (H, W) or None, summaries)
+        """
+        timestamps = sorted(user_data)
+        sessions = [user_data[ts] for ts in timestamps]
+        source = self.profile_source(sessions)
+        if len(timestamps) < 2 or source is None:
+            return []
+
+        pairs = [None] * (len(timestamps) - 1)
+        keys = [self._records_key(sessions[i], sessions[i + 1]) for i in range(len(pairs))]
+        pending = []
+        for i in range(len(pairs)):
+            pairs[i] = self._load_pair(user_id, timestamps[i], timestamps[i + 1], source, keys[i])
+            if pairs[i] is None:
+                pending.append(i)
+
+        if pending:
+            for i, pair in zip(pending, self.diff_pairs(user_id, timestamps, sessions, source, pending)):
+                pairs[i] = pair
+                self._save_pair(user_id, pair, keys[i])
+        return pairs
+
+    def diff_pairs(self, user_id, timestamps, sessions, source, pair_indices):
+        """
+        Diff the given consecutive pairs (i -> i + 1) in one batch; profiles
+        stored with another length (e.g. before a change of
+        HAIRLINE_PROFILE_POINTS) are resampled to the configured width
+        """
+        pair_indices = np.asarray(pair_indices)
+        needed = np.union1d(pair_indices, pair_indices + 1)
+
+        # Stack the needed profiles: (S, K), NaN where no hairline was found
+        width = ModelConfig.HAIRLINE_PROFILE_POINTS
+        profiles = np.full((len(timestamps), width), np.nan)
+        for i in needed:
+            profile = profile_from_json(sessions[i][source])
+            profiles[i] = profile if len(profile) == width else resample_profile(profile, width)
+        displacements = profiles[pair_indices + 1] - profiles[pair_indices]
+
+        change_maps = self.change_maps(user_id, timestamps, needed, pair_indices)
+        return [
+            self._pair_result(timestamps[i], timestamps[i + 1], source, displacement, change_map)
+            for i, displacement, change_map in zip(pair_indices, displacements, change_maps)
+        ]
+
+    def change_maps(self, user_id, timestamps, needed, pair_indices):
+        """
+        Signed grey-level change maps (later - earlier) between canonical
+        crops, or None for pairs with a missing crop
+        """
+        if self.crop_loader is None:
+            return [None] * len(pair_indices)
+
+        crops = {}
+        for i in needed:
+            crop = self.crop_loader(user_id, timestamps[i])
+            if crop is not None:
+                crops[i] = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+
+        complete = [i for i in pair_indices if i in crops and i + 1 in crops
+                    and crops[i].shape == crops[i + 1].shape]
+        maps = dict.fromkeys(pair_indices.tolist())
+        if complete:
+            stack = {i: crops[i].astype(np.int16) for i in set(complete) | {i + 1 for i in complete}}
+            earlier = np.stack([stack[i] for i in complete])
+            later = np.stack([stack[i + 1] for i in complete])
+            for i, change_map in zip(complete, later - earlier):
+                maps[i] = change_map
+        return [maps[i] for i in pair_indices.tolist()]
+
+    def summarize(self, pairs):
+        """Text summary of pair comparisons for progress reports"""
+        if not pairs:
+            return "- No comparable sessions (hairline profiles missing)"
+
+        lines = []
+        for pair in pairs:
+            if pair['mean_displacement'] is None:
+                lines.append(f"- {pair['from']} -> {pair['to']}: no overlapping hairline")
+                continue
+            line = (f"- {pair['from']} -> {pair['to']}: mean shift {pair['mean_displacement']:+.3f}, "
+                    f"receding columns {pair['recession_fraction']:.0%}")
+            if pair['changed_fraction'] is not None:
+                line += f", changed pixels {pair['changed_fraction']:.0%}"
+            lines.append(line)
+        return "\n".join(lines)
@@ -1,15 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
-from sklearn.cluster import KMeans
-from utils.face_detector import FaceDetector
+from utils.face_detector import FaceDetector, FOREHEAD_INDICES, BROW_INDICES, CHIN_INDICES
+from utils.hair_segmenter import create_segmenter
+from utils.alignment import FaceAligner
+from utils.hairline_profile import compute_hairline_profile
+from utils.image_processor import ImagePreprocessor
+from utils.instrumentation import INSTRUMENTATION, AnalysisInstrumentation, stage
+from models.config import ModelConfig
 
 class HairlineDetector:
-    def __init__(self):
+    def __init__(self, segmenter=None):
         """
         Initialize Hairline Detector
+        
+        Args:
+            segmenter: Optional segmentation backend (e.g. UNetSegmenter);
+                defaults to ModelConfig.HAIRLINE_BACKEND ('edges' = Canny)
         """
         self.face_detector = FaceDetector()
-        
+        self._group_face_detector = None
+        self.aligner = FaceAligner() if ModelConfig.ALIGNMENT_ENABLED else None
+        self.segmenter = segmenter if segmenter is not None else create_segmenter()
+        self.preprocessor = ImagePreprocessor() if ModelConfig.PREPROCESSING_ENABLED else None
+        self.instrumentation = INSTRUMENTATION
+        
+    @property
+    def group_face_detector(self):
+        """FaceDetector for group photos (ModelConfig.GROUP_MAX_FACES), created on first use"""
+        if self._group_face_detector is None:
+            self._group_face_detector = FaceDetector(max_faces=ModelConfig.GROUP_MAX_FACES,
+                                                     prefilter=self.face_detector.prefilter)
+        return self._group_face_detector
+    
     def analyze_hairline(self, image):
         """
         Main function to analyze hairline from image
@@ -18,130 +41,409 @@ class HairlineDetector:
             image: Input image (BGR format)
             
         Returns:
-            dict: Hairline analysis results including metrics and points
+            dict: Hairline analysis results including metrics and points;
+                per-stage timings and counters are under 'instrumentation'
         """
+        instrumentation = self.instrumentation.start_analysis()
         try:
+            # Reject images without a usable face before the FaceMesh pass
+            with instrumentation.stage('prefilter'):
+                face_boxes = self.face_detector.prefilter_faces(image)
+            if face_boxes is not None and len(face_boxes) == 0:
+                instrumentation.fail(self.face_detector.last_rejection)
+                print(f"No usable face in the image ({self.face_detector.last_rejection})")
+                return None
+            
             # Detect face and landmarks
-            detection_result = self.face_detector.detect_face(image)
+            with instrumentation.stage('detect'):
+                detection_result = self.face_detector.detect_face(image, face_boxes)
             
             if not detection_result or not detection_result['success']:
+                instrumentation.fail('no_face')
                 print("No face detected in the image")
                 return None
+            instrumentation.count('faces_found')
             
             # Extract landmarks and regions
             landmarks = detection_result['landmarks']
-            forehead_region = self.face_detector.get_forehead_region(landmarks)
+            with instrumentation.stage('forehead_region'):
+                forehead_region = self.face_detector.get_forehead_region(landmarks)
             
             # Detect hairline points
-            hairline_points = self.detect_hairline_points(image, landmarks, forehead_region)
+            hairline_points = self.detect_hairline_points(image, landmarks, forehead_region, instrumentation)
+            result = self.analyze_face(image, landmarks, forehead_region, hairline_points, instrumentation)
             
-            # Calculate comprehensive metrics
-            metrics = self.calculate_metrics(landmarks, hairline_points, image.shape)
+        except Exception as e:
+            instrumentation.fail(f"exception:{type(e).__name__}")
+            print(f"Error in hairline analysis: {e}")
+            return None
+        
+        finally:
+            self.instrumentation.record(instrumentation)
+            self.last_instrumentation = instrumentation.as_dict()
+        
+        result['instrumentation'] = self.last_instrumentation
+        return result
+    
+    def analyze_faces(self, image, max_workers=None):
+        """
+        Analyze the hairline of every face in an image (up to
+        ModelConfig.GROUP_MAX_FACES); analyze_hairline stays single-face
+        
+        Landmarks come from one FaceMesh pass and hairline points from
+        per-ROI edge maps (or one batched segmentation inference); the
+        per-face stages then run concurrently.
+        
+        Returns:
+            list: Per-face results ordered left to right, each with
+                'face_index' and 'bbox' (empty if no face was found)
+        """
+        face_detector = self.group_face_detector
+        instrumentation = self.instrumentation.start_analysis()
+        try:
+            with instrumentation.stage('prefilter'):
+                face_boxes = face_detector.prefilter_faces(image)
+            if face_boxes is not None and len(face_boxes) == 0:
+                instrumentation.fail(face_detector.last_rejection)
+                print(f"No usable face in the image ({face_detector.last_rejection})")
+                return []
             
-            # Determine hairline classification
-            hairline_type = self.classify_hairline(metrics)
+            with instrumentation.stage('detect'):
+                faces = face_detector.detect_faces(image, face_boxes)
+            
+            if not faces:
+                instrumentation.fail('no_face')
+                print("No face detected in the image")
+                return []
+            instrumentation.count('faces_found', len(faces))
             
-            return {
-                'face_landmarks': landmarks,
-                'hairline_points': hairline_points,
-                'forehead_region': forehead_region,
-                'hairline_height': metrics['hairline_height'],
-                'forehead_ratio': metrics['forehead_ratio'],
-                'density_score': metrics['density_score'],
-                'symmetry_score': metrics['symmetry_score'],
-                'recession_score': metrics['recession_score'],
-                'hairline_type': hairline_type,
-                'analysis_quality': metrics['analysis_quality']
-            }
+            with instrumentation.stage('forehead_region'):
+                forehead_regions = [face_detector.get_forehead_region(face['landmarks']) for face in faces]
+            point_sets = self.detect_hairline_points_batch(image, forehead_regions, instrumentation)
+            
+            # Per-face stages record into their own instrumentation (merged below)
+            face_instrumentation = [AnalysisInstrumentation() for _ in faces]
+            jobs = list(zip(faces, forehead_regions, point_sets, face_instrumentation))
+            
+            def analyze(job):
+                face, forehead_region, hairline_points, face_instr = job
+                return self.analyze_face(image, face['landmarks'], forehead_region, hairline_points, face_instr)
+            
+            if len(jobs) == 1:
+                results = [analyze(jobs[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=max_workers or len(jobs)) as pool:
+                    results = list(pool.map(analyze, jobs))
+            
+            for face_instr in face_instrumentation:
+                instrumentation.merge(face_instr)
             
         except Exception as e:
+            instrumentation.fail(f"exception:{type(e).__name__}")
             print(f"Error in hairline analysis: {e}")
-            return None
+            return []
+        
+        finally:
+            self.instrumentation.record(instrumentation)
+            self.last_instrumentation = instrumentation.as_dict()
+        
+        for face_index, (face, result) in enumerate(zip(faces, results)):
+            result['face_index'] = face_index
+            result['bbox'] = face['bbox']
+            result['instrumentation'] = self.last_instrumentation
+        return results
     
-    def detect_hairline_points(self, image, landmarks, forehead_region):
+    def analyze_face(self, image, landmarks, forehead_region, hairline_points, instrumentation=None):
         """
-        Detect hairline points using edge detection
+        Hairline stages for one face once its landmarks and points are known
+        
+        Returns:
+            dict: Analysis result (without 'instrumentation')
         """
+        if instrumentation is None:
+            instrumentation = AnalysisInstrumentation()
         if forehead_region is None:
-            return []
+            instrumentation.count('missing_forehead_region')
+        instrumentation.count('points_extracted', len(hairline_points))
         
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        # Fixed-size upper-boundary profile (what gets stored and compared)
+        with instrumentation.stage('profile'):
+            hairline_profile, profile_span = compute_hairline_profile(
+                hairline_points, forehead_region, image.shape[0],
+                ModelConfig.HAIRLINE_PROFILE_POINTS, ModelConfig.HAIRLINE_PROFILE_SMOOTHING)
         
-        # Create mask for forehead region
-        mask = np.zeros(gray.shape[:2], dtype=np.uint8)
-        pts = forehead_region.reshape((-1, 1, 2)).astype(np.int32)
-        cv2.fillPoly(mask, [pts], 255)
+        # Calculate comprehensive metrics
+        with instrumentation.stage('metrics'):
+            metrics = self.calculate_metrics(landmarks, hairline_points, image.shape)
         
-        # Apply edge detection
-        edges = cv2.Canny(gray, 50, 150)
+        # Canonical forehead crop and framing-independent metrics
+        alignment = None
+        if self.aligner is not None:
+            with instrumentation.stage('align'):
+                alignment = self.aligner.align(image, landmarks)
+        if alignment is not None:
+            with instrumentation.stage('aligned_metrics'):
+                metrics.update(self.aligner.calculate_aligned_metrics(
+                    landmarks, hairline_points, alignment['matrix'],
+                    ModelConfig.HAIRLINE_PROFILE_POINTS, ModelConfig.HAIRLINE_PROFILE_SMOOTHING))
+        else:
+            instrumentation.count('alignment_skipped')
         
-        # Apply mask
-        masked_edges = cv2.bitwise_and(edges, edges, mask=mask)
+        # Determine hairline classification
+        with instrumentation.stage('classify'):
+            hairline_type = self.classify_hairline(metrics)
         
-        # Find contours
-        contours, _ = cv2.findContours(masked_edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        result = {
+            'face_landmarks': landmarks,
+            'hairline_points': hairline_points,
+            'hairline_profile': hairline_profile,
+            'hairline_profile_span': profile_span,
+            'forehead_region': forehead_region,
+            'hairline_height': metrics['hairline_height'],
+            'forehead_ratio': metrics['forehead_ratio'],
+            'density_score': metrics['density_score'],
+            'symmetry_score': metrics['symmetry_score'],
+            'recession_score': metrics['recession_score'],
+            'hairline_type': hairline_type,
+            'analysis_quality': metrics['analysis_quality']
+        }
+        if alignment is not None:
+            result.update({
+                'aligned_hairline_height': metrics['aligned_hairline_height'],
+                'aligned_profile': metrics['aligned_profile'],
+                'alignment': {
+                    'matrix': alignment['matrix'],
+                    'scale': alignment['scale'],
+                    'rotation_deg': alignment['rotation_deg']
+                },
+                # In-memory only: persisted separately by DataManager.save_aligned_crop
+                'aligned_crop': alignment['crop']
+            })
+        return result
+    
+    def detect_hairline_points(self, image, landmarks, forehead_region, instrumentation=None):
+        """
+        Detect hairline points using the segmentation backend or edge detection
+        """
+        return self.detect_hairline_points_batch(image, [forehead_region], instrumentation)[0]
+    
+    def detect_hairline_points_batch(self, image, forehead_regions, instrumentation=None):
+        """
+        Detect hairline points for several faces of one image, sharing one
+        segmentation inference (or running edge detection per forehead ROI)
         
-        hairline_points = []
-        for contour in contours:
-            for point in contour:
-                x, y = point[0]
-                hairline_points.append([x, y])
+        Returns:
+            list: (M_i, 2) point arrays, one per forehead region
+        """
+        empty = np.empty((0, 2), dtype=np.int32)
+        if all(region is None for region in forehead_regions):
+            return [empty] * len(forehead_regions)
+        
+        # Enhance dim or flat forehead ROIs (only the ROIs, only when needed)
+        if self.preprocessor is not None:
+            with stage(instrumentation, 'preprocess'):
+                patches = self.preprocessor.enhance_regions(image, forehead_regions)
+                image = self.preprocessor.compose(image, patches)
+            if instrumentation is not None:
+                for *_, applied in patches:
+                    for name in applied:
+                        instrumentation.count(f'preprocess_{name}')
+        
+        if self.segmenter is not None:
+            with stage(instrumentation, 'segmentation'):
+                return self.segmenter.detect_hairline_points_batch(
+                    [image] * len(forehead_regions), forehead_regions)
+        
+        return [self.detect_region_edges(image, region, instrumentation) for region in forehead_regions]
+    
+    def detect_region_edges(self, image, forehead_region, instrumentation=None):
+        """
+        Hairline points of one forehead region from an edge map of its ROI
+        
+        Canny thresholds follow the ROI's median intensity (sigma rule on a
+        subsample) instead of fixed values, after a blur sized to the ROI.
+        If the contours exceed ModelConfig.HAIRLINE_POINT_BUDGET, the
+        thresholds are raised and Canny rerun (up to
+        ModelConfig.CANNY_BUDGET_RETRIES times); the points are then evenly
+        subsampled to the budget.
+        
+        Returns:
+            np.ndarray: (M, 2) points in image coordinates
+        """
+        empty = np.empty((0, 2), dtype=np.int32)
+        if forehead_region is None:
+            return empty
+        
+        with stage(instrumentation, 'edges'):
+            # ROI with room for the blur and Sobel apertures
+            pts = forehead_region.reshape((-1, 1, 2)).astype(np.int32)
+            x, y, w, h = cv2.boundingRect(pts)
+            ksize = int(round(min(w, h) * ModelConfig.CANNY_BLUR_FRACTION)) | 1
+            margin = ksize // 2 + 3
+            x0, y0 = max(x - margin, 0), max(y - margin, 0)
+            x1, y1 = min(x + w + margin, image.shape[1]), min(y + h + margin, image.shape[0])
+            if x1 <= x0 or y1 <= y0:
+                return empty
+            
+            gray = cv2.cvtColor(image[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+            if ksize > 1:
+                gray = cv2.GaussianBlur(gray, (ksize, ksize), 0)
+            # Threshold on the region clipped to the image (faces cut off at an edge)
+            xa, ya = max(x, 0), max(y, 0)
+            xb, yb = min(x + w, image.shape[1]), min(y + h, image.shape[0])
+            if xb <= xa or yb <= ya:
+                return empty
+            low, high = self.canny_thresholds(gray[ya - y0:yb - y0, xa - x0:xb - x0])
+            edges = cv2.Canny(gray, low, high)
+        
+        budget = ModelConfig.HAIRLINE_POINT_BUDGET
+        for attempt in range(ModelConfig.CANNY_BUDGET_RETRIES + 1):
+            with stage(instrumentation, 'contours'):
+                points = self.region_contour_points(edges, forehead_region, (x0, y0))
+            if not budget or len(points) <= budget or attempt == ModelConfig.CANNY_BUDGET_RETRIES:
+                break
+            # Too noisy: keep only stronger edges
+            with stage(instrumentation, 'edges'):
+                low, high = min(low * 1.5, 254.0), min(high * 1.5, 255.0)
+                edges = cv2.Canny(gray, low, high)
+            if instrumentation is not None:
+                instrumentation.count('canny_retries')
+        
+        if budget and len(points) > budget:
+            points = points[np.linspace(0, len(points) - 1, budget).astype(np.intp)]
+            if instrumentation is not None:
+                instrumentation.count('points_capped')
+        return points
+    
+    @staticmethod
+    def canny_thresholds(gray, sigma=None):
+        """
+        Canny (low, high) thresholds around the median of a grayscale ROI
+        (sampled every other pixel)
+        """
+        sigma = ModelConfig.CANNY_SIGMA if sigma is None else sigma
+        median = float(np.median(gray[::2, ::2])) if gray.size else 128.0
+        low = max(0.0, (1.0 - sigma) * median)
+        high = max(min(255.0, (1.0 + sigma) * median), low + 1.0)
+        return low, high
+    
+    def region_contour_points(self, edges, forehead_region, origin=(0, 0)):
+        """
+        Points of the external contours of the edges inside a forehead polygon
         
-        return np.array(hairline_points)
+        Args:
+            edges: Edge map of the image, or of a crop of it
+            origin: (x, y) of the edge map's top-left pixel in the image
+        """
+        if forehead_region is None:
+            return np.empty((0, 2), dtype=np.int32)
+        
+        # Mask and search only the polygon's bounding box, with a 1 px margin
+        # (findContours ignores the outermost pixel row/column)
+        pts = forehead_region.reshape((-1, 1, 2)).astype(np.int32) - np.array(origin, dtype=np.int32)
+        x, y, w, h = cv2.boundingRect(pts)
+        x0, y0 = max(x - 1, 0), max(y - 1, 0)
+        x1, y1 = min(x + w + 1, edges.shape[1]), min(y + h + 1, edges.shape[0])
+        if x1 <= x0 or y1 <= y0:
+            return np.empty((0, 2), dtype=np.int32)
+        
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        cv2.fillPoly(mask, [pts], 255, offset=(-x0, -y0))
+        region_edges = edges[y0:y1, x0:x1]
+        masked_edges = cv2.bitwise_and(region_edges, region_edges, mask=mask)
+        
+        contours, _ = cv2.findContours(masked_edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                       offset=(x0 + origin[0], y0 + origin[1]))
+        if not contours:
+            return np.empty((0, 2), dtype=np.int32)
+        
+        return np.concatenate(contours).reshape(-1, 2)
     
     def calculate_metrics(self, landmarks, hairline_points, image_shape):
         """
         Calculate hairline metrics
         """
-        height, width = image_shape[:2]
+        hairline_points = np.asarray(hairline_points).reshape(-1, 2)
+        batch_metrics = self.calculate_metrics_batch(
+            np.asarray(landmarks)[np.newaxis],
+            [0, len(hairline_points)],
+            hairline_points,
+            image_shape
+        )
+        return {name: float(values[0]) for name, values in batch_metrics.items()}
+    
+    def calculate_metrics_batch(self, landmarks, hairline_offsets, hairline_points, image_shapes):
+        """
+        Calculate hairline metrics for many analyses at once
         
-        # Basic hairline height
-        if len(hairline_points) > 0:
-            hairline_y = np.min(hairline_points[:, 1])
-            hairline_height = hairline_y / height
-        else:
-            # Fallback: use forehead landmarks
-            forehead_y = np.min([landmarks[i][1] for i in [10, 67, 69, 104, 108, 109, 151, 337, 338, 297] 
-                               if i < len(landmarks)])
-            hairline_y = forehead_y
-            hairline_height = forehead_y / height
+        Args:
+            landmarks: (N, L, 2) landmark tensor, one row per analysis
+            hairline_offsets: (N + 1,) offsets into hairline_points; analysis i
+                owns hairline_points[hairline_offsets[i]:hairline_offsets[i + 1]]
+            hairline_points: (M, 2) flat buffer with the hairline points of all analyses
+            image_shapes: (N, 2+) per-analysis image shapes, or a single shape for all
+            
+        Returns:
+            dict: Metric name -> (N,) array of values
+        """
+        landmarks = np.asarray(landmarks, dtype=np.float64)
+        num_analyses, num_landmarks = landmarks.shape[:2]
+        offsets = np.asarray(hairline_offsets, dtype=np.intp)
+        points = np.asarray(hairline_points, dtype=np.float64).reshape(-1, 2)
+        
+        shapes = np.asarray(image_shapes, dtype=np.float64)
+        if shapes.ndim == 1:
+            shapes = np.broadcast_to(shapes[:2], (num_analyses, 2))
+        heights, widths = shapes[:, 0], shapes[:, 1]
+        
+        counts = np.diff(offsets)
+        has_points = counts > 0
+        owner = np.repeat(np.arange(num_analyses), counts)
+        xs = points[offsets[0]:offsets[-1], 0]
+        ys = points[offsets[0]:offsets[-1], 1]
+        
+        # Basic hairline height, falling back to the forehead landmarks
+        forehead_idx = FOREHEAD_INDICES[FOREHEAD_INDICES < num_landmarks]
+        hairline_y = landmarks[:, forehead_idx, 1].min(axis=1)
+        if has_points.any():
+            hairline_y[has_points] = np.minimum.reduceat(ys, offsets[:-1][has_points] - offsets[0])
+        hairline_height = hairline_y / heights
         
         # Forehead ratio
-        eyebrow_y = np.mean([landmarks[i][1] for i in [105, 334, 336] if i < len(landmarks)])
-        chin_y = np.max([landmarks[i][1] for i in [152, 148, 176, 149, 150, 136, 172, 58, 132, 93, 234] 
-                        if i < len(landmarks)])
+        eyebrow_y = landmarks[:, BROW_INDICES[BROW_INDICES < num_landmarks], 1].mean(axis=1)
+        chin_y = landmarks[:, CHIN_INDICES[CHIN_INDICES < num_landmarks], 1].max(axis=1)
         
         face_height = chin_y - hairline_y
         forehead_height = eyebrow_y - hairline_y
-        
-        if face_height > 0:
-            forehead_ratio = forehead_height / face_height
-        else:
-            forehead_ratio = 0.3
+        valid_face = face_height > 0
+        forehead_ratio = np.full(num_analyses, 0.3)
+        forehead_ratio[valid_face] = forehead_height[valid_face] / face_height[valid_face]
         
         # Density score
-        if len(hairline_points) > 0:
-            density_score = min(len(hairline_points) / 50, 1.0)
-        else:
-            density_score = 0.3
-        
-        # Symmetry score
-        symmetry_score = self.calculate_symmetry(hairline_points, width)
-        
-        # Recession score (simplified)
-        recession_score = 0.3  # Default moderate
-        
-        # Analysis quality
-        analysis_quality = 0.7  # Default good
+        density_score = np.where(has_points, np.minimum(counts / 50, 1.0), 0.3)
+        
+        # Symmetry score: compare mean heights left and right of the image midline
+        midpoint = widths[owner] / 2
+        left = xs < midpoint
+        right = xs > midpoint
+        left_count = np.bincount(owner[left], minlength=num_analyses)
+        right_count = np.bincount(owner[right], minlength=num_analyses)
+        left_sum = np.bincount(owner[left], weights=ys[left], minlength=num_analyses)
+        right_sum = np.bincount(owner[right], weights=ys[right], minlength=num_analyses)
+        
+        symmetric = (counts >= 2) & (left_count > 0) & (right_count > 0)
+        symmetry_score = np.full(num_analyses, 0.5)
+        left_avg_y = left_sum[symmetric] / left_count[symmetric]
+        right_avg_y = right_sum[symmetric] / right_count[symmetric]
+        symmetry_score[symmetric] = 1.0 - np.minimum(np.abs(left_avg_y - right_avg_y) / 50, 1.0)
         
         return {
             'hairline_height': hairline_height,
             'forehead_ratio': forehead_ratio,
             'density_score': density_score,
             'symmetry_score': symmetry_score,
-            'recession_score': recession_score,
-            'analysis_quality': analysis_quality
+            'recession_score': np.full(num_analyses, 0.3),  # Default moderate
+            'analysis_quality': np.full(num_analyses, 0.7)  # Default good
         }
     
     def calculate_symmetry(self, hairline_points, image_width):
@@ -191,24 +493,37 @@ class HairlineDetector:
         else:
             return "Normal"
     
-    def visualize_analysis(self, image, analysis_result, save_path=None):
+    def visualize_analysis(self, image, analysis_result, save_path=None, max_size=None):
         """
         Visualize hairline analysis results
+        
+        Args:
+            image: Analyzed image (BGR format)
+            analysis_result: Result of analyze_hairline
+            save_path: Optional path to write the visualization to
+            max_size: Longest side of the rendered overlay; the image is
+                downscaled before drawing (0 = full resolution, None =
+                ModelConfig.VISUALIZATION_MAX_SIZE)
         """
-        vis_image = image.copy()
+        if max_size is None:
+            max_size = ModelConfig.VISUALIZATION_MAX_SIZE
+        
+        height, width = image.shape[:2]
+        scale = min(1.0, max_size / max(height, width)) if max_size else 1.0
+        if scale < 1.0:
+            # INTER_LINEAR: several times cheaper than INTER_AREA at large
+            # factors, and good enough for a preview overlay
+            vis_image = cv2.resize(image, (round(width * scale), round(height * scale)),
+                                   interpolation=cv2.INTER_LINEAR)
+        else:
+            vis_image = image.copy()
         
         if not analysis_result:
             return vis_image
         
-        # Draw face landmarks
-        for landmark in analysis_result['face_landmarks']:
-            x, y = int(landmark[0]), int(landmark[1])
-            cv2.circle(vis_image, (x, y), 2, (0, 255, 0), -1)
-        
-        # Draw hairline points
-        for point in analysis_result['hairline_points']:
-            x, y = int(point[0]), int(point[1])
-            cv2.circle(vis_image, (x, y), 3, (255, 0, 0), -1)
+        # Draw face landmarks and hairline points in bulk
+        draw_points(vis_image, analysis_result['face_landmarks'], 2, (0, 255, 0), scale)
+        draw_points(vis_image, analysis_result['hairline_points'], 3, (255, 0, 0), scale)
         
         # Add text information
         y_offset = 30
@@ -233,6 +548,43 @@ class HairlineDetector:
         
         return vis_image
 
+def draw_points(image, points, radius, color, scale=1.0):
+    """
+    Draw filled dots at many points with one vectorized pixel write
+    (instead of one cv2.circle call per point)
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) == 0:
+        return image
+    
+    centers = np.rint(points * scale).astype(np.intp)
+    offsets = np.mgrid[-radius:radius + 1, -radius:radius + 1].reshape(2, -1).T
+    offsets = offsets[(offsets ** 2).sum(axis=1) <= radius * radius]
+    
+    pixels = (centers[:, np.newaxis, :] + offsets[np.newaxis, :, :]).reshape(-1, 2)
+    height, width = image.shape[:2]
+    inside = (pixels[:, 0] >= 0) & (pixels[:, 0] < width) & (pixels[:, 1] >= 0) & (pixels[:, 1] < height)
+    pixels = pixels[inside]
+    image[pixels[:, 1], pixels[:, 0]] = color
+    return image
+
+def pack_hairline_points(point_sets):
+    """
+    Pack per-analysis hairline point arrays into offsets + one flat buffer
+    
+    Args:
+        point_sets: Sequence of (M_i, 2) point arrays (may be empty)
+        
+    Returns:
+        tuple: (offsets of shape (N + 1,), flat points of shape (sum M_i, 2))
+    """
+    arrays = [np.asarray(points).reshape(-1, 2) for points in point_sets]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.intp)
+    offsets[1:] = np.cumsum([len(points) for points in arrays])
+    if not arrays:
+        return offsets, np.empty((0, 2))
+    return offsets, np.concatenate(arrays)
+
 # Utility function for quick analysis
 def analyze_single_image(image_path, visualize=True):
     """
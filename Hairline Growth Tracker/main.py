@@ -1,18 +1,92 @@
 import cv2
 import os
 import sys
-from datetime import datetime
 from hairline_detector import HairlineDetector
 from progress_tracker import ProgressTracker
+from hairline_comparison import SessionComparator
+from fleet_reports import FleetReporter
 from data.data_manager import DataManager
+from data.image_index import ImageIndex, dhash
+from data.retention import RetentionEngine
+from data.write_behind import WriteBehindQueue, WriteBehindError
+from utils.face_matching import FaceMatcher
+from utils.metrics import REGISTRY, IMAGES_PROCESSED
+from utils.timestamps import session_timestamp
+from models.config import ModelConfig
+
+METRICS_FILE = "data/output/metrics.prom"
 
 class HairlineTrackerApp:
     def __init__(self):
-        self.detector = HairlineDetector()
-        self.tracker = ProgressTracker()
+        # The detector (MediaPipe model) and tracker (progress JSON) are created
+        # on first use so the menu comes up without paying their start-up cost
+        self._detector = None
+        self._tracker = None
+        self._image_index = None
         self.data_manager = DataManager()
+        self.write_behind = None
         print("🚀 Hairline Tracker initialized successfully!")
     
+    @property
+    def detector(self):
+        if self._detector is None:
+            self._detector = HairlineDetector()
+        return self._detector
+    
+    @property
+    def tracker(self):
+        if self._tracker is None:
+            comparator = SessionComparator(crop_loader=self.data_manager.load_aligned_crop)
+            self._tracker = ProgressTracker(comparator=comparator)
+        return self._tracker
+    
+    @property
+    def image_index(self):
+        if self._image_index is None:
+            self._image_index = ImageIndex()
+        return self._image_index
+    
+    def enable_write_behind(self, flush_interval=1.0, max_batch=32, fsync=False):
+        """Queue output writes and flush them in groups on a background thread"""
+        if self.write_behind is None:
+            self.write_behind = WriteBehindQueue(flush_interval, max_batch, fsync)
+            # Progress records are keyed by (user_id, timestamp)
+            self.write_behind.register_group('progress', self.tracker.save_analyses,
+                                             key=lambda record: (record[0], record[1]))
+            self.data_manager.write_behind = self.write_behind
+        return self.write_behind
+    
+    def disable_write_behind(self):
+        """Flush outstanding writes and go back to synchronous writes"""
+        if self.write_behind is not None:
+            write_behind = self.write_behind
+            self.data_manager.write_behind = None
+            self.write_behind = None
+            try:
+                write_behind.close()
+            except WriteBehindError as e:
+                self.report_write_errors(e)
+            print(f"💾 Flushed {write_behind.flushed_writes} queued writes")
+    
+    def flush_writes(self):
+        """
+        Barrier: make sure queued writes are on disk before reading them back
+        
+        Returns:
+            list: (target, exception) pairs of queued writes that failed
+        """
+        if self.write_behind is not None:
+            try:
+                self.write_behind.flush()
+            except WriteBehindError as e:
+                self.report_write_errors(e)
+                return e.errors
+        return []
+    
+    def report_write_errors(self, error):
+        for target, exception in error.errors:
+            print(f"❌ Queued write to {target} was lost: {exception}")
+    
     def setup_environment(self):
         """Setup the complete environment"""
         print("🔧 Setting up environment...")
@@ -49,11 +123,10 @@ class HairlineTrackerApp:
                 user_id = input("Enter user ID for this photo: ").strip() or "webcam_user"
                 
                 # Save the captured image
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                save_path = f"data/input/raw_images/{user_id}_webcam_{timestamp}.jpg"
-                success = cv2.imwrite(save_path, frame)
+                timestamp = session_timestamp()
+                save_path = self.data_manager.save_input_image(frame, user_id, image_name="webcam", timestamp=timestamp)
                 
-                if success:
+                if save_path:
                     print(f"✅ Photo saved: {save_path}")
                     
                     # Analyze the photo immediately
@@ -69,10 +142,12 @@ class HairlineTrackerApp:
                         # Save results
                         self.tracker.save_analysis(user_id, timestamp, result)
                         self.data_manager.save_analysis_result(result, user_id, timestamp)
+                        if ModelConfig.CACHE_ALIGNED_CROPS and result.get('aligned_crop') is not None:
+                            self.data_manager.save_aligned_crop(result['aligned_crop'], user_id, timestamp)
                         
                         # Show and save visualization
                         vis_image = self.detector.visualize_analysis(frame, result)
-                        self.data_manager.save_visualization(vis_image, user_id)
+                        self.data_manager.save_visualization(vis_image, user_id, timestamp=timestamp)
                         cv2.imshow('Hairline Analysis Results', vis_image)
                         print("📊 Press any key to close results...")
                         cv2.waitKey(0)
@@ -95,8 +170,15 @@ class HairlineTrackerApp:
         cap.release()
         cv2.destroyAllWindows()
     
-    def process_single_image(self, image_path=None, user_id=None):
-        """Process a single image and analyze hairline"""
+    def process_single_image(self, image_path=None, user_id=None, visualize=True, show=True):
+        """
+        Process a single image and analyze hairline
+        
+        Args:
+            visualize: Render and save the analysis overlay ('thumbnail' saves
+                only a small thumbnail)
+            show: Display the overlay in a window and wait for a key press
+        """
         if image_path is None:
             image_path = input("Enter image path: ").strip()
         
@@ -108,33 +190,67 @@ class HairlineTrackerApp:
         # Validate image
         is_valid, message = self.data_manager.validate_image(image_path)
         if not is_valid:
+            IMAGES_PROCESSED.inc(outcome='invalid')
             print(f"❌ Image validation failed: {message}")
             return None
         
         # Read image
         image = cv2.imread(image_path)
         if image is None:
+            IMAGES_PROCESSED.inc(outcome='unreadable')
             print(f"❌ Could not load image: {image_path}")
             return None
         
+        # Skip near-duplicates of a recent photo of the same user
+        timestamp = session_timestamp()
+        image_hash = None
+        if ModelConfig.DEDUP_ENABLED:
+            image_hash = dhash(image)
+            duplicate = self.image_index.find_duplicate(image_hash, user_id, timestamp)
+            if duplicate is not None:
+                self.flush_writes()
+                existing = self.data_manager.load_analysis_result(user_id, duplicate['timestamp'])
+                if existing is not None:
+                    IMAGES_PROCESSED.inc(outcome='duplicate')
+                    self.image_index.add(image_hash, user_id, timestamp, image_path,
+                                         duplicate_of=duplicate['timestamp'])
+                    print(f"⏭️ Near-duplicate of {duplicate['source'] or duplicate['timestamp']} - "
+                          f"reusing analysis {user_id}_{duplicate['timestamp']}")
+                    existing['duplicate_of'] = duplicate['timestamp']
+                    return existing
+        
         # Save input image
-        saved_path = self.data_manager.save_input_image(image, user_id)
+        saved_path = self.data_manager.save_input_image(image, user_id, source_path=image_path, timestamp=timestamp)
         
         # Detect hairline and get metrics
         print("🔍 Analyzing hairline...")
         result = self.detector.analyze_hairline(image)
         
         if result:
+            IMAGES_PROCESSED.inc(outcome='analyzed')
+            
             # Save results
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            self.tracker.save_analysis(user_id, timestamp, result)
+            if self.write_behind is not None:
+                self.write_behind.submit_grouped('progress', (user_id, timestamp, result))
+            else:
+                self.tracker.save_analysis(user_id, timestamp, result)
             
             # Save analysis result
             analysis_path = self.data_manager.save_analysis_result(result, user_id, timestamp)
+            if ModelConfig.CACHE_ALIGNED_CROPS and result.get('aligned_crop') is not None:
+                self.data_manager.save_aligned_crop(result['aligned_crop'], user_id, timestamp)
+            if image_hash is not None:
+                self.image_index.add(image_hash, user_id, timestamp, image_path)
             
             # Create and save visualization
-            vis_image = self.detector.visualize_analysis(image, result)
-            vis_path = self.data_manager.save_visualization(vis_image, user_id)
+            vis_image = None
+            if visualize or show:
+                vis_image = self.detector.visualize_analysis(image, result)
+            if visualize == 'thumbnail':
+                self.data_manager.save_visualization(vis_image, user_id, thumbnail_size=ModelConfig.THUMBNAIL_SIZE,
+                                                    timestamp=timestamp)
+            elif visualize:
+                self.data_manager.save_visualization(vis_image, user_id, timestamp=timestamp)
             
             print("✅ Analysis completed successfully!")
             print(f"📊 Hairline Type: {result['hairline_type']}")
@@ -143,18 +259,80 @@ class HairlineTrackerApp:
             print(f"⚖️  Symmetry: {result['symmetry_score']:.3f}")
             
             # Display results
-            cv2.imshow('Hairline Analysis Results', vis_image)
-            print("🖼️ Press any key to close the visualization window...")
-            cv2.waitKey(0)
-            cv2.destroyAllWindows()
+            if show:
+                cv2.imshow('Hairline Analysis Results', vis_image)
+                print("🖼️ Press any key to close the visualization window...")
+                cv2.waitKey(0)
+                cv2.destroyAllWindows()
             
             return result
         else:
+            IMAGES_PROCESSED.inc(outcome='failed')
             print("❌ Hairline analysis failed - no face detected")
             return None
     
-    def process_batch_images(self, input_folder=None, user_id=None):
-        """Process all images in a folder"""
+    def process_group_image(self, image_path=None, user_ids=None):
+        """
+        Analyze every face in a group photo and file each result under its user
+        
+        Args:
+            user_ids: User ids left to right; remaining faces are matched to
+                enrolled users by landmark signature (or get a guest id, enrolled
+                only with ModelConfig.ENROLL_GUEST_FACES)
+        """
+        if image_path is None:
+            image_path = input("Enter image path: ").strip()
+        
+        if user_ids is None:
+            entered = input("Enter user IDs left to right, comma separated (optional): ").strip()
+            user_ids = [user_id.strip() for user_id in entered.split(',') if user_id.strip()]
+        
+        print(f"📷 Processing group image: {image_path}")
+        
+        is_valid, message = self.data_manager.validate_image(image_path)
+        if not is_valid:
+            IMAGES_PROCESSED.inc(outcome='invalid')
+            print(f"❌ Image validation failed: {message}")
+            return []
+        
+        image = cv2.imread(image_path)
+        if image is None:
+            IMAGES_PROCESSED.inc(outcome='unreadable')
+            print(f"❌ Could not load image: {image_path}")
+            return []
+        
+        print("🔍 Analyzing hairlines...")
+        results = self.detector.analyze_faces(image)
+        if not results:
+            IMAGES_PROCESSED.inc(outcome='failed')
+            print("❌ Hairline analysis failed - no face detected")
+            return []
+        IMAGES_PROCESSED.inc(outcome='analyzed')
+        
+        timestamp = session_timestamp()
+        assigned = FaceMatcher().assign(results, user_ids, prefix=f"guest_{timestamp}")
+        
+        for user_id, result in zip(assigned, results):
+            self.data_manager.save_input_image(image, user_id, source_path=image_path, timestamp=timestamp)
+            self.tracker.save_analysis(user_id, timestamp, result)
+            self.data_manager.save_analysis_result(result, user_id, timestamp)
+            if ModelConfig.CACHE_ALIGNED_CROPS and result.get('aligned_crop') is not None:
+                self.data_manager.save_aligned_crop(result['aligned_crop'], user_id, timestamp)
+            print(f"👤 Face {result['face_index'] + 1} -> {user_id}: "
+                  f"{result['hairline_type']}, height {result['hairline_height']:.3f}")
+        
+        print(f"✅ Analyzed {len(results)} face(s)")
+        return list(zip(assigned, results))
+    
+    def process_batch_images(self, input_folder=None, user_id=None, visualize=None):
+        """
+        Process all images in a folder
+        
+        Batch runs are headless; overlays are only rendered (as thumbnails)
+        when visualize / ModelConfig.BATCH_VISUALIZE is enabled.
+        """
+        if visualize is None:
+            visualize = ModelConfig.BATCH_VISUALIZE
         if input_folder is None:
             input_folder = input("Enter folder path (default: 'data/input/raw_images'): ").strip() or "data/input/raw_images"
         
@@ -169,17 +347,31 @@ class HairlineTrackerApp:
             print("❌ No valid images found to process")
             return []
         
+        # Batch runs take disk writes off the per-image path
+        owns_write_behind = self.write_behind is None
+        self.enable_write_behind()
+        
         results = []
-        for image_path in valid_images:
-            print(f"🔍 Processing: {os.path.basename(image_path)}")
-            result = self.process_single_image(image_path, user_id)
-            if result:
-                results.append(result)
+        try:
+            for image_path in valid_images:
+                print(f"🔍 Processing: {os.path.basename(image_path)}")
+                result = self.process_single_image(image_path, user_id,
+                                                   visualize='thumbnail' if visualize else False,
+                                                   show=False)
+                if result:
+                    results.append(result)
+        finally:
+            if owns_write_behind:
+                self.disable_write_behind()
         
         print(f"\n📊 Batch processing complete!")
         print(f"✅ Successful analyses: {len(results)}")
+        duplicates = sum(1 for result in results if result.get('duplicate_of'))
+        if duplicates:
+            print(f"⏭️ Near-duplicates reused: {duplicates}")
         print(f"❌ Failed analyses: {len(valid_images) - len(results)}")
         
+        self.export_metrics()
         return results
     
     def track_progress(self, user_id=None):
@@ -189,6 +381,7 @@ class HairlineTrackerApp:
         
         print(f"📈 Generating progress report for: {user_id}")
         
+        self.flush_writes()
         report = self.tracker.generate_report(user_id)
         
         if report:
@@ -205,6 +398,15 @@ class HairlineTrackerApp:
             print("❌ No data available for progress tracking")
             return None
     
+    def generate_fleet_reports(self, user_ids=None):
+        """Generate progress reports, plots and exports for every user"""
+        print("📈 Generating progress reports for all users...")
+        self.flush_writes()
+        summary = FleetReporter(self.tracker, self.data_manager).run(user_ids)
+        print(f"✅ {summary['reports']} reports, {summary['plots']} plots and {summary['exports']} exports "
+              f"for {summary['users']} users in {summary['seconds']:.1f}s")
+        return summary
+    
     def show_user_history(self, user_id=None):
         """Show user's analysis history"""
         if user_id is None:
@@ -212,6 +414,7 @@ class HairlineTrackerApp:
         
         print(f"📋 Analysis history for: {user_id}")
         
+        self.flush_writes()
         history = self.data_manager.get_user_history(user_id)
         
         if not history:
@@ -222,6 +425,37 @@ class HairlineTrackerApp:
         for i, analysis in enumerate(history, 1):
             print(f"   {i}. {analysis['timestamp']} - {analysis['filename']}")
     
+    def run_retention(self, background=False):
+        """
+        Archive old sessions (ModelConfig.ARCHIVE_AFTER_DAYS), then apply
+        ModelConfig.RETENTION_DAYS to every user's data
+        
+        Args:
+            background: Delete on a background thread and return the engine
+                (report in engine.last_report once engine.thread finishes)
+        """
+        self.flush_writes()
+        engine = RetentionEngine(self.data_manager, self.tracker)
+        migrated = engine.migrate()
+        if migrated:
+            print(f"🗂️ Indexed {migrated} files from before the output manifest")
+        self.data_manager.archive_old_data()
+        
+        print("🧹 Applying retention policy...")
+        if background:
+            engine.run(background=True)
+            return engine
+        
+        report = engine.run()
+        print(f"✅ Retention finished:\n{engine.summarize(report)}")
+        return report
+    
+    def export_metrics(self, path=METRICS_FILE):
+        """Dump all metrics in Prometheus text format (textfile collector)"""
+        REGISTRY.dump(path)
+        print(f"📊 Metrics exported: {path}")
+        return path
+    
     def download_sample_datasets(self):
         """Download sample datasets for training"""
         print("📥 Available Datasets:")
@@ -243,6 +477,12 @@ def main():
     """Main function with menu interface"""
     app = HairlineTrackerApp()
     
+    # Optional live metrics endpoint: HAIRLINE_METRICS_PORT=9100 python main.py
+    metrics_port = os.environ.get('HAIRLINE_METRICS_PORT')
+    if metrics_port:
+        REGISTRY.start_http_server(int(metrics_port))
+        print(f"📊 Metrics served at http://localhost:{metrics_port}/metrics")
+    
     while True:
         print("\n" + "="*50)
         print("🧬 HAIRLINE TRACKER - AI TELEMEDICINE")
@@ -254,10 +494,13 @@ def main():
         print("5. Track Progress")
         print("6. Show History")
         print("7. Download Sample Datasets")
-        print("8. Exit")
+        print("8. Process Group Photo")
+        print("9. Run Data Retention")
+        print("10. Generate All Reports")
+        print("11. Exit")
         print("-"*50)
         
-        choice = input("Enter your choice (1-8): ").strip()
+        choice = input("Enter your choice (1-11): ").strip()
         
         if choice == '1':
             app.setup_environment()
@@ -285,6 +528,15 @@ def main():
             app.download_sample_datasets()
             
         elif choice == '8':
+            app.process_group_image()
+            
+        elif choice == '9':
+            app.run_retention()
+            
+        elif choice == '10':
+            app.generate_fleet_reports()
+            
+        elif choice == '11':
             print("👋 Thank you for using Hairline Tracker!")
             break
             
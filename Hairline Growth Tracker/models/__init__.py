@@ -5,17 +5,34 @@ Contains model loading, saving, and configuration utilities
 for face detection and hairline analysis.
 """
 
-from .model_loader import ModelLoader
-from .config import ModelConfig
+import importlib
 
-__all__ = ['ModelLoader', 'ModelConfig']
+# Submodules are imported on first attribute access (PEP 562)
+_LAZY_ATTRIBUTES = {
+    'ModelLoader': '.model_loader',
+    'ModelConfig': '.config',
+    'build_tiny_unet': '.unet_builder',
+    'quantize_unet': '.unet_builder',
+}
+
+__all__ = ['ModelLoader', 'ModelConfig', 'build_tiny_unet', 'quantize_unet']
 
 __version__ = "1.0.0"
 
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
+
 def get_models_info():
     """Return information about the models package"""
     return {
         'version': __version__,
         'description': 'Model management for hairline tracking system',
-        'modules': ['model_loader', 'config']
+        'modules': ['model_loader', 'config', 'unet_builder']
     }
\ No newline at end of file
@@ -9,10 +9,88 @@ class ModelConfig:
     
     # Hairline detection settings
     HAIRLINE_CONFIDENCE_THRESHOLD = 0.6
-    MAX_FACES = 1
+    MAX_FACES = 1  # faces analyzed per single-user photo
+    GROUP_MAX_FACES = 4  # faces analyzed per group photo (HairlineDetector.analyze_faces)
+    FACE_MATCH_THRESHOLD = 0.08  # max RMS landmark-signature distance for a user match
+    ENROLL_GUEST_FACES = False  # remember unmatched group-photo faces as guest users
+    
+    # Face-presence prefilter (cheap detector before FaceMesh). Below
+    # PREFILTER_MIN_IMAGE_SIDE FaceMesh alone is cheaper, so small images skip it
+    PREFILTER_ENABLED = True
+    PREFILTER_MIN_IMAGE_SIDE = 1000
+    PREFILTER_METHOD = 'mediapipe'  # 'mediapipe' (face detector) or 'haar'
+    PREFILTER_MODEL_SELECTION = 1  # 1 = full-range: finds small faces in large frames
+    PREFILTER_MAX_SIDE = 320  # longest side of the detection image
+    PREFILTER_MIN_FACE_SIZE = 48  # pixels; smaller faces are rejected
+    PREFILTER_CONFIDENCE = 0.3  # permissive: a miss skips an analyzable image
+    PREFILTER_ROI_PADDING = (0.35, 0.8, 0.25)  # side, top, bottom margins (face box fractions)
+    
+    # Hairline backend: 'edges' (Canny) or 'unet' (segmentation model)
+    HAIRLINE_BACKEND = 'edges'
+    
+    # U-Net segmentation settings (CPU inference)
+    SEGMENTATION_BACKEND = 'opencv'  # 'opencv' or 'onnxruntime'
+    SEGMENTATION_QUANTIZED = False  # int8 weights (always run with onnxruntime)
+    SEGMENTATION_THREADS = 2
+    SEGMENTATION_INPUT_SIZE = (128, 64)  # (width, height) of the forehead crop
+    SEGMENTATION_THRESHOLD = 0.5
+    
+    # Hairline profile: upper boundary resampled to a fixed number of points
+    HAIRLINE_PROFILE_POINTS = 64
+    HAIRLINE_PROFILE_SMOOTHING = 9  # moving-median window (pixel columns)
+    STORE_RAW_HAIRLINE_POINTS = False  # persist raw contour points alongside the profile
+    
+    # Canonical alignment (similarity transform from eye/nose landmarks)
+    ALIGNMENT_ENABLED = True
+    ALIGNED_CROP_WIDTH = 128  # pixels; height follows from the box
+    ALIGNED_FOREHEAD_BOX = (-1.0, -2.0, 1.0, -0.25)  # interocular units, origin between the eyes
+    CACHE_ALIGNED_CROPS = True  # save each analysis' canonical crop
+    
+    # Visualization settings
+    VISUALIZATION_MAX_SIZE = 800  # longest side of rendered overlays (0 = full size)
+    THUMBNAIL_SIZE = 200  # longest side of saved thumbnails
+    BATCH_VISUALIZE = False  # render/save overlays in batch runs
+    
+    # Near-duplicate input photos (dHash + BK-tree index)
+    DEDUP_ENABLED = True
+    DEDUP_MAX_DISTANCE = 4  # max Hamming distance between 64-bit dHashes
+    DEDUP_WINDOW_HOURS = 24  # only earlier photos of the same user this recent (0 = any time)
+    
+    # Forehead-ROI preprocessing before hairline detection (L channel only)
+    PREPROCESSING_ENABLED = True
+    PREPROCESSING_STAGES = ('gamma', 'clahe')  # applied in order, each only when the ROI needs it
+    PREPROCESS_DARK_THRESHOLD = 80  # mean L below this -> gamma brightening
+    PREPROCESS_CONTRAST_THRESHOLD = 20  # L standard deviation below this -> CLAHE
+    PREPROCESS_CLAHE_CLIP = 2.0
+    PREPROCESS_CLAHE_GRID = (4, 4)
+    PREPROCESS_ROI_PADDING = 8  # pixels around the forehead ROI
+    
+    # Edge backend: Canny on the forehead ROI with thresholds from its median
+    CANNY_SIGMA = 0.33  # thresholds = (1 -/+ sigma) * ROI median
+    CANNY_BLUR_FRACTION = 0.02  # Gaussian pre-blur kernel as a fraction of the ROI size (0 = none)
+    HAIRLINE_POINT_BUDGET = 2000  # max hairline points per face (0 = unlimited)
+    CANNY_BUDGET_RETRIES = 2  # reruns with raised thresholds while over the budget
+    
+    # Data retention: max age in days per kind of data (0 = keep forever)
+    RETENTION_DAYS = {
+        'input_images': 0,
+        'analyses': 0,
+        'visualizations': 30,
+        'reports': 90,
+        'exports': 30,
+        'processed_images': 30
+    }
+    RETENTION_BATCH_SIZE = 500  # files deleted per batch
+    RETENTION_BATCH_PAUSE = 0.0  # seconds between batches (throttles background runs)
+    ARCHIVE_AFTER_DAYS = 180  # older analyses and input images move to compressed bundles (0 = never)
+    
+    # Fleet reports (all users in one run)
+    FLEET_WORKERS = 0  # plot rendering processes (0 = one per CPU)
+    FLEET_PLOT_DPI = 100
     
     # Model paths (for future trained models)
     MODEL_PATHS = {
         'face_detector': 'models/trained_models/face_detector.pb',
-        'hairline_segmentor': 'models/trained_models/hairline_model.h5'
-    }
\ No newline at end of file
+        'hairline_segmentor': 'models/trained_models/hairline_model.onnx',
+        'hairline_segmentor_int8': 'models/trained_models/hairline_model.int8.onnx'
+    }
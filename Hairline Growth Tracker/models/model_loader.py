@@ -3,27 +3,216 @@ Model loading and management utilities
 """
 
 import os
-import cv2
 import json
+import mmap
+import threading
+import time
+from utils.metrics import CACHE_REQUESTS
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 class ModelLoader:
-    def __init__(self):
+    def __init__(self, model_dir='models/trained_models'):
+        """
+        Registry of models that are loaded lazily on first use
+
+        Models are cached by (name, version). Weight files are memory-mapped
+        read-only and handed to the factories as buffers. The inference
+        backends parse them into their own memory, so workers share a model
+        only by being forked after preload() (copy-on-write), not through
+        the mapping.
+        """
+        self.model_dir = model_dir
         self.loaded_models = {}
-    
+        self.registered_models = {}
+        self.mapped_files = {}
+        self.model_stats = {}
+        self._lock = threading.RLock()
+
     def ensure_model_directories(self):
         """Create necessary directories for models"""
-        os.makedirs('models/trained_models', exist_ok=True)
-    
+        os.makedirs(self.model_dir, exist_ok=True)
+
     def save_model_metadata(self, model_name, metadata):
         """Save model metadata"""
-        metadata_path = f'models/trained_models/{model_name}_metadata.json'
+        metadata_path = os.path.join(self.model_dir, f'{model_name}_metadata.json')
         with open(metadata_path, 'w') as f:
             json.dump(metadata, f, indent=2)
-    
+
     def load_model_metadata(self, model_name):
         """Load model metadata"""
-        metadata_path = f'models/trained_models/{model_name}_metadata.json'
+        metadata_path = os.path.join(self.model_dir, f'{model_name}_metadata.json')
         if os.path.exists(metadata_path):
             with open(metadata_path, 'r') as f:
                 return json.load(f)
-        return None
\ No newline at end of file
+        return None
+
+    def register_model(self, model_name, factory, weights_path=None, version=None):
+        """
+        Register a model without loading it
+
+        Args:
+            model_name: Registry name of the model
+            factory: Callable factory(weights_path, weights) -> model, where
+                weights is a read-only memory map of weights_path (or None)
+            weights_path: Optional weight file to memory-map
+            version: Model version; defaults to the metadata version or '1'
+        """
+        if version is None:
+            metadata = self.load_model_metadata(model_name) or {}
+            version = str(metadata.get('version', '1'))
+
+        with self._lock:
+            versions = self.registered_models.setdefault(model_name, {})
+            versions[version] = (factory, weights_path)
+        return version
+
+    def get_model(self, model_name, version=None):
+        """
+        Return a model, loading it on first use
+
+        Args:
+            model_name: Registry name of the model
+            version: Specific version; defaults to the latest registered one
+        """
+        key = self._resolve(model_name, version)
+
+        with self._lock:
+            # Stats are read concurrently (metrics): only touch them under the lock
+            if key not in self.loaded_models:
+                self._load(key)
+                CACHE_REQUESTS.inc(cache='models', result='miss')
+            else:
+                self.model_stats[key]['hits'] += 1
+                CACHE_REQUESTS.inc(cache='models', result='hit')
+            return self.loaded_models[key]
+
+    def _resolve(self, model_name, version):
+        """Resolve a model name and optional version to a registry key"""
+        versions = self.registered_models.get(model_name)
+        if not versions:
+            raise KeyError(f"Model not registered: {model_name}")
+
+        if version is None:
+            version = list(versions)[-1]
+        elif version not in versions:
+            raise KeyError(f"Model {model_name} has no version {version}")
+        return (model_name, version)
+
+    def _load(self, key):
+        """Load a registered model and record its load statistics"""
+        factory, weights_path = self.registered_models[key[0]][key[1]]
+
+        start = time.perf_counter()
+        weights = self.map_weights(weights_path) if weights_path else None
+        model = factory(weights_path, weights)
+        load_time = time.perf_counter() - start
+
+        self.loaded_models[key] = model
+        self.model_stats[key] = {
+            'load_time': load_time,
+            'mapped_bytes': len(weights) if weights is not None else 0,
+            'warmup_time': 0.0,
+            'warmup_runs': 0,
+            'hits': 0,
+            'misses': 1
+        }
+
+    def map_weights(self, weights_path):
+        """
+        Memory-map a weight file read-only (one mapping per path and process)
+        """
+        with self._lock:
+            weights = self.mapped_files.get(weights_path)
+            if weights is None:
+                with open(weights_path, 'rb') as f:
+                    weights = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.mapped_files[weights_path] = weights
+            return weights
+
+    def warm_up(self, model_name, version=None, runs=1):
+        """
+        Run warm-up inferences so the first real request is not a cold start
+
+        Models opt in by exposing a warm_up(runs) method.
+        """
+        model = self.get_model(model_name, version)
+        key = self._resolve(model_name, version)
+
+        if not hasattr(model, 'warm_up'):
+            return 0.0
+
+        start = time.perf_counter()
+        model.warm_up(runs)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.model_stats[key]['warmup_time'] += elapsed
+            self.model_stats[key]['warmup_runs'] += runs
+        return elapsed
+
+    def preload(self, model_names=None, warm_up_runs=1):
+        """
+        Load (and warm up) models up front, e.g. before forking a process pool
+        """
+        for model_name in model_names or list(self.registered_models):
+            self.get_model(model_name)
+            if warm_up_runs:
+                self.warm_up(model_name, runs=warm_up_runs)
+
+    def unload_model(self, model_name, version=None):
+        """Drop a loaded model from the cache"""
+        key = self._resolve(model_name, version)
+        with self._lock:
+            return self.loaded_models.pop(key, None) is not None
+
+    def get_stats(self):
+        """
+        Return load-time, warm-up, cache and memory statistics
+        """
+        with self._lock:
+            models = {
+                f'{name}:{version}': dict(stats)
+                for (name, version), stats in self.model_stats.items()
+            }
+            loaded_models = len(self.loaded_models)
+            mapped_bytes = sum(len(weights) for weights in self.mapped_files.values())
+        return {
+            'models': models,
+            'loaded_models': loaded_models,
+            'mapped_bytes': mapped_bytes,
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+        }
+
+_default_loader = None
+
+def get_model_loader():
+    """Return the process-wide model registry with the built-in models registered"""
+    global _default_loader
+    if _default_loader is None:
+        from .config import ModelConfig
+
+        loader = ModelLoader()
+        loader.register_model(
+            'hairline_segmentor', _load_segmentor,
+            weights_path=ModelConfig.MODEL_PATHS['hairline_segmentor']
+        )
+        loader.register_model(
+            'hairline_segmentor_int8', _load_segmentor_int8,
+            weights_path=ModelConfig.MODEL_PATHS['hairline_segmentor_int8']
+        )
+        _default_loader = loader
+    return _default_loader
+
+def _load_segmentor(weights_path, weights):
+    """Registry factory for the U-Net hairline segmentor"""
+    from utils.hair_segmenter import UNetSegmenter
+    return UNetSegmenter(model_path=weights_path, model_buffer=weights)
+
+def _load_segmentor_int8(weights_path, weights):
+    """Registry factory for the int8 quantized U-Net hairline segmentor"""
+    from utils.hair_segmenter import UNetSegmenter
+    return UNetSegmenter(model_path=weights_path, model_buffer=weights, quantized=True)
@@ -0,0 +1,90 @@
+"""
+Tiny U-Net model export and quantization utilities
+
+Builds a small ONNX U-Net for hair segmentation so the segmentation
+backend can be exercised without a trained model, and quantizes
+trained models to int8 for faster CPU inference.
+"""
+
+import os
+import numpy as np
+
+def build_tiny_unet(output_path, base_channels=4, seed=0):
+    """
+    Write a small randomly initialised U-Net to an ONNX file
+
+    The network has one encoder level, a bottleneck and one decoder level
+    with a skip connection, and outputs a 1-channel hair probability map
+    at the input resolution. Input height and width must be even.
+
+    Args:
+        output_path: Destination .onnx path
+        base_channels: Channels of the first encoder level
+        seed: Random seed for the weights
+
+    Returns:
+        str: The written model path
+    """
+    try:
+        import onnx
+        from onnx import helper, numpy_helper, TensorProto
+    except ImportError:
+        raise ImportError("Building ONNX models requires: pip install onnx")
+
+    rng = np.random.default_rng(seed)
+    c1, c2 = base_channels, base_channels * 2
+    initializers = []
+    nodes = []
+
+    def conv(name, inputs, in_channels, out_channels, kernel=3, activation='Relu'):
+        weight = rng.normal(0, np.sqrt(2.0 / (in_channels * kernel * kernel)),
+                            (out_channels, in_channels, kernel, kernel)).astype(np.float32)
+        bias = np.zeros(out_channels, dtype=np.float32)
+        initializers.append(numpy_helper.from_array(weight, f'{name}_w'))
+        initializers.append(numpy_helper.from_array(bias, f'{name}_b'))
+        pad = kernel // 2
+        nodes.append(helper.make_node('Conv', [inputs, f'{name}_w', f'{name}_b'], [f'{name}_conv'],
+                                      pads=[pad, pad, pad, pad]))
+        nodes.append(helper.make_node(activation, [f'{name}_conv'], [name]))
+        return name
+
+    enc = conv('enc', 'input', 3, c1)
+    nodes.append(helper.make_node('MaxPool', [enc], ['pool'], kernel_shape=[2, 2], strides=[2, 2]))
+    bottleneck = conv('bottleneck', 'pool', c1, c2)
+
+    initializers.append(numpy_helper.from_array(np.array([1, 1, 2, 2], dtype=np.float32), 'up_scales'))
+    nodes.append(helper.make_node('Resize', [bottleneck, '', 'up_scales'], ['up'], mode='nearest'))
+    nodes.append(helper.make_node('Concat', ['up', enc], ['skip'], axis=1))
+    dec = conv('dec', 'skip', c1 + c2, c1)
+    conv('output', dec, c1, 1, kernel=1, activation='Sigmoid')
+
+    graph = helper.make_graph(
+        nodes, 'tiny_unet',
+        [helper.make_tensor_value_info('input', TensorProto.FLOAT, ['N', 3, 'H', 'W'])],
+        [helper.make_tensor_value_info('output', TensorProto.FLOAT, ['N', 1, 'H', 'W'])],
+        initializers
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    onnx.checker.check_model(model)
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    onnx.save(model, output_path)
+    return output_path
+
+def quantize_unet(model_path, output_path):
+    """
+    Quantize U-Net weights to int8 (dynamic quantization, ONNX Runtime)
+
+    Returns:
+        str: The written quantized model path
+    """
+    try:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+    except ImportError:
+        raise ImportError("Quantization requires: pip install onnxruntime")
+
+    quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8)
+    return output_path
@@ -1,32 +1,229 @@
 import json
 import os
+import shutil
 from datetime import datetime
-import matplotlib.pyplot as plt
 import numpy as np
+from utils.metrics import STORE_WRITE_SECONDS
+from utils.file_lock import FileLock, atomic_write_json
+from utils.hairline_profile import storable_result
+from utils.trends import TrendEngine, fit_trends, timestamp_to_days
+from data.metric_store import MetricStore
 
 class ProgressTracker:
-    def __init__(self, data_file="hairline_data.json"):
+    def __init__(self, data_file="hairline_data.json", compact_threshold=200, fsync=False, comparator=None,
+                 metric_store=None):
+        """
+        Progress store shared safely between processes
+        
+        The JSON snapshot in data_file is only ever replaced atomically.
+        New analyses are appended to a write-ahead log (data_file + '.wal')
+        under an inter-process lock, so concurrent writers never overwrite
+        each other; the log is folded back into the snapshot every
+        compact_threshold entries. Each compaction keeps the previous snapshot
+        and log ('.bak', '.wal.bak') to recover from if the snapshot is
+        found corrupt. Readers pick up other processes' writes through
+        refresh(). The records are only parsed on first access to data;
+        reports read the columnar metric store instead.
+        
+        Args:
+            data_file: JSON snapshot path
+            compact_threshold: WAL entries before an automatic compaction
+            fsync: fsync every WAL append (slower, survives power loss)
+            comparator: Optional SessionComparator; reports then include
+                session-to-session hairline changes
+            metric_store: MetricStore kept in step with the saved sessions
+                (default: a store next to data_file)
+        """
         self.data_file = data_file
-        self.data = self.load_data()
+        self.wal_file = data_file + '.wal'
+        self.backup_file = data_file + '.bak'
+        self.wal_backup_file = self.wal_file + '.bak'
+        self.lock = FileLock(data_file + '.lock')
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+        self.comparator = comparator
+        self.trends = TrendEngine()
+        self._snapshot_signature = None
+        self._wal_offset = 0
+        self._wal_entries = 0
+        self._data = None
+        if metric_store is None:
+            metric_store = MetricStore(f"{os.path.splitext(data_file)[0]}_metrics")
+        self.metric_store = metric_store
+    
+    @property
+    def data(self):
+        """All sessions (user_id -> timestamp -> record), loaded on first access"""
+        if self._data is None:
+            self._data = self.load_data()
+        return self._data
+    
+    @data.setter
+    def data(self, value):
+        self._data = value
+    
+    def _file_signature(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
     
     def load_data(self):
-        """Load existing data from JSON file"""
-        if os.path.exists(self.data_file):
+        """Load existing data from the JSON snapshot and replay the WAL"""
+        with self.lock:
+            self._snapshot_signature = self._file_signature(self.data_file)
+            self._wal_offset = 0
+            self._wal_entries = 0
+            data = self._read_snapshot()
+            self._replay_wal(data)
+        return data
+    
+    def _read_snapshot(self):
+        if not os.path.exists(self.data_file):
+            return {}
+        try:
+            with open(self.data_file, 'r') as f:
+                content = f.read().strip()
+                if not content:
+                    return {}
+                return json.loads(content)
+        except json.JSONDecodeError:
+            # Keep the damaged file for recovery instead of silently dropping it
+            backup = f"{self.data_file}.corrupt-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            os.replace(self.data_file, backup)
+            self._snapshot_signature = None
+            return self._recover_snapshot(backup)
+    
+    def _recover_snapshot(self, corrupt_file):
+        """
+        Rebuild the lost snapshot from the one before the last compaction and
+        the log compacted into it, and write it back; the current WAL is then
+        replayed on top as usual
+        """
+        if not os.path.exists(self.wal_backup_file):
+            print(f"⚠️ Corrupted JSON file detected. Moved to {corrupt_file}; no previous snapshot kept, "
+                  f"recovering from the WAL only: sessions saved before the last compaction are lost.")
+            return {}
+        
+        data, outcome = {}, "recovered from the previous snapshot and WAL"
+        if os.path.exists(self.backup_file):
+            try:
+                with open(self.backup_file, 'r') as f:
+                    data = json.load(f)
+            except json.JSONDecodeError:
+                outcome = ("the previous snapshot is damaged too, recovering from the previous WAL only: "
+                           "sessions saved before the last two compactions are lost")
+        self._replay_wal(data, self.wal_backup_file, offset=0)
+        self._wal_entries = 0
+        atomic_write_json(self.data_file, data, indent=2)
+        self._snapshot_signature = self._file_signature(self.data_file)
+        print(f"⚠️ Corrupted JSON file detected. Moved to {corrupt_file}; {outcome}.")
+        return data
+    
+    def _replay_wal(self, data, wal_file=None, offset=None):
+        """Apply complete WAL records past the last read offset"""
+        wal_file = wal_file or self.wal_file
+        tracked = offset is None
+        if not os.path.exists(wal_file):
+            return
+        with open(wal_file, 'rb') as f:
+            f.seek(self._wal_offset if tracked else offset)
+            chunk = f.read()
+        
+        # A record is complete once its newline is written; a torn tail from a
+        # crashed or in-flight writer is left for the next read
+        complete = chunk[:chunk.rfind(b'\n') + 1]
+        for line in complete.splitlines():
             try:
-                with open(self.data_file, 'r') as f:
-                    content = f.read().strip()
-                    if not content:
-                        return {}
-                    return json.loads(content)
+                record = json.loads(line)
             except json.JSONDecodeError:
-                print("⚠️ Corrupted JSON file detected. Resetting data.")
-                return {}
-        return {}
+                continue
+            data.setdefault(record['user_id'], {})[record['timestamp']] = record['result']
+            self._wal_entries += 1
+        if tracked:
+            self._wal_offset += len(complete)
     
-    def save_data(self):
-        """Save data to JSON file safely"""
-        with open(self.data_file, 'w') as f:
-            json.dump(self.data, f, indent=2)
+    def refresh(self):
+        """Pick up writes made by other processes since the last load"""
+        if self._data is None:
+            return self.data
+        if self._file_signature(self.data_file) != self._snapshot_signature:
+            # Another process compacted: reload snapshot + WAL from scratch
+            self.data = self.load_data()
+        else:
+            self._replay_wal(self.data)
+        return self.data
+    
+    def save_data(self, keep_backup=True):
+        """
+        Compact: merge all writes into the snapshot, atomically, and reset the WAL
+        
+        Args:
+            keep_backup: Keep the replaced snapshot and WAL for recovery;
+                False discards them (e.g. after deleting sessions)
+        """
+        with self.lock:
+            self.refresh()
+            with STORE_WRITE_SECONDS.time(store='progress'):
+                if keep_backup:
+                    self._backup_snapshot()
+                atomic_write_json(self.data_file, self.data, indent=2)
+                if keep_backup and os.path.exists(self.wal_file):
+                    os.replace(self.wal_file, self.wal_backup_file)
+                open(self.wal_file, 'w').close()
+                if not keep_backup:
+                    for path in (self.backup_file, self.wal_backup_file):
+                        if os.path.exists(path):
+                            os.remove(path)
+            self._snapshot_signature = self._file_signature(self.data_file)
+            self._wal_offset = 0
+            self._wal_entries = 0
+    
+    def _backup_snapshot(self):
+        """Keep the current snapshot as backup_file (hard link, or a copy)"""
+        if not os.path.exists(self.data_file):
+            # First compaction: the snapshot is empty, the WAL backup is all
+            if os.path.exists(self.backup_file):
+                os.remove(self.backup_file)
+            return
+        tmp_path = self.backup_file + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(self.data_file, tmp_path)
+        except OSError:
+            shutil.copy2(self.data_file, tmp_path)
+        os.replace(tmp_path, self.backup_file)
+    
+    def prune(self, before, user_ids=None):
+        """
+        Delete sessions older than the 'before' timestamp (for the given
+        users, or everyone) and compact the store
+        
+        Returns:
+            list: Removed (user_id, timestamp) pairs
+        """
+        removed = []
+        with self.lock:
+            self.refresh()
+            for user_id in list(self.data if user_ids is None else user_ids):
+                sessions = self.data.get(user_id)
+                if not sessions:
+                    continue
+                expired = [timestamp for timestamp in sessions if timestamp < before]
+                for timestamp in expired:
+                    del sessions[timestamp]
+                    removed.append((user_id, timestamp))
+                if expired:
+                    self.trends.forget(user_id)
+                if not sessions:
+                    del self.data[user_id]
+            # Backups would bring the deleted sessions back on recovery
+            self.save_data(keep_backup=not removed)
+            if removed:
+                self.metric_store.rebuild(self.data)
+        return removed
     
     def convert_numpy(self, obj):
         """Recursively convert NumPy arrays to lists for JSON serialization"""
@@ -41,48 +238,145 @@ class ProgressTracker:
 
     def save_analysis(self, user_id, timestamp, analysis_result):
         """Save analysis results for a user"""
-        if user_id not in self.data:
-            self.data[user_id] = {}
+        self.save_analyses([(user_id, timestamp, analysis_result)])
+    
+    def save_analyses(self, records, fsync=None):
+        """
+        Save several (user_id, timestamp, analysis_result) records as one
+        group commit: a single locked WAL append (and fsync)
+        """
+        lines = []
+        rows = []
+        for user_id, timestamp, analysis_result in records:
+            # ✅ Convert NumPy arrays before saving
+            safe_result = self.convert_numpy(storable_result(analysis_result))
+            lines.append(json.dumps({'user_id': user_id, 'timestamp': timestamp, 'result': safe_result}))
+            rows.append((user_id, timestamp, safe_result))
+        
+        if not lines:
+            return
+        
+        with self.lock:
+            with STORE_WRITE_SECONDS.time(store='progress_wal'):
+                with open(self.wal_file, 'a') as f:
+                    f.write('\n'.join(lines) + '\n')
+                    f.flush()
+                    if self.fsync if fsync is None else fsync:
+                        os.fsync(f.fileno())
+            # Only now that the records are in the WAL do they reach memory:
+            # replaying it folds in our records plus other writers' appends
+            self.refresh()
+            for user_id, timestamp, safe_result in rows:
+                self.trends.replace(user_id, timestamp, safe_result)
+            if self._wal_entries >= self.compact_threshold:
+                self.save_data()
+        self.update_metric_store(rows)
+    
+    def update_metric_store(self, rows=()):
+        """Append new sessions to the metric store (built from all sessions the first time)"""
+        if self.metric_store.exists():
+            self.metric_store.append(list(rows))
+        else:
+            self.metric_store.rebuild(self.data)
+    
+    def generate_report(self, user_id, plot=True):
+        """
+        Generate progress report for a user
+        
+        Metric series come from the columnar metric store, so the cost does
+        not depend on the size of the stored analysis records.
         
-        # ✅ Convert NumPy arrays before saving
-        safe_result = self.convert_numpy(analysis_result)
-        self.data[user_id][timestamp] = safe_result
-        self.save_data()
+        Args:
+            plot: Also draw (and show) the progress and change plots
+        """
+        report, metrics, pairs = self.build_report(user_id)
+        if plot and metrics:
+            self.plot_progress(user_id, metrics)
+            if pairs:
+                self.plot_changes(user_id, pairs)
+        return report
     
-    def generate_report(self, user_id):
-        """Generate progress report for a user"""
-        if user_id not in self.data or not self.data[user_id]:
-            return "No data available for this user."
+    def build_report(self, user_id):
+        """
+        Report text plus the data behind its plots
         
-        user_data = self.data[user_id]
-        timestamps = sorted(user_data.keys())
+        Returns:
+            tuple: (report text, metrics series or None when there is too
+                little data, session comparison pairs)
+        """
+        if not self.metric_store.exists():
+            self.update_metric_store()
+        series = self.metric_store.user_series(user_id)
+        timestamps = series['timestamps']
+        if not timestamps:
+            return "No data available for this user.", None, []
         
         if len(timestamps) < 2:
-            return "Need at least 2 analyses to track progress."
+            return "Need at least 2 analyses to track progress.", None, []
         
         metrics = {
-            'hairline_height': [],
-            'forehead_ratio': [],
-            'density_score': [],
-            'dates': []
+            'hairline_height': series['hairline_height'].tolist(),
+            'forehead_ratio': series['forehead_ratio'].tolist(),
+            'density_score': series['density_score'].tolist(),
+            'dates': timestamps
         }
         
-        for ts in timestamps:
-            data = user_data[ts]
-            metrics['hairline_height'].append(data['hairline_height'])
-            metrics['forehead_ratio'].append(data['forehead_ratio'])
-            metrics['density_score'].append(data['density_score'])
-            metrics['dates'].append(ts)
+        user_data = self.metric_store.user_records(user_id)
+        trends = self.trends.user_trends(user_id, user_data)
+        progress = self.calculate_progress(metrics, trends)
         
-        progress = self.calculate_progress(metrics)
-        self.plot_progress(user_id, metrics)
-        return progress
+        pairs = []
+        if self.comparator is not None:
+            pairs = self.comparator.compare_user(user_id, user_data)
+            progress += f"""
+        SESSION CHANGES:
+        {self.comparator.summarize(pairs)}
+        """
+        return progress, metrics, pairs
     
-    def calculate_progress(self, metrics):
-        """Calculate progress metrics"""
+    def fleet_trends(self, metric='hairline_height', user_ids=None):
+        """
+        Fit one metric's trend for every user (or the given ones) in one
+        vectorized pass over the metric store
+        
+        Returns:
+            tuple: (user ids, fit_trends() result with one row per user)
+        """
+        if not self.metric_store.exists():
+            self.update_metric_store()
+        users, times, values = self.metric_store.padded(metric, user_ids)
+        return users, fit_trends(times, values, self.trends.window, self.trends.min_size)
+    
+    def calculate_progress(self, metrics, trends=None):
+        """
+        Calculate progress metrics
+        
+        With trends (TrendEngine.user_trends), changes are read off robust
+        Theil-Sen fits over all sessions instead of last - first, so a single
+        bad photo cannot flip the verdict.
+        """
         first, last = 0, -1
         hairline_change = metrics['hairline_height'][last] - metrics['hairline_height'][first]
         density_change = metrics['density_score'][last] - metrics['density_score'][first]
+        trend_lines = []
+        
+        if trends:
+            hairline_trend = trends.get('hairline_height')
+            density_trend = trends.get('density_score')
+            if hairline_trend and np.isfinite(hairline_trend['slope']):
+                hairline_change = hairline_trend['fitted_change']
+                trend_lines.append(f"- Hairline Height Trend: {hairline_trend['slope'] * 30:+.4f} per 30 days")
+            if density_trend and np.isfinite(density_trend['slope']):
+                density_change = density_trend['fitted_change']
+                trend_lines.append(f"- Density Score Trend: {density_trend['slope'] * 30:+.4f} per 30 days")
+            # change_index skips sessions without the metric: locate the session by time
+            session_days = np.array([timestamp_to_days(date) for date in metrics['dates']])
+            for name, trend in trends.items():
+                if trend['change_index'] >= 0 and trend['change_score'] >= 0.7:
+                    date = metrics['dates'][int(np.argmin(np.abs(session_days - trend['change_time'])))]
+                    trend_lines.append(f"- Change point in {name.replace('_', ' ')} at session "
+                                       f"{date} (shift {trend['change_shift']:+.3f})")
+        trend_text = "\n        ".join(trend_lines) if trend_lines else "- Not enough sessions for a trend"
         
         report = f"""
         HAIRLINE PROGRESS REPORT
@@ -98,6 +392,9 @@ class ProgressTracker:
         
         - Overall Progress: {'IMPROVING' if density_change > 0 and hairline_change < 0 else 'STABLE' if abs(hairline_change) < 0.01 else 'NEEDS ATTENTION'}
         
+        TRENDS:
+        {trend_text}
+        
         RECOMMENDATIONS:
         {self.generate_recommendations(hairline_change, density_change)}
         """
@@ -131,30 +428,76 @@ class ProgressTracker:
     
     def plot_progress(self, user_id, metrics):
         """Create progress visualization"""
-        fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(12, 8))
-        dates = [d.split('_')[0] for d in metrics['dates']]
-        
-        ax1.plot(dates, metrics['hairline_height'], 'bo-', linewidth=2)
-        ax1.set_title('Hairline Height Over Time')
-        ax1.set_ylabel('Normalized Height')
-        ax1.tick_params(axis='x', rotation=45)
-        
-        ax2.plot(dates, metrics['forehead_ratio'], 'go-', linewidth=2)
-        ax2.set_title('Forehead Ratio Over Time')
-        ax2.set_ylabel('Ratio')
-        ax2.tick_params(axis='x', rotation=45)
-        
-        ax3.plot(dates, metrics['density_score'], 'ro-', linewidth=2)
-        ax3.set_title('Density Score Over Time')
-        ax3.set_ylabel('Score')
-        ax3.tick_params(axis='x', rotation=45)
-        
-        progress_score = [(1 - h) + d for h, d in zip(metrics['hairline_height'], metrics['density_score'])]
-        ax4.plot(dates, progress_score, 'mo-', linewidth=2)
-        ax4.set_title('Overall Progress Score')
-        ax4.set_ylabel('Progress Score')
-        ax4.tick_params(axis='x', rotation=45)
-        
-        plt.tight_layout()
-        plt.savefig(f'{user_id}_progress_report.png', dpi=300, bbox_inches='tight')
+        import matplotlib.pyplot as plt
+        
+        render_progress(metrics, f'{user_id}_progress_report.png')
         plt.show()
+    
+    def plot_changes(self, user_id, pairs):
+        """Plot per-column hairline displacement per session pair and the latest change map"""
+        import matplotlib.pyplot as plt
+        
+        plt.close(render_changes(pairs, f'{user_id}_hairline_changes.png'))
+
+def render_progress(metrics, save_path, dpi=300, bbox_inches='tight'):
+    """
+    Draw the progress panels of a metrics series and save them; returns the figure
+    
+    bbox_inches='tight' costs an extra draw pass; None keeps the
+    tight_layout() margins.
+    """
+    import matplotlib.pyplot as plt
+    
+    fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(12, 8))
+    dates = [d.split('_')[0] for d in metrics['dates']]
+    
+    ax1.plot(dates, metrics['hairline_height'], 'bo-', linewidth=2)
+    ax1.set_title('Hairline Height Over Time')
+    ax1.set_ylabel('Normalized Height')
+    ax1.tick_params(axis='x', rotation=45)
+    
+    ax2.plot(dates, metrics['forehead_ratio'], 'go-', linewidth=2)
+    ax2.set_title('Forehead Ratio Over Time')
+    ax2.set_ylabel('Ratio')
+    ax2.tick_params(axis='x', rotation=45)
+    
+    ax3.plot(dates, metrics['density_score'], 'ro-', linewidth=2)
+    ax3.set_title('Density Score Over Time')
+    ax3.set_ylabel('Score')
+    ax3.tick_params(axis='x', rotation=45)
+    
+    progress_score = [(1 - h) + d for h, d in zip(metrics['hairline_height'], metrics['density_score'])]
+    ax4.plot(dates, progress_score, 'mo-', linewidth=2)
+    ax4.set_title('Overall Progress Score')
+    ax4.set_ylabel('Progress Score')
+    ax4.tick_params(axis='x', rotation=45)
+    
+    plt.tight_layout()
+    plt.savefig(save_path, dpi=dpi, bbox_inches=bbox_inches)
+    return fig
+
+def render_changes(pairs, save_path, dpi=150, bbox_inches='tight'):
+    """Draw session-pair displacements and the latest change map and save them; returns the figure"""
+    import matplotlib.pyplot as plt
+    
+    displacements = np.stack([pair['displacement'] for pair in pairs])
+    latest_map = next((pair for pair in reversed(pairs) if pair['change_map'] is not None), None)
+    
+    fig, axes = plt.subplots(1, 2 if latest_map else 1, figsize=(12, 4), squeeze=False)
+    limit = np.nanmax(np.abs(displacements)) if np.isfinite(displacements).any() else 1.0
+    image = axes[0, 0].imshow(displacements, aspect='auto', cmap='RdBu', vmin=-limit, vmax=limit)
+    axes[0, 0].set_title('Hairline Displacement (blue = advance, red = recession)')
+    axes[0, 0].set_xlabel('Position across forehead')
+    axes[0, 0].set_yticks(range(len(pairs)))
+    axes[0, 0].set_yticklabels([pair['to'].split('_')[0] for pair in pairs])
+    fig.colorbar(image, ax=axes[0, 0])
+    
+    if latest_map:
+        image = axes[0, 1].imshow(latest_map['change_map'], cmap='RdBu', vmin=-128, vmax=128)
+        axes[0, 1].set_title(f"Forehead Change {latest_map['from'].split('_')[0]} -> {latest_map['to'].split('_')[0]}")
+        axes[0, 1].axis('off')
+        fig.colorbar(image, ax=axes[0, 1])
+    
+    plt.tight_layout()
+    plt.savefig(save_path, dpi=dpi, bbox_inches=bbox_inches)
+    return fig
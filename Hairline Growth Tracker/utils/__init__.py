@@ -3,12 +3,41 @@ Utility modules for the Hairline Tracker system.
 
 This package contains helper functions and classes for:
 - Face detection and landmark extraction
-- Image preprocessing and enhancement
+- Associating detected faces with users
+- Image preprocessing and enhancement (forehead-ROI CLAHE/gamma)
+- Hair segmentation backends (U-Net, CPU inference)
+- Fixed-size hairline profiles (upper boundary resampling)
+- Landmark-based alignment into canonical forehead crops
+- Robust metric trends and change-point detection
+- Per-stage timing and profiling instrumentation
+- Prometheus-style metrics registry and exposition
 - Data validation and quality control
 """
 
-from .face_detector import FaceDetector, create_face_detector, detect_single_face
-from .image_processor import preprocess_image, resize_image, enhance_contrast, validate_image_quality
+import importlib
+
+# Submodules are imported on first attribute access (PEP 562)
+_LAZY_ATTRIBUTES = {
+    'FaceDetector': '.face_detector',
+    'create_face_detector': '.face_detector',
+    'detect_single_face': '.face_detector',
+    'preprocess_image': '.image_processor',
+    'resize_image': '.image_processor',
+    'enhance_contrast': '.image_processor',
+    'validate_image_quality': '.image_processor',
+    'ImagePreprocessor': '.image_processor',
+    'get_clahe': '.image_processor',
+    'UNetSegmenter': '.hair_segmenter',
+    'create_segmenter': '.hair_segmenter',
+    'compute_hairline_profile': '.hairline_profile',
+    'FaceAligner': '.alignment',
+    'TrendEngine': '.trends',
+    'FaceMatcher': '.face_matching',
+    'INSTRUMENTATION': '.instrumentation',
+    'InstrumentationRegistry': '.instrumentation',
+    'REGISTRY': '.metrics',
+    'MetricsRegistry': '.metrics',
+}
 
 __all__ = [
     'FaceDetector',
@@ -17,16 +46,38 @@ __all__ = [
     'preprocess_image',
     'resize_image',
     'enhance_contrast',
-    'validate_image_quality'
+    'validate_image_quality',
+    'ImagePreprocessor',
+    'get_clahe',
+    'UNetSegmenter',
+    'create_segmenter',
+    'compute_hairline_profile',
+    'FaceAligner',
+    'TrendEngine',
+    'FaceMatcher',
+    'INSTRUMENTATION',
+    'InstrumentationRegistry',
+    'REGISTRY',
+    'MetricsRegistry'
 ]
 
 # Version information for utils
 __version__ = "1.0.0"
 
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
+
 def get_utils_info():
     """Return information about the utils package"""
     return {
         'version': __version__,
-        'modules': ['face_detector', 'image_processor'],
+        'modules': ['face_detector', 'image_processor', 'hair_segmenter', 'hairline_profile', 'alignment', 'trends', 'face_matching', 'instrumentation', 'metrics'],
         'description': 'Utility functions for hairline tracking system'
     }
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+Landmark-based alignment into a canonical forehead frame
+
+A similarity transform (rotation, uniform scale, translation) is fitted
+from stable landmarks (eye centers, nose tip) to fixed canonical positions,
+in units of the interocular distance. Only the forehead box of that frame
+is warped, into a small fixed-size crop, and metrics measured there do not
+depend on framing, camera distance or head roll.
+"""
+
+import cv2
+import numpy as np
+from models.config import ModelConfig
+from utils.face_detector import BROW_INDICES, FOREHEAD_INDICES
+from utils.hairline_profile import extract_upper_boundary, smooth_profile, resample_profile
+
+# Stable anchors: eye centers (image left / right) and nose tip
+LEFT_EYE_INDICES = np.array([33, 133])
+RIGHT_EYE_INDICES = np.array([362, 263])
+NOSE_TIP_INDEX = 1
+
+# Canonical anchor positions (x, y) in interocular-distance units, origin
+# between the eyes, y pointing down
+CANONICAL_ANCHORS = np.array([[-0.5, 0.0], [0.5, 0.0], [0.0, 0.6]])
+
+def estimate_similarity(source, target):
+    """
+    Least-squares similarity transform mapping source points onto target
+    points (Umeyama)
+
+    Returns:
+        np.ndarray: (2, 3) affine matrix
+    """
+    source = np.asarray(source, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64)
+    source_mean, target_mean = source.mean(axis=0), target.mean(axis=0)
+    source_centered, target_centered = source - source_mean, target - target_mean
+
+    covariance = target_centered.T @ source_centered / len(source)
+    U, S, Vt = np.linalg.svd(covariance)
+    D = np.diag([1.0, np.sign(np.linalg.det(U) * np.linalg.det(Vt)) or 1.0])
+    rotation = U @ D @ Vt
+    scale = np.trace(np.diag(S) @ D) / (source_centered ** 2).sum(axis=1).mean()
+
+    matrix = np.empty((2, 3))
+    matrix[:, :2] = scale * rotation
+    matrix[:, 2] = target_mean - matrix[:, :2] @ source_mean
+    return matrix
+
+def transform_points(points, matrix):
+    """Apply a (2, 3) affine matrix to (N, 2) points"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return points @ matrix[:, :2].T + matrix[:, 2]
+
+class FaceAligner:
+    def __init__(self, crop_width=None, forehead_box=None):
+        """
+        Args:
+            crop_width: Width in pixels of the canonical crop (height follows
+                from the box aspect ratio)
+            forehead_box: (x_min, y_min, x_max, y_max) of the crop in
+                canonical units
+        """
+        self.forehead_box = tuple(forehead_box or ModelConfig.ALIGNED_FOREHEAD_BOX)
+        x_min, y_min, x_max, y_max = self.forehead_box
+        width = crop_width or ModelConfig.ALIGNED_CROP_WIDTH
+        self.pixels_per_unit = width / (x_max - x_min)
+        self.crop_size = (width, int(round((y_max - y_min) * self.pixels_per_unit)))
+
+        # Canonical anchors in crop pixel coordinates
+        self.crop_anchors = (CANONICAL_ANCHORS - (x_min, y_min)) * self.pixels_per_unit
+
+    def get_anchors(self, landmarks):
+        """Anchor points (left eye, right eye, nose tip) in image coordinates"""
+        landmarks = np.asarray(landmarks, dtype=np.float64)
+        return np.stack([
+            landmarks[LEFT_EYE_INDICES].mean(axis=0),
+            landmarks[RIGHT_EYE_INDICES].mean(axis=0),
+            landmarks[NOSE_TIP_INDEX]
+        ])
+
+    def estimate_transform(self, landmarks):
+        """
+        Image -> canonical crop transform, or None if the landmarks do not
+        contain the anchors
+        """
+        if len(landmarks) <= RIGHT_EYE_INDICES.max():
+            return None
+        return estimate_similarity(self.get_anchors(landmarks), self.crop_anchors)
+
+    def align(self, image, landmarks):
+        """
+        Warp the forehead region into the canonical crop
+
+        Returns:
+            dict: 'crop' (fixed-size BGR image), 'matrix' (image -> crop),
+                'scale' (crop pixels per image pixel), 'rotation_deg'
+                (None if alignment is not possible)
+        """
+        matrix = self.estimate_transform(landmarks)
+        if matrix is None:
+            return None
+
+        # warpAffine only evaluates output pixels: cost is set by the crop size
+        crop = cv2.warpAffine(image, matrix, self.crop_size, flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_REPLICATE)
+        return {
+            'crop': crop,
+            'matrix': matrix,
+            'scale': float(np.hypot(matrix[0, 0], matrix[1, 0])),
+            'rotation_deg': float(np.degrees(np.arctan2(matrix[1, 0], matrix[0, 0])))
+        }
+
+    def to_canonical(self, crop_points):
+        """Convert crop pixel coordinates to canonical units"""
+        x_min, y_min = self.forehead_box[:2]
+        return np.asarray(crop_points, dtype=np.float64) / self.pixels_per_unit + (x_min, y_min)
+
+    def calculate_aligned_metrics(self, landmarks, hairline_points, matrix, num_points=64, window=9):
+        """
+        Metrics in the canonical frame (interocular-distance units)
+
+        Returns:
+            dict: 'aligned_profile' ((K,) hairline y per canonical x across
+                the crop, NaN where no hairline) and 'aligned_hairline_height'
+                (brow line to hairline distance)
+        """
+        landmarks = np.asarray(landmarks)
+        width, height = self.crop_size
+        x_min, y_min = self.forehead_box[:2]
+
+        crop_points = transform_points(hairline_points, matrix)
+        column_y = extract_upper_boundary(crop_points, 0, width - 1)
+        # Boundary points warped outside the crop (above or below) are not part of it
+        column_y[(column_y < 0) | (column_y >= height)] = np.nan
+        aligned_profile = resample_profile(smooth_profile(column_y, window), num_points)
+        aligned_profile = aligned_profile / self.pixels_per_unit + y_min
+
+        brow_y = self.to_canonical(transform_points(landmarks[BROW_INDICES], matrix))[:, 1].mean()
+        if np.isfinite(aligned_profile).any():
+            hairline_y = np.nanmedian(aligned_profile)
+        else:
+            # Fall back to the top of the forehead landmarks
+            forehead = landmarks[FOREHEAD_INDICES[FOREHEAD_INDICES < len(landmarks)]]
+            hairline_y = self.to_canonical(transform_points(forehead, matrix))[:, 1].min()
+
+        return {
+            'aligned_profile': aligned_profile,
+            'aligned_hairline_height': float(brow_y - hairline_y)
+        }
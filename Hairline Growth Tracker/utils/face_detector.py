@@ -1,85 +1,160 @@
 import cv2
 import numpy as np
-import mediapipe as mp
+from models.config import ModelConfig
+from utils.face_prefilter import face_roi
+
+# Landmark groups shared by the detector and the metric computations
+FOREHEAD_INDICES = np.array([10, 67, 69, 104, 108, 109, 151, 337, 338, 297])
+BROW_INDICES = np.array([105, 334, 336])
+CHIN_INDICES = np.array([152, 148, 176, 149, 150, 136, 172, 58, 132, 93, 234])
 
 class FaceDetector:
-    def __init__(self):
+    def __init__(self, max_faces=None, use_prefilter=None, prefilter=None):
         """
         Initialize Face Detector using MediaPipe Face Mesh
+        
+        Args:
+            max_faces: Maximum faces per image (defaults to ModelConfig.MAX_FACES)
+            use_prefilter: Run the face-presence prefilter before FaceMesh on
+                large images (defaults to ModelConfig.PREFILTER_ENABLED)
+            prefilter: FacePrefilter to use (created on first use otherwise)
         """
-        # Initialize MediaPipe Face Mesh
+        self.max_faces = max_faces or ModelConfig.MAX_FACES
+        self.use_prefilter = ModelConfig.PREFILTER_ENABLED if use_prefilter is None else use_prefilter
+        self.prefilter = prefilter
+        self.last_rejection = None
+        
+        # Initialize MediaPipe Face Mesh (imported here: mediapipe is slow to import)
+        import mediapipe as mp
         self.face_mesh = mp.solutions.face_mesh.FaceMesh(
             static_image_mode=True,
-            max_num_faces=1,
+            max_num_faces=self.max_faces,
             refine_landmarks=True,
             min_detection_confidence=0.5
         )
         
         # Define important facial landmarks for hairline analysis
         self.landmark_indices = {
-            'forehead': [10, 67, 69, 104, 108, 109, 151, 337, 338, 297],
+            'forehead': FOREHEAD_INDICES.tolist(),
             'eyebrows': [70, 63, 105, 66, 107, 55, 65, 52, 53, 46],
         }
     
-    def detect_face(self, image):
+    def prefilter_faces(self, image):
+        """
+        Cheap face boxes from the prefilter
+        
+        Returns:
+            np.ndarray: (N, 4) face boxes, empty if the image has no usable
+                face (reason in last_rejection), or None when the prefilter
+                is off or the image is small enough for FaceMesh alone
+        """
+        if not self.use_prefilter or max(image.shape[:2]) < ModelConfig.PREFILTER_MIN_IMAGE_SIDE:
+            return None
+        if self.prefilter is None:
+            from utils.face_prefilter import FacePrefilter
+            self.prefilter = FacePrefilter()
+        boxes, self.last_rejection = self.prefilter.detect(image)
+        return boxes
+    
+    def detect_face(self, image, face_boxes=None):
         """
         Detect face and landmarks in the image
         
         Args:
             image: Input image (BGR format)
+            face_boxes: Prefilter boxes, if already computed
+            
+        Returns:
+            dict: Contains detection results and landmarks (the largest
+                face when several are found)
+        """
+        faces = self.detect_faces(image, face_boxes)
+        if not faces:
+            return None
+        return max(faces, key=lambda face: face['bbox']['width'] * face['bbox']['height'])
+    
+    def detect_faces(self, image, face_boxes=None):
+        """
+        Detect up to max_faces faces and their landmarks in one pass
+        
+        With a prefilter, images without a usable face are rejected before
+        FaceMesh runs, and FaceMesh only processes the ROI around the faces.
+        
+        Args:
+            image: Input image (BGR format)
+            face_boxes: Prefilter boxes, if already computed
             
         Returns:
-            dict: Contains detection results and landmarks
+            list: Detection dicts ('landmarks', 'bbox', 'success'), ordered
+                left to right
         """
+        if face_boxes is None:
+            face_boxes = self.prefilter_faces(image)
+        
+        x_min = y_min = 0
+        region = image
+        if face_boxes is not None:
+            if len(face_boxes) == 0:
+                return []
+            # Boxes may come from the caller with the prefilter off
+            x_min, y_min, x_max, y_max = face_roi(face_boxes, image.shape)
+            region = image[y_min:y_max, x_min:x_max]
+        
         # Convert BGR to RGB
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        rgb_image = cv2.cvtColor(region, cv2.COLOR_BGR2RGB)
         
         # Process the image
         results = self.face_mesh.process(rgb_image)
         
         if not results.multi_face_landmarks:
-            return None
+            self.last_rejection = 'no_face'
+            return []
         
         # Get image dimensions
         height, width = image.shape[:2]
+        region_height, region_width = region.shape[:2]
         
-        # Extract landmarks for the first face
-        face_landmarks = results.multi_face_landmarks[0]
-        landmarks = self.extract_landmark_coordinates(face_landmarks, width, height)
-        
-        # Get face bounding box
-        bbox = self.get_face_bounding_box(landmarks, width, height)
+        faces = []
+        for face_landmarks in results.multi_face_landmarks:
+            # Landmarks are relative to the ROI: shift back to image coordinates
+            landmarks = self.extract_landmark_coordinates(face_landmarks, region_width, region_height)
+            landmarks += (x_min, y_min)
+            
+            # Get face bounding box
+            bbox = self.get_face_bounding_box(landmarks, width, height)
+            
+            faces.append({
+                'landmarks': landmarks,
+                'bbox': bbox,
+                'success': True
+            })
         
-        return {
-            'landmarks': landmarks,
-            'bbox': bbox,
-            'success': True
-        }
+        return sorted(faces, key=lambda face: face['bbox']['x_min'])
     
     def extract_landmark_coordinates(self, face_landmarks, image_width, image_height):
         """
         Extract landmark coordinates and convert to pixel values
-        """
-        landmarks = []
-        for landmark in face_landmarks.landmark:
-            x = int(landmark.x * image_width)
-            y = int(landmark.y * image_height)
-            landmarks.append([x, y])
         
-        return landmarks
+        Returns:
+            np.ndarray: Contiguous (L, 2) int32 array of pixel coordinates
+        """
+        normalized = np.array(
+            [(landmark.x, landmark.y) for landmark in face_landmarks.landmark],
+            dtype=np.float64
+        )
+        normalized *= (image_width, image_height)
+        return normalized.astype(np.int32)
     
     def get_face_bounding_box(self, landmarks, image_width, image_height):
         """
         Calculate bounding box around the face
         """
-        if not landmarks:
+        landmarks = np.asarray(landmarks)
+        if len(landmarks) == 0:
             return None
         
-        landmarks_array = np.array(landmarks)
-        x_min = np.min(landmarks_array[:, 0])
-        y_min = np.min(landmarks_array[:, 1])
-        x_max = np.max(landmarks_array[:, 0])
-        y_max = np.max(landmarks_array[:, 1])
+        x_min, y_min = (int(v) for v in landmarks.min(axis=0))
+        x_max, y_max = (int(v) for v in landmarks.max(axis=0))
         
         # Add some padding
         padding_x = int((x_max - x_min) * 0.05)
@@ -105,22 +180,15 @@ class FaceDetector:
         Get extended forehead region for hairline analysis
         """
         # Use forehead landmarks as base
-        forehead_indices = [10, 67, 69, 104, 108, 109, 151, 337, 338, 297]
-        forehead_base = []
-        for idx in forehead_indices:
-            if idx < len(landmarks):
-                forehead_base.append(landmarks[idx])
+        landmarks = np.asarray(landmarks)
+        forehead_array = landmarks[FOREHEAD_INDICES[FOREHEAD_INDICES < len(landmarks)]]
         
-        if not forehead_base:
+        if len(forehead_array) == 0:
             return None
         
-        forehead_array = np.array(forehead_base)
-        
         # Extend the forehead region upward for hairline detection
-        y_min = np.min(forehead_array[:, 1])
-        y_max = np.max(forehead_array[:, 1])
-        x_min = np.min(forehead_array[:, 0])
-        x_max = np.max(forehead_array[:, 0])
+        x_min, y_min = forehead_array.min(axis=0)
+        x_max, y_max = forehead_array.max(axis=0)
         
         # Create extended region (above the detected forehead)
         extension = (y_max - y_min) * 0.5  # Extend 50% upward
@@ -141,18 +209,13 @@ class FaceDetector:
         if len(landmarks) < 468:  # MediaPipe Face Mesh has 468 landmarks
             return False
         
-        # Check symmetry using key points
-        left_face = [landmarks[i] for i in [33, 133, 362]]  # Left eye, left face
-        right_face = [landmarks[i] for i in [263, 361, 130]]  # Right eye, right face
-        
-        left_array = np.array(left_face)
-        right_array = np.array(right_face)
+        landmarks = np.asarray(landmarks)
         
-        # Calculate symmetry score
-        left_center = np.mean(left_array, axis=0)
-        right_center = np.mean(right_array, axis=0)
+        # Check symmetry using key points
+        left_center = landmarks[[33, 133, 362]].mean(axis=0)  # Left eye, left face
+        right_center = landmarks[[263, 361, 130]].mean(axis=0)  # Right eye, right face
         
-        image_center = np.array([landmarks[1][0], landmarks[1][1]])  # Use nose base as reference
+        image_center = landmarks[1]  # Use nose base as reference
         
         left_dist = np.linalg.norm(left_center - image_center)
         right_dist = np.linalg.norm(right_center - image_center)
@@ -165,6 +228,8 @@ class FaceDetector:
         """Release resources"""
         if hasattr(self, 'face_mesh'):
             self.face_mesh.close()
+        if self.prefilter is not None:
+            self.prefilter.close()
 
 # Utility functions for face detection
 def create_face_detector():
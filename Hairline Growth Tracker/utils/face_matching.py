@@ -0,0 +1,132 @@
+"""
+Associate detected faces with users
+
+Each face gets a landmark-geometry signature: distances between stable
+landmarks, normalized by the interocular distance (invariant to position,
+scale and head roll). Enrolled users keep a running-mean signature; new
+faces are matched to the nearest enrolled users in one vectorized distance
+computation. This is a geometric signature, not a learned identity
+embedding: it separates the few people of one clinic photo, and explicit
+left-to-right user lists are preferred when available. Faces that match
+nobody are filed under guest ids but not enrolled unless asked for.
+"""
+
+import json
+import os
+import numpy as np
+from models.config import ModelConfig
+from utils.file_lock import atomic_write_json
+
+# Eye corners, nose, mouth corners, chin, forehead and cheek landmarks
+SIGNATURE_INDICES = np.array([33, 133, 362, 263, 1, 168, 61, 291, 152, 10, 234, 454])
+_PAIRS = np.triu_indices(len(SIGNATURE_INDICES), k=1)
+
+def face_signature(landmarks):
+    """
+    Landmark-geometry signature of one face
+
+    Returns:
+        np.ndarray: (P,) pairwise landmark distances in interocular units
+    """
+    points = np.asarray(landmarks, dtype=np.float64)[SIGNATURE_INDICES]
+    distances = np.linalg.norm(points[_PAIRS[0]] - points[_PAIRS[1]], axis=1)
+    interocular = np.linalg.norm(points[[0, 1]].mean(axis=0) - points[[2, 3]].mean(axis=0))
+    return distances / max(interocular, 1e-6)
+
+class FaceMatcher:
+    def __init__(self, store_path="data/input/user_data/face_signatures.json", threshold=None):
+        """
+        Args:
+            store_path: JSON file with the enrolled user signatures
+            threshold: Max RMS signature distance for a match (defaults to
+                ModelConfig.FACE_MATCH_THRESHOLD)
+        """
+        self.store_path = store_path
+        self.threshold = ModelConfig.FACE_MATCH_THRESHOLD if threshold is None else threshold
+        self.users = self.load()
+
+    def load(self):
+        """Enrolled users: user_id -> {'signature': [...], 'count': n}"""
+        if not os.path.exists(self.store_path):
+            return {}
+        with open(self.store_path, 'r') as f:
+            return json.load(f)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.store_path) or '.', exist_ok=True)
+        atomic_write_json(self.store_path, self.users, fsync=False)
+
+    def enroll(self, user_id, signature):
+        """Fold a face signature into the user's running-mean signature"""
+        signature = np.asarray(signature, dtype=np.float64)
+        entry = self.users.get(user_id)
+        if entry is None or len(entry['signature']) != len(signature):
+            self.users[user_id] = {'signature': signature.tolist(), 'count': 1}
+            return
+        count = entry['count'] + 1
+        mean = np.asarray(entry['signature']) + (signature - np.asarray(entry['signature'])) / count
+        self.users[user_id] = {'signature': mean.tolist(), 'count': count}
+
+    def match(self, signatures, exclude=()):
+        """
+        Match face signatures to enrolled users (each user at most once,
+        users in exclude never)
+
+        Returns:
+            list: Matched user_id or None per signature
+        """
+        matches = [None] * len(signatures)
+        if not self.users or not len(signatures):
+            return matches
+
+        user_ids = [user_id for user_id in self.users if user_id not in exclude]
+        if not user_ids:
+            return matches
+        enrolled = np.array([self.users[user_id]['signature'] for user_id in user_ids])
+        faces = np.asarray(signatures, dtype=np.float64)
+        if enrolled.shape[1] != faces.shape[1]:
+            return matches
+
+        # (F, U) RMS distances, then greedy assignment from the closest pair
+        distances = np.sqrt(((faces[:, np.newaxis, :] - enrolled[np.newaxis, :, :]) ** 2).mean(axis=2))
+        for flat_index in np.argsort(distances, axis=None):
+            face, user = np.unravel_index(flat_index, distances.shape)
+            if distances[face, user] > self.threshold:
+                break
+            if matches[face] is None and user_ids[user] not in matches:
+                matches[face] = user_ids[user]
+        return matches
+
+    def assign(self, results, user_ids=None, prefix="face", enroll_guests=None):
+        """
+        Assign a user to each per-face result (ordered left to right)
+
+        Args:
+            results: HairlineDetector.analyze_faces output
+            user_ids: Optional user ids by position, left to right; faces
+                without one are matched by signature
+            prefix: Id prefix for faces that match nobody (guests)
+            enroll_guests: Also enroll guests, so later photos match them
+                (defaults to ModelConfig.ENROLL_GUEST_FACES)
+
+        Returns:
+            list: user_id per result; named and matched users are enrolled
+        """
+        if enroll_guests is None:
+            enroll_guests = ModelConfig.ENROLL_GUEST_FACES
+        signatures = [face_signature(result['face_landmarks']) for result in results]
+        positional = list(user_ids or [])[:len(results)]
+        matched = self.match(signatures[len(positional):], exclude=positional)
+        known = positional + matched
+        assigned = positional + [
+            user_id or f"{prefix}_{len(positional) + i + 1}" for i, user_id in enumerate(matched)
+        ]
+
+        enrolled = False
+        for user_id, known_id, signature in zip(assigned, known, signatures):
+            if known_id is not None or enroll_guests:
+                self.enroll(user_id, signature)
+                enrolled = True
+        if enrolled:
+            self.save()
+        return assigned
@@ -0,0 +1,122 @@
+"""
+Cheap face-presence prefilter
+
+Runs a fast face detector (MediaPipe face detection or a Haar cascade) on
+a downscaled copy of the image before the FaceMesh pass. Images without a
+usable face are rejected early; for the others FaceMesh only sees an ROI
+crop around the detected faces (with room above the forehead for the
+hairline), which also lets it find faces that are small in a large frame.
+"""
+
+import cv2
+import numpy as np
+from models.config import ModelConfig
+
+def face_roi(boxes, image_shape, padding=None):
+    """
+    Crop rectangle around all face boxes, extended for the hairline
+
+    Args:
+        boxes: (N, 4) x_min, y_min, x_max, y_max face boxes
+        padding: (side, top, bottom) margins as fractions of the face
+            box size (defaults to ModelConfig.PREFILTER_ROI_PADDING)
+
+    Returns:
+        tuple: (x_min, y_min, x_max, y_max) clipped to the image
+    """
+    side, top, bottom = padding or ModelConfig.PREFILTER_ROI_PADDING
+    boxes = np.asarray(boxes, dtype=np.float64)
+    box_width = boxes[:, 2] - boxes[:, 0]
+    box_height = boxes[:, 3] - boxes[:, 1]
+
+    height, width = image_shape[:2]
+    x_min = int(max((boxes[:, 0] - side * box_width).min(), 0))
+    y_min = int(max((boxes[:, 1] - top * box_height).min(), 0))
+    x_max = int(min((boxes[:, 2] + side * box_width).max(), width))
+    y_max = int(min((boxes[:, 3] + bottom * box_height).max(), height))
+    return x_min, y_min, x_max, y_max
+
+class FacePrefilter:
+    def __init__(self, method=None, max_side=None, min_face_size=None):
+        """
+        Args:
+            method: 'mediapipe' (MediaPipe face detection) or 'haar'
+            max_side: Longest side of the downscaled detection image
+            min_face_size: Faces smaller than this (pixels, original image)
+                are rejected as unusable
+        """
+        self.method = method or ModelConfig.PREFILTER_METHOD
+        self.max_side = max_side or ModelConfig.PREFILTER_MAX_SIDE
+        self.min_face_size = ModelConfig.PREFILTER_MIN_FACE_SIZE if min_face_size is None else min_face_size
+
+        if self.method == 'mediapipe':
+            import mediapipe as mp
+            self.detector = mp.solutions.face_detection.FaceDetection(
+                model_selection=ModelConfig.PREFILTER_MODEL_SELECTION,
+                min_detection_confidence=ModelConfig.PREFILTER_CONFIDENCE
+            )
+        elif self.method == 'haar':
+            self.detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            if self.detector.empty():
+                raise RuntimeError("Haar face cascade is not available in this OpenCV build")
+        else:
+            raise ValueError(f"Unknown prefilter method: {self.method}")
+
+    def downscale(self, image):
+        """
+        Downscaled copy for detection and its scale factor
+
+        Large factors are first decimated by striding, so INTER_AREA (slow
+        at large factors) only covers the last <= 2x step.
+        """
+        height, width = image.shape[:2]
+        scale = min(1.0, self.max_side / max(height, width))
+        if scale == 1.0:
+            return image, 1.0
+
+        step = max(int(0.5 / scale), 1)
+        decimated = image[::step, ::step]
+        size = (max(round(width * scale), 1), max(round(height * scale), 1))
+        return cv2.resize(decimated, size, interpolation=cv2.INTER_AREA), scale
+
+    def detect(self, image):
+        """
+        Face boxes in original image coordinates
+
+        Returns:
+            tuple: ((N, 4) int array of x_min, y_min, x_max, y_max boxes,
+                rejection reason: None, 'no_face' or 'tiny_face')
+        """
+        small, scale = self.downscale(image)
+
+        if self.method == 'mediapipe':
+            results = self.detector.process(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+            small_height, small_width = small.shape[:2]
+            boxes = np.array([
+                [box.xmin * small_width, box.ymin * small_height,
+                 (box.xmin + box.width) * small_width, (box.ymin + box.height) * small_height]
+                for box in (detection.location_data.relative_bounding_box
+                            for detection in (results.detections or []))
+            ]).reshape(-1, 4)
+        else:
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            faces = np.asarray(self.detector.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)).reshape(-1, 4)
+            boxes = np.concatenate([faces[:, :2], faces[:, :2] + faces[:, 2:]], axis=1).astype(np.float64)
+
+        if len(boxes) == 0:
+            return np.empty((0, 4), dtype=np.int32), 'no_face'
+
+        height, width = image.shape[:2]
+        boxes = np.clip(boxes / scale, 0, [width, height, width, height]).astype(np.int32)
+        usable = np.minimum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]) >= self.min_face_size
+        if not usable.any():
+            return np.empty((0, 4), dtype=np.int32), 'tiny_face'
+        return boxes[usable], None
+
+    def roi(self, boxes, image_shape, padding=None):
+        """Crop rectangle around all face boxes (see face_roi)"""
+        return face_roi(boxes, image_shape, padding)
+
+    def close(self):
+        if self.method == 'mediapipe':
+            self.detector.close()
@@ -0,0 +1,99 @@
+"""
+Inter-process file locking and atomic file replacement
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+class FileLock:
+    def __init__(self, path):
+        """
+        Exclusive advisory lock on a lock file, shared between processes
+
+        The lock is re-entrant within one FileLock instance, so a holder can
+        call other methods that take the same lock.
+        """
+        self.path = path
+        self._file = None
+        self._depth = 0
+        self._thread_lock = threading.RLock()
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, 'a+')
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        self._depth += 1
+        return self
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+def atomic_write_json(path, data, fsync=True, **dump_kwargs):
+    """
+    Write JSON to a temporary file and rename it over the target
+
+    Readers see either the old or the new file, never a partial write, and a
+    crash mid-write leaves the previous file intact.
+    """
+    _atomic_write(path, lambda f: json.dump(data, f, **dump_kwargs), 'w', fsync)
+
+def atomic_write_bytes(path, data, fsync=True):
+    """Binary counterpart of atomic_write_json"""
+    _atomic_write(path, lambda f: f.write(data), 'wb', fsync)
+
+def _atomic_write(path, write, mode, fsync):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        # mkstemp creates 0600 files; keep the target's permissions instead
+        file_mode = os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644
+        os.chmod(tmp_path, file_mode)
+        with os.fdopen(fd, mode) as f:
+            write(f)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if fsync and hasattr(os, 'O_DIRECTORY'):
+        # Persist the rename itself
+        dir_fd = os.open(directory, os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
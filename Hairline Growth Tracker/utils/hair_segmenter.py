@@ -0,0 +1,198 @@
+import os
+import threading
+import cv2
+import numpy as np
+from models.config import ModelConfig
+
+# Serializes the temporary process-wide thread setting of OpenCV DNN inference
+_OPENCV_THREADS_LOCK = threading.Lock()
+
+class UNetSegmenter:
+    def __init__(self, model_path=None, backend=None, num_threads=None,
+                 input_size=None, quantized=False, threshold=None, model_buffer=None):
+        """
+        Initialize U-Net hair segmentation backend (CPU inference)
+
+        Args:
+            model_path: Path to an ONNX U-Net (defaults to ModelConfig.MODEL_PATHS)
+            backend: 'opencv' (cv2.dnn) or 'onnxruntime' (defaults to
+                ModelConfig.SEGMENTATION_BACKEND, or onnxruntime for quantized
+                weights)
+            num_threads: CPU threads used for inference (this backend only;
+                other OpenCV calls keep the process-wide setting)
+            input_size: (width, height) the forehead crops are resized to
+            quantized: Load the int8 quantized weights instead of float32
+            threshold: Hair probability threshold for the segmentation mask
+            model_buffer: Optional in-memory (e.g. memory-mapped) model bytes,
+                read instead of model_path (both backends parse it into their
+                own memory)
+        """
+        if model_path is None:
+            model_key = 'hairline_segmentor_int8' if quantized else 'hairline_segmentor'
+            model_path = ModelConfig.MODEL_PATHS[model_key]
+
+        self.model_path = model_path
+        self.backend = backend or ('onnxruntime' if quantized else ModelConfig.SEGMENTATION_BACKEND)
+        self.num_threads = num_threads or ModelConfig.SEGMENTATION_THREADS
+        self.input_size = tuple(input_size or ModelConfig.SEGMENTATION_INPUT_SIZE)
+        self.quantized = quantized
+        self.threshold = ModelConfig.SEGMENTATION_THRESHOLD if threshold is None else threshold
+        self.model_buffer = model_buffer
+
+        if model_buffer is None and not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"Segmentation model not found: {self.model_path}")
+
+        if self.backend == 'onnxruntime':
+            self._run = self._create_onnxruntime_session()
+        elif self.backend == 'opencv':
+            if quantized:
+                raise ValueError("Quantized weights require the 'onnxruntime' backend")
+            self._run = self._create_opencv_net()
+        else:
+            raise ValueError(f"Unknown segmentation backend: {self.backend}")
+
+    def _create_onnxruntime_session(self):
+        """Create an ONNX Runtime CPU session and return its run function"""
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The 'onnxruntime' backend requires: pip install onnxruntime")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.num_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model = bytes(self.model_buffer) if self.model_buffer is not None else self.model_path
+        session = ort.InferenceSession(model, options, providers=['CPUExecutionProvider'])
+        input_name = session.get_inputs()[0].name
+
+        def run(blob):
+            return session.run(None, {input_name: blob})[0]
+        return run
+
+    def _create_opencv_net(self):
+        """Load the model with OpenCV DNN and return its run function"""
+        if self.model_buffer is not None:
+            net = cv2.dnn.readNetFromONNX(np.frombuffer(self.model_buffer, dtype=np.uint8))
+        else:
+            net = cv2.dnn.readNetFromONNX(self.model_path)
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+        def run(blob):
+            # cv2.setNumThreads is process-wide: apply it for the forward pass
+            # only, so Canny, resize, CLAHE etc. keep their own setting
+            with _OPENCV_THREADS_LOCK:
+                previous = cv2.getNumThreads()
+                cv2.setNumThreads(self.num_threads)
+                try:
+                    net.setInput(blob)
+                    return net.forward()
+                finally:
+                    cv2.setNumThreads(previous)
+        return run
+
+    def warm_up(self, runs=1):
+        """Run inference on blank crops to trigger lazy backend initialisation"""
+        blank = np.zeros((self.input_size[1], self.input_size[0], 3), dtype=np.uint8)
+        for _ in range(runs):
+            self.predict_masks([blank])
+
+    def crop_forehead(self, image, forehead_region):
+        """
+        Crop the forehead bounding rectangle out of the image
+
+        Returns:
+            tuple: (crop, (x0, y0)) or (None, None) for an empty region
+        """
+        height, width = image.shape[:2]
+        x_min, y_min = np.floor(forehead_region.min(axis=0)).astype(int)
+        x_max, y_max = np.ceil(forehead_region.max(axis=0)).astype(int)
+        x_min, y_min = max(0, x_min), max(0, y_min)
+        x_max, y_max = min(width, x_max), min(height, y_max)
+
+        if x_max - x_min < 2 or y_max - y_min < 2:
+            return None, None
+        return image[y_min:y_max, x_min:x_max], (x_min, y_min)
+
+    def predict_masks(self, crops):
+        """
+        Run the U-Net on a batch of BGR crops
+
+        Returns:
+            np.ndarray: (N, H, W) hair probabilities at the model input size
+        """
+        blob = cv2.dnn.blobFromImages(crops, 1.0 / 255, self.input_size, swapRB=True, crop=False)
+        output = np.asarray(self._run(blob))
+        return output.reshape(len(crops), self.input_size[1], self.input_size[0])
+
+    def masks_to_boundaries(self, masks):
+        """
+        Find the hairline in each mask: per column, the first skin row below hair
+
+        Returns:
+            tuple: (rows, valid) arrays of shape (N, W)
+        """
+        hair = masks > self.threshold
+        rows = np.argmin(hair, axis=1)
+        valid = hair[:, 0, :] & ~hair.all(axis=1)
+        return rows, valid
+
+    def detect_hairline_points(self, image, forehead_region):
+        """
+        Detect hairline points for a single image
+        """
+        return self.detect_hairline_points_batch([image], [forehead_region])[0]
+
+    def detect_hairline_points_batch(self, images, forehead_regions):
+        """
+        Detect hairline points for several images with one batched inference
+
+        Returns:
+            list: (M_i, 2) int32 point arrays in image coordinates
+        """
+        empty = np.empty((0, 2), dtype=np.int32)
+        results = [empty] * len(images)
+
+        crops, origins, owners = [], [], []
+        for i, (image, region) in enumerate(zip(images, forehead_regions)):
+            if region is None:
+                continue
+            crop, origin = self.crop_forehead(image, np.asarray(region))
+            if crop is not None:
+                crops.append(crop)
+                origins.append(origin)
+                owners.append(i)
+
+        if not crops:
+            return results
+
+        rows, valid = self.masks_to_boundaries(self.predict_masks(crops))
+        input_width, input_height = self.input_size
+        columns = np.arange(input_width)
+
+        for crop, (x0, y0), owner, crop_rows, crop_valid in zip(crops, origins, owners, rows, valid):
+            crop_height, crop_width = crop.shape[:2]
+            xs = x0 + (columns[crop_valid] + 0.5) * crop_width / input_width
+            ys = y0 + crop_rows[crop_valid] * crop_height / input_height
+            results[owner] = np.stack([xs, ys], axis=1).astype(np.int32)
+
+        return results
+
+def create_segmenter(backend=None, **kwargs):
+    """
+    Factory for hairline segmentation backends
+
+    Returns None for the default 'edges' backend, which HairlineDetector
+    handles itself with Canny edge detection.
+    """
+    backend = backend or ModelConfig.HAIRLINE_BACKEND
+    if backend == 'edges':
+        return None
+    if backend == 'unet':
+        if kwargs:
+            return UNetSegmenter(**kwargs)
+        from models.model_loader import get_model_loader
+        model_name = 'hairline_segmentor_int8' if ModelConfig.SEGMENTATION_QUANTIZED else 'hairline_segmentor'
+        return get_model_loader().get_model(model_name)
+    raise ValueError(f"Unknown hairline backend: {backend}")
@@ -0,0 +1,134 @@
+"""
+Fixed-size hairline profiles
+
+Raw hairline points (contour pixels) are unbounded in number. A profile
+keeps only the upper boundary (the topmost point per x column), smooths it
+and resamples it to a fixed number of points across the forehead width, so
+every analysis stores the same small vector and sessions can be compared
+with plain array operations.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from models.config import ModelConfig
+
+def extract_upper_boundary(points, x_start, x_end):
+    """
+    Topmost y per integer x column in [x_start, x_end]
+
+    Returns:
+        np.ndarray: (x_end - x_start + 1,) float array, NaN for empty columns
+    """
+    num_columns = int(x_end) - int(x_start) + 1
+    column_y = np.full(max(num_columns, 0), np.inf)
+    points = np.asarray(points).reshape(-1, 2)
+
+    columns = np.rint(points[:, 0]).astype(np.intp) - int(x_start)
+    inside = (columns >= 0) & (columns < num_columns)
+    np.minimum.at(column_y, columns[inside], points[inside, 1].astype(np.float64))
+
+    column_y[np.isinf(column_y)] = np.nan
+    return column_y
+
+def smooth_profile(column_y, window=9):
+    """
+    Fill interior gaps by linear interpolation and apply a moving median
+
+    Columns outside the first/last observed column stay NaN.
+    """
+    column_y = np.asarray(column_y, dtype=np.float64)
+    observed = np.flatnonzero(~np.isnan(column_y))
+    if len(observed) == 0:
+        return column_y.copy()
+
+    first, last = observed[0], observed[-1]
+    span = np.interp(np.arange(first, last + 1), observed, column_y[observed])
+
+    half = window // 2
+    if half > 0 and len(span) > 1:
+        padded = np.pad(span, half, mode='edge')
+        span = np.median(sliding_window_view(padded, 2 * half + 1), axis=1)
+
+    smoothed = np.full_like(column_y, np.nan)
+    smoothed[first:last + 1] = span
+    return smoothed
+
+def resample_profile(column_y, num_points):
+    """
+    Resample a per-column profile to num_points evenly spaced positions
+
+    Positions outside the observed extent are NaN (no extrapolation).
+    """
+    column_y = np.asarray(column_y, dtype=np.float64)
+    if len(column_y) == 0:
+        return np.full(num_points, np.nan)
+
+    positions = np.linspace(0, len(column_y) - 1, num_points)
+    observed = np.flatnonzero(~np.isnan(column_y))
+    if len(observed) == 0:
+        return np.full(num_points, np.nan)
+
+    values = np.interp(positions, observed, column_y[observed])
+    values[(positions < observed[0]) | (positions > observed[-1])] = np.nan
+    return values
+
+def compute_hairline_profile(points, forehead_region, image_height, num_points=64, window=9):
+    """
+    Fixed-size hairline profile for one analysis
+
+    Args:
+        points: (M, 2) raw hairline points
+        forehead_region: Forehead polygon; its x extent is the profile span
+        image_height: Used to normalize y (same scale as hairline_height)
+        num_points: Profile length K
+        window: Moving-median window in pixel columns
+
+    Returns:
+        tuple: ((K,) normalized y values with NaN where no hairline was found,
+            [x_start, x_end] pixel span of the profile)
+    """
+    if forehead_region is None:
+        return np.full(num_points, np.nan), None
+
+    region = np.asarray(forehead_region)
+    x_start, x_end = int(region[:, 0].min()), int(region[:, 0].max())
+
+    column_y = extract_upper_boundary(points, x_start, x_end)
+    profile = resample_profile(smooth_profile(column_y, window), num_points)
+    return profile / image_height, [x_start, x_end]
+
+def profile_to_json(profile):
+    """Profile as a list with None for columns without a hairline (NaN is not valid JSON)"""
+    values = np.asarray(profile, dtype=np.float64)
+    return np.where(np.isfinite(values), values, None).tolist()
+
+def profile_from_json(values):
+    """Stored profile -> (K,) float array, NaN for None"""
+    return np.array(values, dtype=np.float64)
+
+# In-memory analysis fields that are never written into JSON records
+# (image crops, per-analysis timings/counters/profiles)
+TRANSIENT_FIELDS = ('aligned_crop', 'instrumentation')
+# Profiles stored through profile_to_json
+STORED_PROFILE_FIELDS = ('hairline_profile', 'aligned_profile')
+
+def storable_result(analysis_result, keep_raw_points=None):
+    """
+    View of an analysis result for persistence: the raw hairline points are
+    dropped (the fixed-size profile replaces them) unless
+    ModelConfig.STORE_RAW_HAIRLINE_POINTS / keep_raw_points is set, and
+    transient fields (image crops, instrumentation) are always dropped; profiles are stored
+    with None for missing columns
+    """
+    if keep_raw_points is None:
+        keep_raw_points = ModelConfig.STORE_RAW_HAIRLINE_POINTS
+    excluded = set(TRANSIENT_FIELDS)
+    if not keep_raw_points and 'hairline_profile' in analysis_result:
+        excluded.add('hairline_points')
+    profiles = [field for field in STORED_PROFILE_FIELDS if analysis_result.get(field) is not None]
+    if excluded.isdisjoint(analysis_result) and not profiles:
+        return analysis_result
+    result = {key: value for key, value in analysis_result.items() if key not in excluded}
+    for field in profiles:
+        result[field] = profile_to_json(result[field])
+    return result
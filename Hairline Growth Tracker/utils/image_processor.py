@@ -1,5 +1,21 @@
+import threading
 import cv2
 import numpy as np
+from models.config import ModelConfig
+
+# CLAHE objects are reusable but not thread-safe: one per thread and settings
+_thread_state = threading.local()
+
+def get_clahe(clip_limit=2.0, tile_grid_size=(8, 8)):
+    """CLAHE object for the calling thread (created once per thread and settings)"""
+    cache = getattr(_thread_state, 'clahe', None)
+    if cache is None:
+        cache = _thread_state.clahe = {}
+    key = (clip_limit, tuple(tile_grid_size))
+    clahe = cache.get(key)
+    if clahe is None:
+        clahe = cache[key] = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tuple(tile_grid_size))
+    return clahe
 
 def preprocess_image(image_path):
     """Preprocess image for better analysis"""
@@ -29,8 +45,7 @@ def enhance_contrast(image):
     l, a, b = cv2.split(lab)
     
     # Apply CLAHE to L channel
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    l = clahe.apply(l)
+    l = get_clahe(2.0, (8, 8)).apply(l)
     
     # Merge channels and convert back to BGR
     enhanced_lab = cv2.merge([l, a, b])
@@ -38,6 +53,100 @@ def enhance_contrast(image):
     
     return enhanced_image
 
+class ImagePreprocessor:
+    STAGES = ('gamma', 'clahe')
+
+    def __init__(self, stages=None, dark_threshold=None, contrast_threshold=None, padding=None):
+        """
+        Forehead-ROI enhancement before hairline detection
+
+        Only the L channel of the forehead ROIs is touched, and each stage
+        runs only when the ROI needs it: 'gamma' brightens ROIs darker than
+        dark_threshold (mean L), 'clahe' equalizes ROIs with an L standard
+        deviation below contrast_threshold. Well-exposed photos pass
+        through untouched.
+
+        Args:
+            stages: Enabled stages in order (defaults to
+                ModelConfig.PREPROCESSING_STAGES)
+            padding: Pixels added around each ROI so the patch seam stays
+                outside the hairline search area
+        """
+        self.stages = tuple(ModelConfig.PREPROCESSING_STAGES if stages is None else stages)
+        unknown = set(self.stages) - set(self.STAGES)
+        if unknown:
+            raise ValueError(f"Unknown preprocessing stages: {sorted(unknown)}")
+        self.dark_threshold = ModelConfig.PREPROCESS_DARK_THRESHOLD if dark_threshold is None else dark_threshold
+        self.contrast_threshold = (ModelConfig.PREPROCESS_CONTRAST_THRESHOLD
+                                   if contrast_threshold is None else contrast_threshold)
+        self.padding = ModelConfig.PREPROCESS_ROI_PADDING if padding is None else padding
+
+    def roi_box(self, forehead_region, image_shape):
+        """Padded bounding box (x0, y0, x1, y1) of a forehead polygon, or None"""
+        if forehead_region is None:
+            return None
+        x, y, w, h = cv2.boundingRect(np.asarray(forehead_region).reshape(-1, 1, 2).astype(np.int32))
+        x0, y0 = max(x - self.padding, 0), max(y - self.padding, 0)
+        x1 = min(x + w + self.padding, image_shape[1])
+        y1 = min(y + h + self.padding, image_shape[0])
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return x0, y0, x1, y1
+
+    def select_stages(self, lightness):
+        """Stages the ROI needs, from its mean and spread of L (subsampled)"""
+        sample = lightness[::2, ::2]
+        mean, std = float(sample.mean()), float(sample.std())
+        needed = []
+        if 'gamma' in self.stages and mean < self.dark_threshold:
+            needed.append('gamma')
+        if 'clahe' in self.stages and std < self.contrast_threshold:
+            needed.append('clahe')
+        return needed
+
+    def enhance_regions(self, image, forehead_regions):
+        """
+        Enhanced patches for the forehead ROIs that need it
+
+        Returns:
+            list: (x0, y0, x1, y1, BGR patch, applied stages) per enhanced ROI
+        """
+        patches = []
+        for region in forehead_regions:
+            box = self.roi_box(region, image.shape)
+            if box is None:
+                continue
+            x0, y0, x1, y1 = box
+            lab = cv2.cvtColor(image[y0:y1, x0:x1], cv2.COLOR_BGR2LAB)
+            lightness = lab[:, :, 0]
+            needed = self.select_stages(lightness)
+            if not needed:
+                continue
+
+            for stage in needed:
+                if stage == 'gamma':
+                    # Map the ROI mean to the dark threshold
+                    mean = max(float(lightness.mean()), 1.0) / 255.0
+                    gamma = np.log(self.dark_threshold / 255.0) / np.log(mean)
+                    lut = (255.0 * (np.arange(256) / 255.0) ** gamma).clip(0, 255).astype(np.uint8)
+                    lightness = cv2.LUT(lightness, lut)
+                elif stage == 'clahe':
+                    lightness = get_clahe(ModelConfig.PREPROCESS_CLAHE_CLIP,
+                                          ModelConfig.PREPROCESS_CLAHE_GRID).apply(np.ascontiguousarray(lightness))
+            lab[:, :, 0] = lightness
+            patches.append((x0, y0, x1, y1, cv2.cvtColor(lab, cv2.COLOR_LAB2BGR), needed))
+        return patches
+
+    @staticmethod
+    def compose(image, patches):
+        """Image with the enhanced patches pasted in (the input if there are none)"""
+        if not patches:
+            return image
+        image = image.copy()
+        for x0, y0, x1, y1, patch, _ in patches:
+            image[y0:y1, x0:x1] = patch
+        return image
+
 def validate_image_quality(image):
     """Validate if image is suitable for analysis"""
     if image is None:
@@ -0,0 +1,195 @@
+"""
+Lightweight per-stage instrumentation for the analysis pipeline
+
+Each analysis gets an AnalysisInstrumentation that records stage timings,
+counters and the failure reason; the process-wide registry aggregates them.
+cProfile and tracemalloc capture can be enabled for a sampled fraction of
+calls.
+"""
+
+import cProfile
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from utils.metrics import ANALYSES, ANALYSIS_SECONDS, ANALYSIS_FAILURES, STAGE_SECONDS
+
+class AnalysisInstrumentation:
+    def __init__(self, profile=False, trace_memory=False):
+        """
+        Instrumentation for a single analysis call
+
+        Args:
+            profile: Capture a cProfile profile for this call
+            trace_memory: Capture peak traced memory with tracemalloc
+        """
+        self.stages = {}
+        self.counters = {}
+        self.failure = None
+        self.profile = None
+        self.memory_peak_kb = None
+        self._profiler = cProfile.Profile() if profile else None
+        self._trace_memory = trace_memory
+        self._started_tracing = False
+        self._start = None
+        self.total_seconds = None
+
+    def start(self):
+        """Start the call-level timer (and sampled profilers)"""
+        if self._trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+        if self._profiler is not None:
+            self._profiler.enable()
+        self._start = time.perf_counter()
+        return self
+
+    def stop(self, top_functions=15):
+        """Stop timers and collect sampled profiler output"""
+        self.total_seconds = time.perf_counter() - self._start
+
+        if self._profiler is not None:
+            self._profiler.disable()
+            stats = pstats.Stats(self._profiler).sort_stats('cumulative')
+            self.profile = [
+                {
+                    'function': f"{filename}:{line}({name})",
+                    'calls': calls,
+                    'total_seconds': total_time,
+                    'cumulative_seconds': cumulative_time
+                }
+                for (filename, line, name), (_, calls, total_time, cumulative_time, _)
+                in sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top_functions]
+            ]
+
+        if self._trace_memory:
+            self.memory_peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+            if self._started_tracing:
+                tracemalloc.stop()
+        return self
+
+    @contextmanager
+    def stage(self, name):
+        """Time a pipeline stage (repeated stages accumulate)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def fail(self, reason):
+        self.failure = reason
+    
+    def merge(self, other):
+        """Fold another instrumentation's stage timings and counters into this one"""
+        for name, seconds in other.stages.items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        for name, value in other.counters.items():
+            self.count(name, value)
+
+    def as_dict(self):
+        """Structured, JSON-serializable view of this call"""
+        data = {
+            'total_seconds': self.total_seconds,
+            'stages': dict(self.stages),
+            'counters': dict(self.counters),
+            'failure': self.failure
+        }
+        if self.profile is not None:
+            data['profile'] = self.profile
+        if self.memory_peak_kb is not None:
+            data['memory_peak_kb'] = self.memory_peak_kb
+        return data
+
+def stage(instrumentation, name):
+    """Stage context for optional instrumentation (no-op when None)"""
+    if instrumentation is None:
+        return nullcontext()
+    return instrumentation.stage(name)
+
+class InstrumentationRegistry:
+    def __init__(self, profile_sample_rate=0.0, memory_sample_rate=0.0):
+        """
+        Process-wide aggregate of analysis instrumentation
+
+        Args:
+            profile_sample_rate: Fraction of calls captured with cProfile
+            memory_sample_rate: Fraction of calls captured with tracemalloc
+        """
+        self.profile_sample_rate = profile_sample_rate
+        self.memory_sample_rate = memory_sample_rate
+        self._lock = threading.Lock()
+        self.reset()
+
+    def configure(self, profile_sample_rate=None, memory_sample_rate=None):
+        if profile_sample_rate is not None:
+            self.profile_sample_rate = profile_sample_rate
+        if memory_sample_rate is not None:
+            self.memory_sample_rate = memory_sample_rate
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.total_seconds = 0.0
+            self.stage_stats = {}
+            self.counters = {}
+            self.failures = {}
+
+    def start_analysis(self):
+        """Create (and start) instrumentation for one call, applying sampling"""
+        return AnalysisInstrumentation(
+            profile=random.random() < self.profile_sample_rate,
+            trace_memory=random.random() < self.memory_sample_rate
+        ).start()
+
+    def record(self, instrumentation):
+        """Stop a call's instrumentation and fold it into the aggregates"""
+        instrumentation.stop()
+        with self._lock:
+            self.calls += 1
+            self.total_seconds += instrumentation.total_seconds
+            for name, seconds in instrumentation.stages.items():
+                stats = self.stage_stats.setdefault(name, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+                stats['count'] += 1
+                stats['total_seconds'] += seconds
+                stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            for name, value in instrumentation.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            if instrumentation.failure:
+                self.failures[instrumentation.failure] = self.failures.get(instrumentation.failure, 0) + 1
+        
+        # Export to the Prometheus-style registry
+        ANALYSIS_SECONDS.observe(instrumentation.total_seconds)
+        for name, seconds in instrumentation.stages.items():
+            STAGE_SECONDS.observe(seconds, stage=name)
+        if instrumentation.failure:
+            ANALYSES.inc(result='failure')
+            ANALYSIS_FAILURES.inc(reason=instrumentation.failure)
+        else:
+            ANALYSES.inc(result='success')
+        return instrumentation
+
+    def snapshot(self):
+        """Aggregated timings, counters and failures by reason"""
+        with self._lock:
+            stages = {
+                name: dict(stats, mean_seconds=stats['total_seconds'] / stats['count'])
+                for name, stats in self.stage_stats.items()
+            }
+            return {
+                'calls': self.calls,
+                'total_seconds': self.total_seconds,
+                'stages': stages,
+                'counters': dict(self.counters),
+                'failures': dict(self.failures)
+            }
+
+# Process-wide registry used by HairlineDetector
+INSTRUMENTATION = InstrumentationRegistry()
@@ -0,0 +1,201 @@
+"""
+In-process metrics registry with Prometheus text exposition
+
+Counters, gauges and histograms are cheap to update on the hot path (a
+dict lookup and an add under a per-metric lock). The registry renders the
+Prometheus text format, which can be dumped to a file (e.g. for the
+node_exporter textfile collector) or served over HTTP.
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.file_lock import atomic_write_bytes
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _label_key(labelnames, labels):
+    if len(labels) != len(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    try:
+        return tuple([labels[name] for name in labelnames])
+    except KeyError:
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class Counter:
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self.values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self.values[key] = value
+
+class Histogram:
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self.values.get(key)
+            if state is None:
+                # [per-bucket counts (last = +Inf), sum, count]
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get_count(self, **labels):
+        state = self.values.get(_label_key(self.labelnames, labels))
+        return state[2] if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self.values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f'{self.name}_bucket', _format_labels(self.labelnames, key, ('le', le)), cumulative
+            yield f'{self.name}_sum', _format_labels(self.labelnames, key), total
+            yield f'{self.name}_count', _format_labels(self.labelnames, key), count
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _get_or_create(self, metric_class, name, documentation, labelnames, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self.metrics.get(name)
+                if metric is None:
+                    metric = self.metrics[name] = metric_class(name, documentation, labelnames, **kwargs)
+        if not isinstance(metric, metric_class) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} already registered with a different type or labels")
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render_text(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for name in sorted(self.metrics):
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type_name}')
+            for sample_name, labels, value in metric.samples():
+                lines.append(f'{sample_name}{labels} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """Atomically write the exposition text to a file"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Keeps the target's mode (0644 when new) for the textfile collector
+        atomic_write_bytes(path, self.render_text().encode('utf-8'), fsync=False)
+        return path
+
+    def start_http_server(self, port, host=''):
+        """Serve /metrics from a daemon thread"""
+        if self._server is not None:
+            return self._server
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+# Process-wide registry
+REGISTRY = MetricsRegistry()
+
+ANALYSES = REGISTRY.counter(
+    'hairline_analyses_total', 'Hairline analyses by result', ['result'])
+ANALYSIS_SECONDS = REGISTRY.histogram(
+    'hairline_analysis_seconds', 'End-to-end latency of a hairline analysis')
+STAGE_SECONDS = REGISTRY.histogram(
+    'hairline_stage_seconds', 'Latency of each analysis pipeline stage', ['stage'])
+ANALYSIS_FAILURES = REGISTRY.counter(
+    'hairline_analysis_failures_total', 'Failed analyses by reason', ['reason'])
+VALIDATION_REJECTIONS = REGISTRY.counter(
+    'hairline_validation_rejections_total', 'Images rejected by validation, by reason', ['reason'])
+STORE_WRITE_SECONDS = REGISTRY.histogram(
+    'hairline_store_write_seconds', 'Latency of persistent store writes', ['store'])
+IMAGES_PROCESSED = REGISTRY.counter(
+    'hairline_images_processed_total', 'Images processed by the tracker app, by outcome', ['outcome'])
+CACHE_REQUESTS = REGISTRY.counter(
+    'hairline_cache_requests_total', 'Cache lookups by cache and result (hit/miss)', ['cache', 'result'])
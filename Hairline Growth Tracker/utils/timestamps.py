@@ -0,0 +1,51 @@
+"""
+Session timestamps
+
+Sessions are keyed by (user_id, timestamp). New timestamps carry
+milliseconds ('YYYYmmdd_HHMMSS_mmm') and are unique within the process, so
+batch runs analysing several images per second never share a key; sessions
+stored earlier keep the whole-second 'YYYYmmdd_HHMMSS' form. Both forms
+sort chronologically as strings.
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+SECONDS_PER_DAY = 86400.0
+
+_issue_lock = threading.Lock()
+_last_issued = None
+
+def format_timestamp(moment):
+    """datetime -> 'YYYYmmdd_HHMMSS_mmm'"""
+    return f"{moment.strftime(TIMESTAMP_FORMAT)}_{moment.microsecond // 1000:03d}"
+
+def session_timestamp():
+    """
+    Timestamp for a new session: the current time to the millisecond,
+    moved 1 ms past the previous one issued by this process on a tie
+    """
+    global _last_issued
+    with _issue_lock:
+        now = datetime.now()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        if _last_issued is not None and now <= _last_issued:
+            now = _last_issued + timedelta(milliseconds=1)
+        _last_issued = now
+    return format_timestamp(now)
+
+def parse_timestamp(timestamp):
+    """
+    Session timestamp (either form) -> datetime
+
+    Raises:
+        ValueError: If the timestamp is in neither form
+    """
+    if len(timestamp) == 19 and timestamp[15] == '_' and timestamp[16:].isdigit():
+        return datetime.strptime(timestamp[:15], TIMESTAMP_FORMAT) + timedelta(milliseconds=int(timestamp[16:]))
+    return datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+
+def timestamp_to_days(timestamp):
+    """Session timestamp -> days since the epoch"""
+    return parse_timestamp(timestamp).timestamp() / SECONDS_PER_DAY
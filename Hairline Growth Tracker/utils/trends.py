@@ -0,0 +1,298 @@
+"""
+Robust time-series trends for progress metrics
+
+Per-metric trends over a user's timestamped sessions: Theil-Sen slopes
+(median of pairwise slopes, robust to a few bad photos), trailing rolling
+medians and single change-point detection. The batch functions work on
+NaN-padded (users, sessions) arrays so every user is fitted in one pass;
+TrendState updates one user's fit incrementally as sessions arrive.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.timestamps import TIMESTAMP_FORMAT, timestamp_to_days
+
+def session_days(timestamp):
+    """timestamp_to_days, or None for timestamps not in the session format"""
+    try:
+        return timestamp_to_days(timestamp)
+    except (TypeError, ValueError):
+        return None
+
+def pad_series(series):
+    """
+    Stack ragged (times, values) series into left-aligned NaN-padded arrays
+
+    Returns:
+        tuple: ((U, N) times, (U, N) values), sorted by time within each row
+    """
+    length = max((len(times) for times, _ in series), default=0)
+    padded_times = np.full((len(series), length), np.nan)
+    padded_values = np.full((len(series), length), np.nan)
+    for row, (times, values) in enumerate(series):
+        order = np.argsort(times, kind='stable')
+        padded_times[row, :len(times)] = np.asarray(times, dtype=np.float64)[order]
+        padded_values[row, :len(values)] = np.asarray(values, dtype=np.float64)[order]
+    return padded_times, padded_values
+
+def pairwise_slopes(times, values):
+    """(U, N, N) slopes between sessions i < j (NaN elsewhere)"""
+    dt = times[:, np.newaxis, :] - times[:, :, np.newaxis]
+    dy = values[:, np.newaxis, :] - values[:, :, np.newaxis]
+    upper = np.triu(np.ones(times.shape[1:] * 2, dtype=bool), k=1)
+    valid = upper & np.isfinite(dt) & np.isfinite(dy) & (dt != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(valid, dy / dt, np.nan)
+
+def _nanmedian(values, axis=-1):
+    """nanmedian that returns NaN for all-NaN slices without warning"""
+    values = np.asarray(values)
+    finite = np.isfinite(values).any(axis=axis)
+    result = np.full(finite.shape, np.nan)
+    if finite.any():
+        result[finite] = np.nanmedian(np.moveaxis(values, axis, -1)[finite], axis=-1)
+    return result
+
+def theil_sen(times, values):
+    """
+    Theil-Sen fit per row of NaN-padded (U, N) arrays
+
+    Returns:
+        tuple: ((U,) slopes in value units per time unit, (U,) intercepts);
+            NaN for rows with fewer than two distinct times
+    """
+    times = np.atleast_2d(np.asarray(times, dtype=np.float64))
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    slopes = _nanmedian(pairwise_slopes(times, values).reshape(len(times), -1), axis=-1)
+    intercepts = _nanmedian(values - slopes[:, np.newaxis] * times, axis=-1)
+    return slopes, intercepts
+
+def rolling_median(values, window=3):
+    """
+    Trailing rolling median per row of NaN-padded (U, N) values
+    (shorter windows at the start of each series)
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    padded = np.pad(values, ((0, 0), (window - 1, 0)), constant_values=np.nan)
+    windows = sliding_window_view(padded, window, axis=1)
+    return _nanmedian(windows, axis=-1)
+
+def linear_fit_error(times, values):
+    """Squared error of a least-squares line per row of NaN-padded (U, N) arrays"""
+    valid = np.isfinite(times) & np.isfinite(values)
+    counts = np.maximum(valid.sum(axis=1), 1)
+    t = np.where(valid, times, 0.0)
+    y = np.where(valid, values, 0.0)
+    t_centered = np.where(valid, t - (t.sum(axis=1) / counts)[:, np.newaxis], 0.0)
+    y_centered = np.where(valid, y - (y.sum(axis=1) / counts)[:, np.newaxis], 0.0)
+    sxx = (t_centered ** 2).sum(axis=1)
+    sxy = (t_centered * y_centered).sum(axis=1)
+    syy = (y_centered ** 2).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(sxx > 0, syy - sxy ** 2 / sxx, syy)
+
+def detect_change_point(values, min_size=2, times=None):
+    """
+    Best single mean shift per row of left-aligned NaN-padded (U, N) values
+
+    The split minimising the two-segment squared error is found from
+    cumulative sums in one pass over all rows. With times, a split only
+    counts if it fits better than a straight line (a steady trend is not a
+    change point).
+
+    Returns:
+        dict: (U,) arrays 'index' (first session after the change, -1 if
+            none), 'shift' (mean after - mean before) and 'score' (fraction
+            of the variance explained by the split, 0..1)
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    num_rows, length = values.shape
+    counts = np.isfinite(values).sum(axis=1)
+    filled = np.nan_to_num(values)
+
+    # Prefix sums: entry k covers the first k sessions
+    sums = np.concatenate([np.zeros((num_rows, 1)), np.cumsum(filled, axis=1)], axis=1)
+    squares = np.concatenate([np.zeros((num_rows, 1)), np.cumsum(filled ** 2, axis=1)], axis=1)
+    total_sum = sums[np.arange(num_rows), counts][:, np.newaxis]
+    total_squares = squares[np.arange(num_rows), counts][:, np.newaxis]
+    total_error = total_squares[:, 0] - total_sum[:, 0] ** 2 / np.maximum(counts, 1)
+
+    splits = np.arange(length + 1)[np.newaxis, :]
+    left_n = splits.astype(np.float64)
+    right_n = counts[:, np.newaxis] - left_n
+    valid = (left_n >= min_size) & (right_n >= min_size)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        right_sum = total_sum - sums
+        split_error = (squares - sums ** 2 / left_n) + ((total_squares - squares) - right_sum ** 2 / right_n)
+        split_error = np.where(valid, split_error, np.inf)
+        best = split_error.argmin(axis=1)
+        rows = np.arange(num_rows)
+        found = valid[rows, best] & (total_error > 0)
+        if times is not None:
+            found &= split_error[rows, best] < linear_fit_error(np.atleast_2d(times), values)
+        score = np.where(found, 1.0 - split_error[rows, best] / total_error, 0.0)
+        shift = np.where(found, right_sum[rows, best] / right_n[rows, best] - sums[rows, best] / left_n[0, best], 0.0)
+
+    return {
+        'index': np.where(found, best, -1),
+        'shift': shift,
+        'score': np.clip(score, 0.0, 1.0)
+    }
+
+def fit_trends(times, values, window=3, min_size=2):
+    """
+    Slopes, rolling medians and change points for NaN-padded (U, N) series
+
+    Returns:
+        dict: 'slope', 'intercept', 'rolling_median', 'change_index',
+            'change_shift', 'change_score' arrays (one row/entry per series)
+    """
+    slopes, intercepts = theil_sen(times, values)
+    change = detect_change_point(values, min_size, times)
+    return {
+        'slope': slopes,
+        'intercept': intercepts,
+        'rolling_median': rolling_median(values, window),
+        'change_index': change['index'],
+        'change_shift': change['shift'],
+        'change_score': change['score']
+    }
+
+class TrendState:
+    def __init__(self, window=3, min_size=2):
+        """
+        Incrementally updated trend of one metric of one user
+
+        Pairwise slopes are kept sorted, so adding a session only computes
+        its slopes against the existing sessions (Theil-Sen is
+        order-independent; late-arriving sessions are fine).
+        """
+        self.window = window
+        self.min_size = min_size
+        self.times = np.empty(0)
+        self.values = np.empty(0)
+        self.sorted_slopes = np.empty(0)
+
+    def __len__(self):
+        return len(self.times)
+
+    def add(self, time, value):
+        """Add one session (NaN values are ignored)"""
+        if not np.isfinite(value):
+            return
+        dt = time - self.times
+        distinct = dt != 0
+        slopes = np.sort((value - self.values[distinct]) / dt[distinct])
+        self.sorted_slopes = np.insert(self.sorted_slopes, np.searchsorted(self.sorted_slopes, slopes), slopes)
+        self.times = np.append(self.times, time)
+        self.values = np.append(self.values, value)
+
+    @property
+    def slope(self):
+        count = len(self.sorted_slopes)
+        if count == 0:
+            return np.nan
+        middle = count // 2
+        if count % 2:
+            return float(self.sorted_slopes[middle])
+        return float(self.sorted_slopes[middle - 1:middle + 1].mean())
+
+    def summary(self):
+        """
+        Current slope, intercept, rolling median and change point
+
+        change_index counts only the sessions with a value for the metric;
+        change_time is the time of that session.
+        """
+        order = np.argsort(self.times, kind='stable')
+        times, values = self.times[order], self.values[order]
+        slope = self.slope
+        intercept = float(np.median(values - slope * times)) if len(times) and np.isfinite(slope) else np.nan
+        change = detect_change_point(values[np.newaxis], self.min_size, times[np.newaxis])
+        return {
+            'sessions': len(times),
+            'slope': slope,
+            'intercept': intercept,
+            'fitted_change': slope * (times[-1] - times[0]) if len(times) > 1 else 0.0,
+            'rolling_median': rolling_median(values[np.newaxis], self.window)[0] if len(times) else values,
+            'change_index': int(change['index'][0]) if len(times) else -1,
+            'change_time': float(times[change['index'][0]]) if len(times) and change['index'][0] >= 0 else np.nan,
+            'change_shift': float(change['shift'][0]) if len(times) else 0.0,
+            'change_score': float(change['score'][0]) if len(times) else 0.0
+        }
+
+class TrendEngine:
+    def __init__(self, metrics=('hairline_height', 'density_score', 'forehead_ratio'), window=3, min_size=2):
+        """
+        Incremental per-user trend states, fed with sessions as they are saved
+        """
+        self.metrics = tuple(metrics)
+        self.window = window
+        self.min_size = min_size
+        self.states = {}
+        self.seen = {}
+
+    def update(self, user_id, timestamp, record):
+        """Fold one session into the user's trend states (idempotent per timestamp)"""
+        seen = self.seen.setdefault(user_id, set())
+        if timestamp in seen:
+            return
+        seen.add(timestamp)
+        days = session_days(timestamp)
+        if days is None:
+            print(f"⚠️ Session {user_id}/{timestamp} left out of trends: timestamp is not {TIMESTAMP_FORMAT}[_mmm]")
+            return
+        states = self.states.setdefault(user_id, {})
+        for metric in self.metrics:
+            state = states.get(metric)
+            if state is None:
+                state = states[metric] = TrendState(self.window, self.min_size)
+            value = record.get(metric)
+            state.add(days, np.nan if value is None else float(value))
+
+    def replace(self, user_id, timestamp, record):
+        """
+        Fold in a saved session; re-saving a known timestamp drops the
+        user's states instead (see forget), since its old values are in them
+        """
+        if timestamp in self.seen.get(user_id, ()):
+            self.forget(user_id)
+        else:
+            self.update(user_id, timestamp, record)
+
+    def forget(self, user_id):
+        """Drop a user's states (e.g. after sessions were deleted); they are
+        rebuilt from the remaining sessions on the next user_trends call"""
+        self.states.pop(user_id, None)
+        self.seen.pop(user_id, None)
+
+    def user_trends(self, user_id, user_data):
+        """
+        Trend summaries per metric, first folding in sessions not seen yet
+        (e.g. written by another process)
+        """
+        for timestamp, record in user_data.items():
+            self.update(user_id, timestamp, record)
+        return {metric: state.summary() for metric, state in self.states.get(user_id, {}).items()}
+
+    def fit_all(self, data, metric):
+        """
+        Fit one metric for every user in one vectorized pass
+
+        Args:
+            data: Mapping user_id -> {timestamp: record}
+
+        Returns:
+            tuple: (user ids, fit_trends() result with one row per user)
+        """
+        users = sorted(data)
+        series = []
+        for user_id in users:
+            sessions = [(session_days(ts), record[metric]) for ts, record in data[user_id].items()
+                        if record.get(metric) is not None]
+            sessions = [(days, value) for days, value in sessions if days is not None]
+            series.append(([days for days, _ in sessions], [value for _, value in sessions]))
+        times, values = pad_series(series)
+        return users, fit_trends(times, values, self.window, self.min_size)